@@ -0,0 +1,89 @@
+import ast
+import glob
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.insert(0, os.path.join(HERE, os.pardir, "ocr"))
+from coordinate_tables import read_table  # noqa: E402
+from make_image_from_paragraphs import DEFAULT_SETTINGS, text_to_image_and_coordinates  # noqa: E402
+
+# Last revision of the renderer before the glyph metrics cache (one textbbox and one
+# draw.text call per character), the reference for the benchmark
+LEGACY_REVISION = "c9c067a"
+
+# The legacy renderer only knows the textwrap line breaking
+LEGACY_SETTINGS = {key: value for key, value in DEFAULT_SETTINGS.items() if key != "wrap"}
+
+
+def load_legacy_renderer(revision=LEGACY_REVISION):
+    """
+    Returns text_to_image_and_coordinates as it was at `revision`, read with
+    git show. Only the imports and functions of that file are run: its
+    module-level batch loop points at folders of the original author.
+    """
+    source = subprocess.run(["git", "-C", HERE, "show", f"{revision}:new_stimuli/make_image_from_paragraphs.py"],
+                            capture_output=True, text=True, check=True).stdout
+    tree = ast.parse(source)
+    tree.body = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef))]
+    namespace = {}
+    exec(compile(tree, f"{revision}:make_image_from_paragraphs.py", "exec"), namespace)
+    return namespace["text_to_image_and_coordinates"]
+
+
+def render_all(render, text_files, output_dir, settings=LEGACY_SETTINGS):
+    """Renders every text file with `render` and returns the elapsed seconds."""
+    start = time.perf_counter()
+    for text_file in text_files:
+        name = os.path.splitext(os.path.basename(text_file))[0]
+        render(text_file, os.path.join(output_dir, f"{name}.png"), os.path.join(output_dir, f"{name}.csv"),
+               **settings)
+    return time.perf_counter() - start
+
+
+def compare_outputs(text_files, legacy_dir, new_dir):
+    """Asserts that both renderers wrote the same coordinates and the same pixels."""
+    for text_file in text_files:
+        name = os.path.splitext(os.path.basename(text_file))[0]
+        # The new CSVs write whole numbers without ".0", so compare the values
+        pd.testing.assert_frame_equal(read_table(os.path.join(new_dir, f"{name}.csv")),
+                                      read_table(os.path.join(legacy_dir, f"{name}.csv")), check_dtype=False)
+        legacy = np.asarray(Image.open(os.path.join(legacy_dir, f"{name}.png")))
+        new = np.asarray(Image.open(os.path.join(new_dir, f"{name}.png")))
+        assert np.array_equal(legacy, new), f"{name}.png differs in {(legacy != new).any(axis=-1).sum()} pixels"
+
+
+def png_encoding_time(image_dir):
+    """Seconds spent encoding the PNGs of a folder again, the part of rendering no cache can save."""
+    images = [Image.open(path) for path in sorted(glob.glob(os.path.join(image_dir, "*.png")))]
+    for image in images:
+        image.load()
+    start = time.perf_counter()
+    for image in images:
+        image.save(io.BytesIO(), format="PNG")
+    return time.perf_counter() - start
+
+
+# Example usage: python new_stimuli/benchmark_renderer.py [text files...]
+if __name__ == "__main__":
+    text_files = sys.argv[1:] or sorted(glob.glob(os.path.join(HERE, "input", "*.txt")))
+    with tempfile.TemporaryDirectory() as legacy_dir, tempfile.TemporaryDirectory() as new_dir:
+        legacy_time = render_all(load_legacy_renderer(), text_files, legacy_dir)
+        new_time = render_all(text_to_image_and_coordinates, text_files, new_dir)
+        compare_outputs(text_files, legacy_dir, new_dir)
+        png_time = png_encoding_time(new_dir)
+    print(f"{len(text_files)} pages, identical coordinates and images")
+    print(f"per-character textbbox/draw.text: {legacy_time:.2f} s ({legacy_time / len(text_files) * 1000:.0f} ms/page)")
+    print(f"glyph metrics cache:              {new_time:.2f} s ({new_time / len(text_files) * 1000:.0f} ms/page)")
+    print(f"of which PNG encoding:            {png_time:.2f} s ({png_time / len(text_files) * 1000:.0f} ms/page)")
+    print(f"speedup: {legacy_time / new_time:.1f}x "
+          f"({(legacy_time - png_time) / (new_time - png_time):.1f}x without PNG encoding)")
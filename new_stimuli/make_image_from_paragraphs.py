@@ -1,7 +1,319 @@
+import argparse
+import functools
+import hashlib
+import json
 import os
-from PIL import Image, ImageDraw, ImageFont
-import csv
+import sys
 import textwrap
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# The table writers and the manifest naming are shared with ocr/
+sys.path.insert(0, os.path.join(HERE, os.pardir, "ocr"))
+from coordinate_tables import FORMATS, TableWriter  # noqa: E402
+from render_manifest import manifest_path_for  # noqa: E402
+
+RENDER_COLUMNS = ["Character", "X_Start", "Y_Start", "X_End", "Y_End", "Line_Number", "Word_Number",
+                  "Char_Number_in_Word", "X_Center", "Y_Center"]
+
+# Settings of the stimulus pages; fonts default to the copies bundled next to this script
+DEFAULT_SETTINGS = dict(
+    resolution=(3509, 2480),
+    font_size=63,
+    title_font_size=63,
+    subtitle_font_size=63,
+    line_spacing=2,
+    margin_left=10,
+    margin_right=10,
+    margin_top=350,
+    margin_bottom=100,
+    font_path=os.path.join(HERE, "cour.ttf"),
+    title_font_path=os.path.join(HERE, "courbd.ttf"),
+    buffer=2,
+    wrap="chars",
+)
+
+# Line breaking modes: "chars" is textwrap with a character count estimated from the
+# average glyph width (how the stimuli used in the experiments were made); "greedy"
+# and "optimal" measure every word with the font
+WRAP_MODES = ("chars", "greedy", "optimal")
+
+
+def file_sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class GlyphMetrics:
+    """
+    Bounding boxes and advances of the characters of one font, measured once.
+
+    draw.textbbox((x, y), char) is font.getbbox(char) shifted by (x, y), so the
+    boxes are measured once per character and reused for every page. The
+    renderer moves the pen by the width of each character's box.
+    """
+
+    def __init__(self, font_path, size):
+        self.font = ImageFont.truetype(font_path, size)
+        self._bboxes = {}
+        self._lengths = {}
+        self._widths = {}
+
+    def bbox(self, char):
+        """Returns (left, top, right, bottom) of `char` drawn at (0, 0)."""
+        box = self._bboxes.get(char)
+        if box is None:
+            box = self._bboxes[char] = self.font.getbbox(char)
+        return box
+
+    def advance(self, char):
+        left, _, right, _ = self.bbox(char)
+        return right - left
+
+    def length(self, char):
+        """Returns the font's own advance of `char` (what draw.text moves the pen by)."""
+        length = self._lengths.get(char)
+        if length is None:
+            length = self._lengths[char] = self.font.getlength(char)
+        return length
+
+    def text_width(self, text):
+        """Returns how far the renderer moves the pen over `text` (sum of the box widths)."""
+        width = self._widths.get(text)
+        if width is None:
+            width = self._widths[text] = sum(self.advance(c) for c in text)
+        return width
+
+    @functools.cached_property
+    def avg_char_width(self):
+        return sum(self.font.getlength(c) for c in "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ") / 52
+
+    def draws_like_chars(self, text):
+        """
+        True if drawing `text` in one call puts every glyph where drawing it
+        character by character would, i.e. every box is as wide as the advance
+        and the font applies no kerning to the pairs in `text`.
+        """
+        if any(self.advance(c) != self.length(c) for c in set(text)):
+            return False
+        return self.font.getlength(text) == sum(self.length(c) for c in text)
+
+    def char_boxes(self, text, x, y):
+        """
+        Lays out `text` from (x, y) character by character.
+
+        Returns:
+            list: [char, x_start, char_right, char_bottom, x_center, y_center]
+            per character, with the same values as calling draw.textbbox for
+            each character at the pen position.
+        """
+        boxes = []
+        for char in text:
+            left, top, right, bottom = self.bbox(char)
+            boxes.append([char, x, right + x, bottom + y, x + (right - left) / 2, y + (bottom - top) / 2])
+            x += right - left
+        return boxes
+
+
+@functools.lru_cache(maxsize=None)
+def glyph_metrics(font_path, size):
+    """Returns the GlyphMetrics of a font, shared by all pages rendered in this process."""
+    return GlyphMetrics(font_path, size)
+
+
+def draw_line(draw, metrics, text, x, y):
+    """Draws a line in one call when that gives the same pixels, else character by character."""
+    if metrics.draws_like_chars(text):
+        draw.text((x, y), text, font=metrics.font, fill="black")
+        return
+    for char, x_start, _, _, _, _ in metrics.char_boxes(text, x, y):
+        if char != " ":
+            draw.text((x_start, y), char, font=metrics.font, fill="black")
+
+
+def break_lines(words, metrics, max_width, mode="greedy"):
+    """
+    Breaks a paragraph into lines that fit in `max_width` pixels.
+
+    Words are measured with the font, and the width of words i..j-1 set on one
+    line is read off a prefix sum over word + space widths. "greedy" puts as
+    many words on each line as fit; "optimal" minimizes the sum of squared
+    leftover space over all lines except the last (Knuth-Plass style minimum
+    raggedness), which avoids a very short line after a full one. A word
+    wider than `max_width` gets a line of its own.
+
+    Args:
+        words: List of words of the paragraph.
+        metrics: GlyphMetrics of the text font.
+        max_width: Available width in pixels.
+        mode: "greedy" or "optimal".
+
+    Returns:
+        list: The lines, with the words joined by single spaces.
+    """
+    if not words:
+        return []
+    space = metrics.advance(" ")
+    widths = np.array([metrics.text_width(word) for word in words], dtype=float)
+    prefix = np.concatenate([[0.0], np.cumsum(widths + space)])
+    # Width of words i..j-1 on one line: prefix[j] - prefix[i] - space
+    # reach[i]: one past the last word that still fits on a line starting at word i
+    reach = np.searchsorted(prefix, prefix[:-1] + space + max_width, side="right") - 1
+    reach = np.maximum(reach, np.arange(1, len(words) + 1))
+
+    if mode == "greedy":
+        breaks = [0]
+        while breaks[-1] < len(words):
+            breaks.append(int(reach[breaks[-1]]))
+    elif mode == "optimal":
+        n = len(words)
+        cost = np.full(n + 1, np.inf)
+        cost[n] = 0.0
+        next_break = np.full(n + 1, n)
+        for i in range(n - 1, -1, -1):
+            ends = np.arange(i + 1, reach[i] + 1)
+            slack = max_width - (prefix[ends] - prefix[i] - space)
+            badness = np.where(ends == n, 0.0, np.maximum(slack, 0.0) ** 2)
+            total = badness + cost[ends]
+            best = int(np.argmin(total))
+            cost[i] = total[best]
+            next_break[i] = ends[best]
+        breaks = [0]
+        while breaks[-1] < n:
+            breaks.append(int(next_break[breaks[-1]]))
+    else:
+        raise ValueError(f"Unknown line breaking mode: {mode}")
+    return [" ".join(words[start:end]) for start, end in zip(breaks[:-1], breaks[1:])]
+
+
+def wrap_paragraph(paragraph, metrics, max_width, wrap="chars"):
+    """Breaks a paragraph into lines with the given WRAP_MODES mode."""
+    if wrap == "chars":
+        return textwrap.wrap(paragraph, width=int(max_width / metrics.avg_char_width))
+    return break_lines(paragraph.split(), metrics, max_width, wrap)
+
+
+def parse_text(lines):
+    """
+    Splits the lines of a text file into title (# line), subtitle (## line) and
+    paragraphs (all other lines, stripped).
+    """
+    title, subtitle = None, None
+    text_lines = []
+
+    for line in lines:
+        stripped_line = line.strip()
+        if stripped_line.startswith("##"):
+            subtitle = stripped_line[2:].strip()
+        elif stripped_line.startswith("#"):
+            title = stripped_line[1:].strip()
+        else:
+            text_lines.append(stripped_line)
+    return title, subtitle, text_lines
+
+
+def measure_layout(title, subtitle, text_lines, resolution, font_size, title_font_size, subtitle_font_size,
+                   line_spacing, margin_left, margin_right, margin_top, margin_bottom, font_path, title_font_path,
+                   wrap="chars", **_):
+    """
+    Lays out a page with glyph metrics only, following the same steps as
+    text_to_image_and_coordinates but without drawing anything.
+
+    Returns:
+        tuple: (bottom, widest) - the lowest ink row of the page and the width
+        of its widest line, title and subtitle included. The page fits if
+        bottom <= resolution[1] - margin_bottom and
+        widest <= resolution[0] - margin_left - margin_right.
+    """
+    font = glyph_metrics(font_path, font_size)
+    max_width = resolution[0] - margin_left - margin_right
+    y = margin_top
+    bottom = y
+    widest = 0
+
+    for text, metrics, size in ((title, glyph_metrics(title_font_path, title_font_size), title_font_size),
+                                (subtitle, glyph_metrics(title_font_path, subtitle_font_size), subtitle_font_size)):
+        if text:
+            widest = max(widest, metrics.text_width(text))
+            bottom = y + max(metrics.bbox(c)[3] for c in text)
+            y += int(size * line_spacing)
+    if title and not subtitle:
+        y += int(font_size * line_spacing)
+
+    for paragraph in text_lines:
+        for line in wrap_paragraph(paragraph, font, max_width, wrap):
+            widest = max(widest, font.text_width(" ".join(line.split())))
+            bottom = y + max(font.bbox(c)[3] for c in line)
+            y += int(font_size * line_spacing)
+    return bottom, widest
+
+
+def page_fits(title, subtitle, text_lines, settings):
+    """True if the page laid out with `settings` stays inside the margins."""
+    bottom, widest = measure_layout(title, subtitle, text_lines, **settings)
+    resolution = settings["resolution"]
+    return (bottom <= resolution[1] - settings["margin_bottom"]
+            and widest <= resolution[0] - settings["margin_left"] - settings["margin_right"])
+
+
+def fit_layout(text_file, font_sizes=(30, 120), line_spacings=(1.5, 2.5), spacing_step=0.05, **settings):
+    """
+    Finds the largest font, and then the largest line spacing, with which a
+    page fits inside the margins.
+
+    The font size is binary-searched at the smallest line spacing, then the
+    line spacing is binary-searched on a grid of `spacing_step` for that size.
+    Title and subtitle sizes keep their ratio to the text size. Only glyph
+    metrics are used (see measure_layout), so nothing is rasterized.
+
+    Args:
+        text_file: Path to the input text file.
+        font_sizes: (smallest, largest) text font size to consider.
+        line_spacings: (smallest, largest) line spacing multiplier to consider.
+        spacing_step: Resolution of the line spacing search.
+        **settings: Overrides of DEFAULT_SETTINGS for everything else.
+
+    Returns:
+        dict or None: The settings with font sizes and line_spacing filled in,
+        or None if the page does not fit even with the smallest values.
+    """
+    settings = dict(DEFAULT_SETTINGS, **settings)
+    with open(text_file, "r", encoding="utf-8") as f:
+        title, subtitle, text_lines = parse_text(f.readlines())
+    title_ratio = settings["title_font_size"] / settings["font_size"]
+    subtitle_ratio = settings["subtitle_font_size"] / settings["font_size"]
+
+    def with_layout(font_size, line_spacing):
+        return dict(settings, font_size=font_size, title_font_size=max(1, round(font_size * title_ratio)),
+                    subtitle_font_size=max(1, round(font_size * subtitle_ratio)), line_spacing=line_spacing)
+
+    def largest_fitting(candidates, make):
+        """Largest candidate that fits, assuming fitting is monotone; None if none does."""
+        lo, hi = 0, len(candidates) - 1
+        if not page_fits(title, subtitle, text_lines, make(candidates[lo])):
+            return None
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if page_fits(title, subtitle, text_lines, make(candidates[mid])):
+                lo = mid
+            else:
+                hi = mid - 1
+        return candidates[lo]
+
+    font_size = largest_fitting(list(range(font_sizes[0], font_sizes[1] + 1)),
+                                lambda size: with_layout(size, line_spacings[0]))
+    if font_size is None:
+        return None
+    n_steps = int(round((line_spacings[1] - line_spacings[0]) / spacing_step))
+    spacings = [round(line_spacings[0] + i * spacing_step, 4) for i in range(n_steps + 1)]
+    line_spacing = largest_fitting(spacings, lambda spacing: with_layout(font_size, spacing))
+    return with_layout(font_size, line_spacing)
+
 
 def text_to_image_and_coordinates(
     text_file,
@@ -16,17 +328,24 @@ def text_to_image_and_coordinates(
     margin_right=10,     
     margin_top=350,      
     margin_bottom=100,   
-    font_path="C:/WINDOWS/Fonts/cour.ttf",
-    title_font_path="C:/WINDOWS/Fonts/courbd.ttf",  # Fuente en negrita para título y subtítulo
-    buffer=1  
+    font_path=DEFAULT_SETTINGS["font_path"],
+    title_font_path=DEFAULT_SETTINGS["title_font_path"],  # Fuente en negrita para título y subtítulo
+    buffer=1,
+    wrap="chars",
 ):
     """
     Generates PNG and CSV with character coordinates, including spaces, with buffer for anti-aliasing.
 
+    A JSON manifest with the same name as the PNG is written next to it. It records
+    the hashes of the source text and of the image plus the font and layout
+    parameters, so the interest-area builder can take the character boxes from the
+    CSV instead of running OCR on the PNG.
+
     Args:
         text_file: Path to the input text file.
         output_image_path: Path to save the output PNG image.
-        output_csv_path: Path to save the output CSV file.
+        output_csv_path: Path to save the coordinate table; the extension (.csv,
+            .parquet, .feather or .npz) chooses the format.
         resolution: Tuple (width, height) of the output image.
         font_size: Font size for the paragraph text.
         title_font_size: Font size for the title.
@@ -39,12 +358,16 @@ def text_to_image_and_coordinates(
         font_path: Path to a TrueType font file.
         title_font_path: Path to a bold TrueType font file.
         buffer: Buffer (in pixels) to add to y_end to account for anti-aliasing.
+        wrap: Line breaking mode, one of WRAP_MODES. "chars" wraps at a character
+            count estimated from the average glyph width; "greedy" and "optimal"
+            measure the words so lines are as full as possible without
+            overflowing the margins (see break_lines).
     """
 
     try:
-        font = ImageFont.truetype(font_path, font_size)  
-        title_font = ImageFont.truetype(title_font_path, title_font_size)  # Fuente en negrita
-        subtitle_font = ImageFont.truetype(title_font_path, subtitle_font_size)  # Fuente en negrita para subtítulo
+        font = glyph_metrics(font_path, font_size)
+        title_font = glyph_metrics(title_font_path, title_font_size)  # Fuente en negrita
+        subtitle_font = glyph_metrics(title_font_path, subtitle_font_size)  # Fuente en negrita para subtítulo
     except IOError:
         print(f"Error: Could not load font from {font_path} or {title_font_path}.")
         return
@@ -56,19 +379,11 @@ def text_to_image_and_coordinates(
         print(f"Error: Text file not found at {text_file}")
         return
 
-    title, subtitle = None, None
-    text_lines = []
-
-    for line in lines:
-        stripped_line = line.strip()
-        if stripped_line.startswith("##"):
-            subtitle = stripped_line[2:].strip()
-        elif stripped_line.startswith("#"):
-            title = stripped_line[1:].strip()
-        else:
-            text_lines.append(stripped_line)
+    title, subtitle, text_lines = parse_text(lines)
 
     y = margin_top  # Primera línea disponible
+    # Lowest ink row and widest line, from the boxes laid out below (as measure_layout computes them)
+    bottom, widest = y, 0
 
     image = Image.new("RGB", resolution, "white")
     draw = ImageDraw.Draw(image)
@@ -76,34 +391,30 @@ def text_to_image_and_coordinates(
 
     # Dibujar título (si existe)
     if title:
-        left, top, right, bottom = draw.textbbox((0, 0), title, font=title_font)
+        left, top, right, bottom = draw.textbbox((0, 0), title, font=title_font.font)
         title_width = right - left
         title_x = (resolution[0] - title_width) / 2  # Centrado
-        draw.text((title_x, y), title, font=title_font, fill="black")
+        draw.text((title_x, y), title, font=title_font.font, fill="black")
 
         # Guardar coordenadas del título
-        x_pos = title_x
-        for char_index, char in enumerate(title):
-            char_left, char_top, char_right, char_bottom = draw.textbbox((x_pos, y), char, font=title_font)
-            x_center = x_pos + (char_right - char_left) / 2
-            y_center = y + (char_bottom - char_top) / 2
+        for char_index, (char, x_pos, char_right, char_bottom, x_center, y_center) in enumerate(
+                title_font.char_boxes(title, title_x, y)):
             coordinates.append([char, x_pos, y, char_right, char_bottom, 0, 0, char_index + 1, x_center, y_center])
-            x_pos += (char_right - char_left)
+            bottom = char_bottom if char_index == 0 else max(bottom, char_bottom)
+        widest = max(widest, title_font.text_width(title))
 
         y += int(title_font_size * line_spacing)  # Pasar a la siguiente línea
 
     # Dibujar subtítulo (si existe)
     if subtitle:
-        draw.text((margin_left, y), subtitle, font=subtitle_font, fill="black")
+        draw.text((margin_left, y), subtitle, font=subtitle_font.font, fill="black")
 
         # Guardar coordenadas del subtítulo
-        x_pos = margin_left
-        for char_index, char in enumerate(subtitle):
-            char_left, char_top, char_right, char_bottom = draw.textbbox((x_pos, y), char, font=subtitle_font)
-            x_center = x_pos + (char_right - char_left) / 2
-            y_center = y + (char_bottom - char_top) / 2
+        for char_index, (char, x_pos, char_right, char_bottom, x_center, y_center) in enumerate(
+                subtitle_font.char_boxes(subtitle, margin_left, y)):
             coordinates.append([char, x_pos, y, char_right, char_bottom, 0, 0, char_index + 1, x_center, y_center])
-            x_pos += (char_right - char_left)
+            bottom = char_bottom if char_index == 0 else max(bottom, char_bottom)
+        widest = max(widest, subtitle_font.text_width(subtitle))
 
         y += int(subtitle_font_size * line_spacing)  # Pasar a la siguiente línea
 
@@ -114,75 +425,207 @@ def text_to_image_and_coordinates(
     # Dibujar el texto normal
     line_number = 1
     word_number = 1
-    avg_char_width = sum(font.getlength(c) for c in "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ") / 52
-    chars_per_line = int((resolution[0] - margin_left - margin_right) / avg_char_width)
-    
+    max_width = resolution[0] - margin_left - margin_right
+
     for paragraph in text_lines:
-        wrapped_lines = textwrap.wrap(paragraph, width=chars_per_line)
+        wrapped_lines = wrap_paragraph(paragraph, font, max_width, wrap)
 
         for line in wrapped_lines:
-            x = margin_left
             words_in_line = line.split()
+            # Las palabras van separadas por un único espacio
+            line = " ".join(words_in_line)
+            draw_line(draw, font, line, margin_left, y)
 
-            for word_index, word in enumerate(words_in_line):
-                for char_index, char in enumerate(word):
-                    char_left, char_top, char_right, char_bottom = draw.textbbox((x, y), char, font=font)
-                    x_center = x + (char_right - char_left) / 2
-                    y_center = y + (char_bottom - char_top) / 2
-                    draw.text((x, y), char, font=font, fill="black")
-                    coordinates.append([char, x, y, char_right, char_bottom, line_number, word_number, char_index + 1, x_center, y_center])
-                    x += (char_right - char_left)
-
-                # Añadir espacio entre palabras
-                if word_index < len(words_in_line) - 1:
-                    space_left, space_top, space_right, space_bottom = draw.textbbox((x, y), " ", font=font)
-                    space_x_center = x + (space_right - space_left) / 2
-                    space_y_center = y + (space_bottom - space_top) / 2
-                    coordinates.append([' ', x, y, space_right, space_bottom, line_number, word_number, 0, space_x_center, space_y_center])
-                    x += (space_right - space_left)
-
-                word_number += 1
+            char_index = 0
+            boxes = font.char_boxes(line, margin_left, y)
+            bottom = max(box[3] for box in boxes)
+            widest = max(widest, font.text_width(line))
+            for char, x, char_right, char_bottom, x_center, y_center in boxes:
+                if char == " ":
+                    coordinates.append([' ', x, y, char_right, char_bottom, line_number, word_number, 0, x_center, y_center])
+                    word_number += 1
+                    char_index = 0
+                else:
+                    char_index += 1
+                    coordinates.append([char, x, y, char_right, char_bottom, line_number, word_number, char_index, x_center, y_center])
+            word_number += 1
 
             y += int(font_size * line_spacing)
             line_number += 1
 
+    if bottom > resolution[1] - margin_bottom or widest > max_width:
+        print(f"Warning: Text may not fit within the margins of {output_image_path}")
+
     image.save(output_image_path)
 
-    with open(output_csv_path, "w", newline="", encoding="utf-8") as csvfile:  
-        writer = csv.writer(csvfile)
-        writer.writerow(["Character", "X_Start", "Y_Start", "X_End", "Y_End", "Line_Number", "Word_Number", "Char_Number_in_Word", "X_Center", "Y_Center"])
+    with TableWriter(output_csv_path, RENDER_COLUMNS) as writer:
         writer.writerows(coordinates)
 
+    manifest = {
+        'renderer': 'new_stimuli/make_image_from_paragraphs.py',
+        'image': os.path.basename(output_image_path),
+        'image_sha256': file_sha256(output_image_path),
+        'coordinates': os.path.relpath(output_csv_path, os.path.dirname(os.path.abspath(output_image_path))),
+        'text_file': os.path.basename(text_file),
+        'text_sha256': hashlib.sha256("".join(lines).encode("utf-8")).hexdigest(),
+        'resolution': list(resolution),
+        'font_path': font_path,
+        'font_size': font_size,
+        'title_font_path': title_font_path,
+        'title_font_size': title_font_size,
+        'subtitle_font_size': subtitle_font_size,
+        'line_spacing': line_spacing,
+        'margin_left': margin_left,
+        'margin_right': margin_right,
+        'margin_top': margin_top,
+        'margin_bottom': margin_bottom,
+        'buffer': buffer,
+        'wrap': wrap,
+    }
+    with open(manifest_path_for(output_image_path), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
     print(f"Image saved to {output_image_path}")
     print(f"Character coordinates saved to {output_csv_path}")
 
 
-# Ruta de la carpeta que contiene los archivos de texto
-input_folder = r"C:\Users\Mario\Desktop\code_for_new_paragraphs\input"
-output_folder = r"C:\Users\Mario\Desktop\code_for_new_paragraphs\output"
-
-# Procesar todos los archivos .txt en la carpeta
-for filename in os.listdir(input_folder):
-    if filename.endswith(".txt"):
-        text_file = os.path.join(input_folder, filename)
-        output_image_path = os.path.join(output_folder, f"{os.path.splitext(filename)[0]}.png")
-        output_csv_path = os.path.join(output_folder, f"{os.path.splitext(filename)[0]}.csv")
-        
-        # Llamar a la función para procesar cada archivo .txt
-        text_to_image_and_coordinates(
-            text_file,
-            output_image_path,
-            output_csv_path,
-            resolution=(3509, 2480),
-            font_size=63,
-            title_font_size=63,
-            subtitle_font_size=63,
-            line_spacing=2,
-            margin_left=10,
-            margin_right=10,
-            margin_top=350,
-            margin_bottom=100,
-            font_path="C:/WINDOWS/Fonts/cour.ttf",
-            title_font_path="C:/WINDOWS/Fonts/courbd.ttf",  # Fuente en negrita
-            buffer=2,
-        )
+def output_paths(text_file, output_dir, coordinates_format="csv"):
+    """Returns the (png, coordinate table, manifest) paths a text file is rendered to."""
+    name = os.path.splitext(os.path.basename(text_file))[0]
+    image_path = os.path.join(output_dir, f"{name}.png")
+    return image_path, os.path.join(output_dir, f"{name}.{coordinates_format}"), manifest_path_for(image_path)
+
+
+def is_up_to_date(text_file, output_dir, settings, coordinates_format="csv"):
+    """
+    True if the outputs of `text_file` exist, are newer than it and were
+    rendered with the same settings (as recorded in the manifest).
+    """
+    paths = output_paths(text_file, output_dir, coordinates_format)
+    try:
+        if min(os.path.getmtime(path) for path in paths) < os.path.getmtime(text_file):
+            return False
+        with open(paths[2], encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return all(manifest.get(key) == (list(value) if isinstance(value, tuple) else value)
+               for key, value in settings.items())
+
+
+def _init_worker(settings):
+    # Load the fonts once per worker; every page it renders reuses them
+    glyph_metrics(settings["font_path"], settings["font_size"])
+    glyph_metrics(settings["title_font_path"], settings["title_font_size"])
+    glyph_metrics(settings["title_font_path"], settings["subtitle_font_size"])
+
+
+def _render_page(text_file, output_dir, settings, coordinates_format):
+    start = time.perf_counter()
+    image_path, csv_path, _ = output_paths(text_file, output_dir, coordinates_format)
+    text_to_image_and_coordinates(text_file, image_path, csv_path, **settings)
+    return time.perf_counter() - start
+
+
+def render_pages(text_files, output_dir, workers=None, force=False, fit=None, coordinates_format="csv",
+                 **settings):
+    """
+    Renders many text files in a process pool.
+
+    Pages whose PNG, CSV and manifest are newer than the text file and were
+    rendered with the same settings are skipped unless `force` is set.
+
+    With `fit`, the font size and line spacing of every page are chosen first
+    by fit_layout (metrics only, in this process) and printed; a page that
+    does not fit in the given ranges is rendered with the base settings.
+
+    Args:
+        text_files: List of .txt files.
+        output_dir: Folder for the <name>.png, <name>.<coordinates_format> and
+            <name>.json files.
+        workers: Number of worker processes (default: number of CPUs).
+        force: Render every page, even if its outputs are up to date.
+        fit: None, or a dict of fit_layout arguments (font_sizes,
+            line_spacings, spacing_step) to auto-fit every page.
+        coordinates_format: "csv", "parquet", "feather" or "npz".
+        **settings: Overrides of DEFAULT_SETTINGS passed to
+            text_to_image_and_coordinates.
+
+    Returns:
+        list: The text files that were rendered.
+    """
+    settings = dict(DEFAULT_SETTINGS, **settings)
+    os.makedirs(output_dir, exist_ok=True)
+
+    page_settings = {}
+    for text_file in text_files:
+        page_settings[text_file] = settings
+        if fit is not None:
+            fitted = fit_layout(text_file, **fit, **settings)
+            if fitted is None:
+                print(f"{text_file}: does not fit with the smallest font size and line spacing")
+            else:
+                page_settings[text_file] = fitted
+                print(f"{text_file}: font_size={fitted['font_size']}, title_font_size={fitted['title_font_size']}, "
+                      f"subtitle_font_size={fitted['subtitle_font_size']}, line_spacing={fitted['line_spacing']}")
+
+    todo = [t for t in text_files if force or not is_up_to_date(t, output_dir, page_settings[t], coordinates_format)]
+    if len(todo) < len(text_files):
+        print(f"Skipping {len(text_files) - len(todo)} up-to-date pages")
+    if not todo:
+        return []
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(settings,)) as executor:
+        futures = {executor.submit(_render_page, text_file, output_dir, page_settings[text_file],
+                                   coordinates_format): text_file for text_file in todo}
+        for done, future in enumerate(as_completed(futures), start=1):
+            print(f"[{done}/{len(todo)}] {futures[future]}: {future.result():.2f} s")
+    return todo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render paragraph text files to stimulus images with character coordinates.")
+    parser.add_argument("input_dir", help="Folder with the .txt files (# title, ## subtitle, paragraphs).")
+    parser.add_argument("output_dir", help="Folder for the .png, coordinate table and .json manifest of every page.")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="Number of worker processes.")
+    parser.add_argument("--font", default=DEFAULT_SETTINGS["font_path"], help="TrueType font for the text.")
+    parser.add_argument("--title-font", default=DEFAULT_SETTINGS["title_font_path"],
+                        help="TrueType font for the title and subtitle.")
+    parser.add_argument("--font-size", type=int, default=DEFAULT_SETTINGS["font_size"])
+    parser.add_argument("--title-font-size", type=int, default=DEFAULT_SETTINGS["title_font_size"])
+    parser.add_argument("--subtitle-font-size", type=int, default=DEFAULT_SETTINGS["subtitle_font_size"])
+    parser.add_argument("--resolution", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"),
+                        default=DEFAULT_SETTINGS["resolution"])
+    parser.add_argument("--line-spacing", type=float, default=DEFAULT_SETTINGS["line_spacing"])
+    parser.add_argument("--wrap", choices=WRAP_MODES, default=DEFAULT_SETTINGS["wrap"],
+                        help="Line breaking: estimated character count (as in the experiments), or measured "
+                             "greedy/optimal breaking.")
+    parser.add_argument("--coordinates-format", choices=[ext[1:] for ext in FORMATS], default="csv",
+                        help="Format of the character coordinate tables.")
+    parser.add_argument("--fit", action="store_true",
+                        help="Choose the largest font size, then line spacing, with which each page fits.")
+    parser.add_argument("--fit-font-sizes", type=int, nargs=2, metavar=("MIN", "MAX"), default=(30, 120))
+    parser.add_argument("--fit-line-spacings", type=float, nargs=2, metavar=("MIN", "MAX"), default=(1.5, 2.5))
+    parser.add_argument("--force", action="store_true", help="Render every page, even if its outputs are up to date.")
+    args = parser.parse_args()
+
+    text_files = sorted(os.path.join(args.input_dir, name) for name in os.listdir(args.input_dir)
+                        if name.endswith(".txt"))
+    if not text_files:
+        parser.error(f"no .txt files in {args.input_dir}")
+
+    start = time.perf_counter()
+    rendered = render_pages(text_files, args.output_dir, workers=args.workers, force=args.force,
+                            font_path=args.font, title_font_path=args.title_font, font_size=args.font_size,
+                            title_font_size=args.title_font_size, subtitle_font_size=args.subtitle_font_size,
+                            resolution=tuple(args.resolution), line_spacing=args.line_spacing,
+                            wrap=args.wrap, coordinates_format=args.coordinates_format,
+                            fit=dict(font_sizes=tuple(args.fit_font_sizes),
+                                     line_spacings=tuple(args.fit_line_spacings)) if args.fit else None)
+    print(f"Rendered {len(rendered)} of {len(text_files)} pages in {time.perf_counter() - start:.1f} s")
+
+
+# Example usage:
+#   python new_stimuli/make_image_from_paragraphs.py new_stimuli/input new_stimuli/output -j 8
+if __name__ == "__main__":
+    main()
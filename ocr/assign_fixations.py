@@ -0,0 +1,226 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from coordinate_tables import read_table, write_table
+from interest_areas import InterestAreas, _group_starts
+
+# Columns added to the fixations, named as in GazeGenie's corrected_fixations_data.csv
+# (0-based numbers; a suffix such as "_Wisdom_of_Crowds" names the correction)
+ASSIGNMENT_COLUMNS = ['line_num', 'letternum', 'letter', 'line_let', 'on_word_number', 'on_word', 'word_land',
+                      'line_word']
+
+
+def _positions_within(starts):
+    """0-based position of every row within its run (runs begin where `starts` is True)."""
+    positions = np.arange(len(starts))
+    return positions - np.maximum.accumulate(np.where(starts, positions, 0))
+
+
+def _runs_within(starts, outer_starts):
+    """0-based number of every run within its outer run (e.g. words within lines)."""
+    count = np.cumsum(starts)
+    return count - np.maximum.accumulate(np.where(outer_starts, count, 0))
+
+
+class CharacterIndex:
+    """
+    Lookup structure over the character interest areas of one or more pages
+    that assigns fixations to characters, words and lines.
+
+    The characters of every (trial, line) are sorted by x and laid end to end
+    on one axis, each line shifted past the previous one, so that a single
+    searchsorted places all fixations of all trials at once; lines are found
+    the same way from their y centers. Build it once per set of pages and
+    call assign for every batch of fixations.
+    """
+
+    def __init__(self, areas):
+        """
+        Args:
+            areas: Character-level InterestAreas (from recognize_text, the
+                renderer, word_df_with_region_info.csv...).
+        """
+        df = areas.frame
+        trials = pd.Categorical(df['trial_id'])
+        self.trials = trials.categories
+        order = np.lexsort((df['char_xmin'].to_numpy(), df['assigned_line'].to_numpy(), trials.codes))
+        df = df.iloc[order]
+        trial = trials.codes[order].astype(np.int64)
+        line = df['assigned_line'].to_numpy()
+        word = df['word_nr'].to_numpy()
+
+        trial_start = _group_starts([trial])
+        line_start = _group_starts([trial, line])
+        word_start = _group_starts([trial, line, word])
+        # Character and line numbers restart on every page, as in GazeGenie
+        self.letternum = _positions_within(trial_start)
+        self.line_let = _positions_within(line_start)
+        self.word_land = _positions_within(word_start)
+        self.line_word = _runs_within(word_start, line_start)
+        self.on_word_number = _runs_within(word_start, trial_start)
+        # Letters and words are returned as categoricals: only their codes are gathered
+        self.letter = pd.Categorical(df['char'])
+        self.on_word = pd.Categorical(df['word'])
+
+        # Lines: one slot per (trial, line), numbered 0.. within each trial
+        slot = np.cumsum(line_start) - 1
+        self.char_trial, self.char_slot = trial, slot
+        line_rows = np.flatnonzero(line_start)
+        self.line_trial = trial[line_rows]
+        self.line_num = _positions_within(trial_start[line_rows])
+        line_y = df.groupby(slot)['char_y_center'].mean().to_numpy()
+
+        # Shift every trial (for lines) and every line (for characters) past the previous one
+        x_min, x_max = df['char_xmin'].to_numpy(np.float64), df['char_xmax'].to_numpy(np.float64)
+        self.x_span = float(max(np.abs(x_min).max(), np.abs(x_max).max()) * 4 + 1) if len(df) else 1.0
+        self.y_span = float(np.abs(line_y).max() * 4 + 1) if len(line_y) else 1.0
+        self.x_limit, self.y_limit = (self.x_span - 1) / 2, (self.y_span - 1) / 2
+        self.char_left = x_min + slot * self.x_span
+        self.char_right = x_max + slot * self.x_span
+        line_key = line_y + self.line_trial * self.y_span
+        self.line_order = np.argsort(line_key, kind='stable')
+        self.line_key = line_key[self.line_order]
+        self.line_first = line_rows
+        self.line_last = np.append(line_rows[1:], len(df)) - 1
+
+    def lines(self, trial, y):
+        """
+        Line slot of the nearest line (by y center) of the fixation's trial,
+        or -1 for fixations of trials without areas.
+        """
+        # Clipping keeps far-off fixations within the band of their trial
+        key = np.clip(y, -self.y_limit, self.y_limit) + trial * self.y_span
+        right = np.clip(np.searchsorted(self.line_key, key), 0, len(self.line_key) - 1)
+        left = np.maximum(right - 1, 0)
+        left_ok = self.line_trial[self.line_order[left]] == trial
+        right_ok = self.line_trial[self.line_order[right]] == trial
+        use_left = left_ok & (~right_ok | (np.abs(key - self.line_key[left]) <= np.abs(self.line_key[right] - key)))
+        slot = self.line_order[np.where(use_left, left, right)]
+        return np.where((left_ok | right_ok) & (trial >= 0), slot, -1)
+
+    def characters(self, slot, x, x_tolerance=0.0):
+        """
+        Character row of every fixation on its line: the character whose box
+        contains x, the nearer one in a gap between boxes, and the first or
+        last one within x_tolerance pixels of the line ends; -1 otherwise.
+        """
+        valid = slot >= 0
+        slot = np.where(valid, slot, 0)
+        key = np.clip(x, -self.x_limit, self.x_limit) + slot * self.x_span
+        first, last = self.line_first[slot], self.line_last[slot]
+        row = np.clip(np.searchsorted(self.char_left, key, side='right') - 1, first, last)
+        # In a gap, the next character may be nearer than the one to the left
+        following = np.minimum(row + 1, last)
+        nearer_next = (key > self.char_right[row]) & (row < last) & \
+                      (self.char_left[following] - key < key - self.char_right[row])
+        row = np.where(nearer_next, following, row)
+        inside = (key >= self.char_left[first] - x_tolerance) & (key <= self.char_right[last] + x_tolerance)
+        return np.where(valid & inside, row, -1)
+
+    def assign(self, fixations, x='x', y='y', line=None, suffix='', x_tolerance=0.0):
+        """
+        Assigns fixations to the character, word and line they are on.
+
+        Args:
+            fixations: DataFrame with trial_id, x and y columns.
+            x, y: Columns with the fixation position (e.g. y_Wisdom_of_Crowds
+                for drift-corrected fixations).
+            line: Optional column with 0-based line numbers chosen elsewhere
+                (e.g. line_num_Wisdom_of_Crowds); by default the line with the
+                nearest y center is used.
+            suffix: Appended to the ASSIGNMENT_COLUMNS names.
+            x_tolerance: Pixels before the first and after the last character
+                of a line that still count as on the line.
+
+        Returns:
+            pandas.DataFrame: The fixations with the ASSIGNMENT_COLUMNS (letter
+            and word as categoricals); they are NA for fixations off the text.
+        """
+        trial_ids = fixations['trial_id']
+        if not isinstance(trial_ids.dtype, pd.CategoricalDtype):
+            trial_ids = trial_ids.astype('category')
+        # Map the trial_ids of the fixations (strings or numbers) to those of the areas; -1 if unknown
+        lookup = np.append(self.trials.get_indexer(trial_ids.cat.categories.astype(str)), -1)
+        trial = lookup[trial_ids.cat.codes.to_numpy()].astype(np.int64)
+        fx = fixations[x].to_numpy(np.float64)
+        if line is None:
+            slot = self.lines(trial, fixations[y].to_numpy(np.float64))
+        else:
+            # Line numbers are 0-based within each trial: find the slot of that line
+            line_nr = fixations[line].to_numpy(np.float64)
+            key = trial * (len(self.line_num) + 1) + np.nan_to_num(line_nr, nan=-1)
+            slots = self.line_trial * (len(self.line_num) + 1) + self.line_num
+            slot = np.clip(np.searchsorted(slots, key), 0, len(slots) - 1)
+            slot = np.where((slots[slot] == key) & (trial >= 0) & ~np.isnan(line_nr), slot, -1)
+        row = self.characters(slot, fx, x_tolerance)
+
+        on_text = row >= 0
+        safe_row = np.where(on_text, row, 0)
+
+        def numbers(values, rows=safe_row, found=on_text):
+            return pd.arrays.IntegerArray(np.where(found, values[rows], 0).astype(np.int64), ~found)
+
+        def texts(values):
+            return pd.Categorical.from_codes(np.where(on_text, values.codes[safe_row], -1), values.categories)
+
+        columns = {
+            'line_num': numbers(self.line_num, np.maximum(slot, 0), slot >= 0),
+            'letternum': numbers(self.letternum),
+            'letter': texts(self.letter),
+            'line_let': numbers(self.line_let),
+            'on_word_number': numbers(self.on_word_number),
+            'on_word': texts(self.on_word),
+            'word_land': numbers(self.word_land),
+            'line_word': numbers(self.line_word),
+        }
+        return fixations.assign(**{name + suffix: pd.Series(values, index=fixations.index)
+                                   for name, values in columns.items()})
+
+
+def assign_fixations(fixations, areas, **options):
+    """
+    Assigns fixations to characters, words and lines (see CharacterIndex.assign).
+
+    Args:
+        fixations: DataFrame like fixation_data.csv (x, y, trial_id, ...).
+        areas: InterestAreas of the pages, with trial_ids matching those of
+            the fixations.
+        **options: x, y, line, suffix and x_tolerance of CharacterIndex.assign.
+
+    Returns:
+        pandas.DataFrame: The fixations with the ASSIGNMENT_COLUMNS.
+    """
+    return CharacterIndex(areas).assign(fixations, **options)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Assign fixations to the characters, words and lines they are on.')
+    parser.add_argument('fixations', help='fixation_data.csv-shaped table.')
+    parser.add_argument('areas', nargs='+', help='Interest-area tables or DynamicAOI XML files; the trial_id of a '
+                                                 'file without one is its name.')
+    parser.add_argument('-o', '--output', default='assigned_fixations.csv', help='Output table.')
+    parser.add_argument('--y', default='y', help='Column with the fixation y (e.g. a drift-corrected y).')
+    parser.add_argument('--line', help='Column with 0-based line numbers to use instead of the nearest line.')
+    parser.add_argument('--suffix', default='', help='Suffix for the added columns.')
+    parser.add_argument('--x-tolerance', type=float, default=0.0,
+                        help='Pixels beyond the line ends that still count as on the line.')
+    args = parser.parse_args()
+
+    areas = InterestAreas(pd.concat([InterestAreas.read(path).frame for path in args.areas], ignore_index=True))
+    fixations = read_table(args.fixations)
+    start = time.perf_counter()
+    assigned = assign_fixations(fixations, areas, y=args.y, line=args.line, suffix=args.suffix,
+                                x_tolerance=args.x_tolerance)
+    elapsed = time.perf_counter() - start
+    write_table(assigned, args.output)
+    on_text = assigned['letternum' + args.suffix].notna().sum()
+    print(f"{on_text} of {len(assigned)} fixations on the text, assigned in {elapsed:.3f} s; saved to {args.output}")
+
+
+# Example usage:
+#   python ocr/assign_fixations.py "prueba 1920/fixation_data.csv" "prueba 1920/df_word_chars_10.csv"
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from coordinate_tables import FORMATS, TableWriter, write_table
+from pages import find_page_images
+
+
+def _init_worker(omp_thread_limit):
+    # Tesseract reads OMP_THREAD_LIMIT from the environment of each call, so
+    # every worker caps the threads of the Tesseract processes it starts
+    if omp_thread_limit:
+        os.environ['OMP_THREAD_LIMIT'] = str(omp_thread_limit)
+
+
+def _ocr_page(image_path, tesseract_config, single_pass, rounded, use_cache, roi, use_manifest):
+    start = time.perf_counter()
+    if rounded:
+        from create_coord20 import recognize_text
+        df_word_chars = recognize_text(image_path, tesseract_config)
+    else:
+        from render_manifest import interest_areas
+        df_word_chars = interest_areas(image_path, use_manifest=use_manifest, tesseract_config=tesseract_config,
+                                       single_pass=single_pass, use_cache=use_cache, roi=roi)
+    return df_word_chars, time.perf_counter() - start
+
+
+def batch_recognize_text(image_paths, workers=None, omp_thread_limit=1, tesseract_config='--psm 6 -l spa',
+                         single_pass=False, rounded=False, use_cache=True, roi=None, use_manifest=True,
+                         output_dir=None, output_format='csv', output=None):
+    """
+    Runs recognize_text over many pages in a process pool.
+
+    Pages are handed out to `workers` processes; results come back in the
+    order of `image_paths` whatever order the pages finish in.
+
+    Args:
+        image_paths: List of page images.
+        workers: Number of worker processes (default: number of CPUs).
+        omp_thread_limit: OMP_THREAD_LIMIT for Tesseract inside each worker.
+            Keep it at 1 when running several workers so the processes do not
+            oversubscribe the CPUs; None leaves Tesseract's default.
+        tesseract_config: Configuration string passed to Tesseract.
+        single_pass: Use the single hOCR pass of recognize_text.
+        rounded: Use the integer-coordinate variant from create_coord20.py.
+        use_cache: If False, bypass the OCR cache and always run Tesseract.
+        roi: None, 'ink' or 'lines' to OCR only the inked regions of each page.
+        use_manifest: Take the interest areas of pages rendered by
+            new_stimuli/make_image_from_paragraphs.py from their render
+            manifest and coordinate CSV instead of OCR (not with `rounded`).
+        output_dir: If given, write one <trial_id>.<output_format> per page to
+            this folder.
+        output_format: 'csv', 'parquet', 'feather' or 'npz' for output_dir.
+        output: If given, write the interest areas of all pages to one table
+            (format from its extension), streamed in input order as soon as
+            all earlier pages are done.
+
+    Returns:
+        list: One df_word_chars DataFrame per page, in input order.
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    results = [None] * len(image_paths)
+    writer = None
+    next_to_write = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(omp_thread_limit,)) as executor:
+        futures = {executor.submit(_ocr_page, path, tesseract_config, single_pass, rounded, use_cache, roi,
+                                   use_manifest): i
+                   for i, path in enumerate(image_paths)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            i = futures[future]
+            df_word_chars, seconds = future.result()
+            results[i] = df_word_chars
+            if output_dir:
+                trial_id = os.path.splitext(os.path.basename(image_paths[i]))[0]
+                write_table(df_word_chars, os.path.join(output_dir, f'{trial_id}.{output_format}'))
+            if output:
+                writer = writer or TableWriter(output, df_word_chars.columns)
+                while next_to_write < len(results) and results[next_to_write] is not None:
+                    writer.write_frame(results[next_to_write])
+                    next_to_write += 1
+            print(f"[{done}/{len(image_paths)}] {image_paths[i]}: {len(df_word_chars)} characters in {seconds:.1f} s")
+    if writer:
+        writer.close()
+    if use_cache:
+        # Workers evict only every few hundred stores: trim the cache once for the whole batch
+        from ocr_cache import OcrCache
+        OcrCache().evict()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create character interest areas for a set of page images.')
+    parser.add_argument('inputs', nargs='+', help='Image files, directories or glob patterns.')
+    parser.add_argument('-o', '--output', help='Combined table with the interest areas of all pages '
+                                               '(.csv, .parquet, .feather or .npz).')
+    parser.add_argument('--output-dir', help='Folder for one table per page.')
+    parser.add_argument('--format', choices=[ext[1:] for ext in FORMATS], default='csv',
+                        help='Format of the per-page tables in --output-dir.')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(), help='Number of worker processes.')
+    parser.add_argument('--omp-thread-limit', type=int, default=1,
+                        help='OMP_THREAD_LIMIT for each Tesseract call (0 keeps the Tesseract default).')
+    parser.add_argument('--config', default='--psm 6 -l spa', help='Tesseract configuration string.')
+    parser.add_argument('--single-pass', action='store_true', help='Get word and character boxes from one hOCR pass.')
+    parser.add_argument('--rounded', action='store_true',
+                        help='Use the integer-coordinate variant from create_coord20.py.')
+    parser.add_argument('--roi', choices=['ink', 'lines'],
+                        help='OCR only the box around the ink, or each text band separately.')
+    parser.add_argument('--no-cache', action='store_true', help='Always run Tesseract, ignoring the OCR cache.')
+    parser.add_argument('--ignore-manifest', action='store_true',
+                        help='OCR rendered pages too instead of reading their render manifest.')
+    args = parser.parse_args()
+
+    if not args.output and not args.output_dir:
+        parser.error('give --output and/or --output-dir')
+
+    image_paths = find_page_images(args.inputs)
+    if not image_paths:
+        parser.error('no images found')
+    print(f"Processing {len(image_paths)} pages with {args.workers} workers")
+
+    start = time.perf_counter()
+    results = batch_recognize_text(image_paths, workers=args.workers, omp_thread_limit=args.omp_thread_limit or None,
+                                   tesseract_config=args.config, single_pass=args.single_pass,
+                                   rounded=args.rounded, use_cache=not args.no_cache, roi=args.roi,
+                                   use_manifest=not args.ignore_manifest, output_dir=args.output_dir,
+                                   output_format=args.format, output=args.output)
+    if args.output:
+        print(f"Interest areas of {len(results)} pages saved to {args.output}")
+    print(f"Done in {time.perf_counter() - start:.1f} s")
+
+
+# Example usage:
+#   python ocr/batch_ocr.py "eri_new/imágenes GazeGenie" -o df_word_chars_all.csv -j 8
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+# Columns of SMI BeGaze event exports that are read, their short names and types.
+# Trial times stay float64 (long multi-trial exports pass float32 precision);
+# positions, sizes and saccade metrics are float32.
+EVENT_COLUMNS = {
+    'Trial': ('trial', 'category'),
+    'Stimulus': ('stimulus', 'category'),
+    'Participant': ('participant', 'category'),
+    'Category': ('category', 'category'),
+    'Eye L/R': ('eye', 'category'),
+    'Index': ('index', 'Int32'),
+    'Event Start Trial Time [ms]': ('start', np.float64),
+    'Event End Trial Time [ms]': ('stop', np.float64),
+    'Event Duration [ms]': ('duration', np.float32),
+    'Fixation Position X [px]': ('x', np.float32),
+    'Fixation Position Y [px]': ('y', np.float32),
+    'Fixation Average Pupil Diameter [mm]': ('pupil_diameter', np.float32),
+    'Fixation Dispersion X [px]': ('dispersion_x', np.float32),
+    'Fixation Dispersion Y [px]': ('dispersion_y', np.float32),
+    'Saccade Start Position X [px]': ('saccade_start_x', np.float32),
+    'Saccade Start Position Y [px]': ('saccade_start_y', np.float32),
+    'Saccade End Position X [px]': ('saccade_end_x', np.float32),
+    'Saccade End Position Y [px]': ('saccade_end_y', np.float32),
+    'Saccade Amplitude [°]': ('saccade_amplitude', np.float32),
+    'Saccade Velocity Peak [°/s]': ('saccade_peak_velocity', np.float32),
+    'AOI Name': ('aoi_name', 'category'),
+}
+SHORT_NAMES = {short: column for column, (short, _) in EVENT_COLUMNS.items()}
+
+# Columns of fixation_data.csv (read_fixation_data.R)
+FIXATION_DATA_COLUMNS = ['x', 'y', 'start', 'stop', 'subject', 'trial_id']
+
+# Rows per chunk: about 50 MB of a 45-column export
+CHUNK_ROWS = 200_000
+
+
+def _missing_column(dtype, n_rows):
+    if dtype == 'category':
+        return pd.Categorical([np.nan] * n_rows)
+    return pd.array([pd.NA] * n_rows, dtype=dtype) if dtype == 'Int32' else np.full(n_rows, np.nan, dtype=dtype)
+
+
+def iter_begaze_chunks(path, columns=None, chunksize=CHUNK_ROWS):
+    """
+    Reads a BeGaze event export in chunks of rows.
+
+    Only the requested columns are parsed, with the types of EVENT_COLUMNS and
+    "-" and empty cells as NA (as read_tsv does); columns that this export
+    does not have (e.g. the saccade columns of fixation-only exports) come
+    back as NA.
+
+    Args:
+        path: Tab-separated export (Trial, Participant, Category, ... columns).
+        columns: Short names from EVENT_COLUMNS to read (default: all).
+        chunksize: Rows per chunk.
+
+    Yields:
+        pandas.DataFrame: Chunks with the short column names.
+    """
+    wanted = [SHORT_NAMES[short] for short in (columns or SHORT_NAMES)]
+    if 'Category' not in wanted:
+        wanted.append('Category')
+    header = pd.read_csv(path, sep='\t', nrows=0, encoding='utf-8').columns
+    present = [column for column in wanted if column in header]
+
+    reader = pd.read_csv(path, sep='\t', usecols=present, dtype={column: EVENT_COLUMNS[column][1] for column in present},
+                         na_values=['-', ''], keep_default_na=False, encoding='utf-8', chunksize=chunksize)
+    with reader:
+        for chunk in reader:
+            for column in wanted:
+                if column not in present:
+                    chunk[column] = _missing_column(EVENT_COLUMNS[column][1], len(chunk))
+            yield chunk[wanted].rename(columns={column: EVENT_COLUMNS[column][0] for column in wanted})
+
+
+def subject_numbers(participant):
+    """
+    Subject number of every row: the first run of digits of Participant
+    ("BC03008" -> 3008), NA when there is none, as str_extract(Participant,
+    "\\d+") in read_fixation_data.R. The regex runs once per participant.
+    """
+    participant = participant.astype('category')
+    numbers = pd.to_numeric(participant.cat.categories.str.extract(r'(\d+)', expand=False))
+    codes = participant.cat.codes.to_numpy()
+    values = np.asarray(numbers, dtype=np.float64)[codes] if len(numbers) else np.full(len(codes), np.nan)
+    values[codes < 0] = np.nan
+    return pd.Series(values, index=participant.index).astype('Int64')
+
+
+def _concat(frames):
+    """Concatenates chunks, merging the categories of categorical columns."""
+    if not frames:
+        return None
+    df = pd.concat(frames, ignore_index=True)
+    for name in frames[0].columns:
+        if isinstance(frames[0][name].dtype, pd.CategoricalDtype) and not isinstance(df[name].dtype,
+                                                                                  pd.CategoricalDtype):
+            df[name] = pd.api.types.union_categoricals([frame[name] for frame in frames], ignore_order=True)
+    return df
+
+
+def read_begaze_events(path, categories=('Fixation', 'Saccade', 'Blink'), columns=None, chunksize=CHUNK_ROWS):
+    """
+    Reads a BeGaze event export and splits it by event Category in one pass.
+
+    The file is read chunk by chunk (iter_begaze_chunks); only the rows of
+    the requested categories are kept, so exports of many participants that
+    do not fit in memory as a whole can be read.
+
+    Args:
+        path: Tab-separated export.
+        categories: Categories to keep (Fixation, Saccade, Blink, Separator...);
+            None keeps all.
+        columns: Short names from EVENT_COLUMNS to read (default: all).
+        chunksize: Rows per chunk.
+
+    Returns:
+        dict: Category -> DataFrame with the short column names and a subject
+        column; categories without rows are left out.
+    """
+    parts = {}
+    for chunk in iter_begaze_chunks(path, columns, chunksize):
+        if 'participant' in chunk.columns:
+            chunk['subject'] = subject_numbers(chunk['participant'])
+        for category, rows in chunk.groupby('category', observed=True, sort=False):
+            if categories is None or category in categories:
+                parts.setdefault(category, []).append(rows.drop(columns='category'))
+    return {category: _concat(frames).reset_index(drop=True) for category, frames in parts.items()}
+
+
+def read_fixations(path, trial_id=None, chunksize=CHUNK_ROWS):
+    """
+    Returns the fixations of an export in the fixation_data.csv layout of
+    read_fixation_data.R: x, y, start and stop rounded to whole pixels and
+    milliseconds, subject and trial_id.
+
+    Args:
+        path: Tab-separated export.
+        trial_id: trial_id of every fixation (default: the Stimulus name
+            without its extension).
+        chunksize: Rows per chunk.
+    """
+    columns = ['stimulus', 'participant', 'start', 'stop', 'x', 'y']
+    events = read_begaze_events(path, categories=('Fixation',), columns=columns, chunksize=chunksize)
+    if 'Fixation' not in events:
+        return pd.DataFrame(columns=FIXATION_DATA_COLUMNS)
+    df = events['Fixation']
+    fixations = pd.DataFrame({name: pd.array(df[name].to_numpy(np.float64).round(), dtype='Int64')
+                              for name in ['x', 'y', 'start', 'stop']})
+    fixations['subject'] = df['subject'].to_numpy()
+    if trial_id is None:
+        fixations['trial_id'] = df['stimulus'].astype(str).str.replace(r'\.[^.]*$', '', regex=True).to_numpy()
+    else:
+        fixations['trial_id'] = trial_id
+    return fixations
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract the fixations of an SMI BeGaze event export.')
+    parser.add_argument('export', help='Tab-separated BeGaze export (.txt).')
+    parser.add_argument('-o', '--output', default='fixation_data.csv', help='Output CSV.')
+    parser.add_argument('--trial-id', default=None, help='trial_id of all fixations (default: the stimulus name).')
+    parser.add_argument('--chunksize', type=int, default=CHUNK_ROWS, help='Rows read at a time.')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    fixations = read_fixations(args.export, args.trial_id, args.chunksize)
+    fixations.to_csv(args.output, index=False, na_rep='NA')
+    print(f"{len(fixations)} fixations saved to {args.output} in {time.perf_counter() - start:.2f} s")
+
+
+# Example usage:
+#   python ocr/begaze_events.py ocr/results_pagina1.txt --trial-id pagina1 -o fixation_data.csv
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from drift_cache import AssignmentCache
+from drift_correction import ALGORITHMS, CONSENSUS, correct_drift, page_geometry, warp
+from ink_regions import _runs, find_text_regions, ink_mask
+from interest_areas import InterestAreas
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eri_new')
+IMAGE_DIR = os.path.join(DATA_DIR, 'imágenes GazeGenie')
+
+
+def page_word_boxes(path, trial_id, min_word_gap=6):
+    """
+    Word boxes of a GazeGenie page image, from its ink: line bands from the
+    horizontal projection profile, words from the runs of inked columns of
+    each band (gaps of at least min_word_gap pixels separate words).
+
+    Returns:
+        pandas.DataFrame: Word boxes in the ocr/create_coord.py schema, with
+        placeholder words.
+    """
+    image = Image.open(path)
+    page = Image.new('RGB', image.size, 'white')
+    page.paste(image, mask=image.getchannel('A') if image.mode == 'RGBA' else None)
+    ink = ink_mask(page)
+    rows = []
+    for line, (_, top, _, bottom) in enumerate(find_text_regions(page, 'lines', padding=0)):
+        columns = ink[top:bottom].any(axis=0)
+        starts, ends = _runs(columns)
+        separate = (starts[1:] - ends[:-1]) >= min_word_gap
+        lefts = starts[np.concatenate([[True], separate])]
+        rights = ends[np.concatenate([separate, [True]])]
+        for word, (left, right) in enumerate(zip(lefts, rights)):
+            rows.append({'char': f'w{word + 1}', 'char_x_center': (left + right) / 2,
+                         'char_y_center': (top + bottom) / 2, 'char_xmax': right, 'char_xmin': left,
+                         'char_ymax': bottom, 'char_ymin': top, 'trial_id': trial_id, 'assigned_line': line + 1})
+    return pd.DataFrame(rows)
+
+
+def gazegenie_agreement(areas):
+    """
+    Share of the fixations of corrected_fixations_data.csv (one reading of
+    page 18) that every algorithm puts on the same line as GazeGenie.
+    """
+    reference = pd.read_csv(os.path.join(DATA_DIR, 'corrected_fixations_data.csv'), encoding='utf-8-sig')
+    fixations = pd.DataFrame({'x': reference['x'], 'y': reference['y'], 'start': reference['start_time'],
+                              'subject': reference['subject'], 'trial_id': 'page18'})
+    corrected = correct_drift(fixations, areas)
+    return {name: float((corrected[f'line_num_{name}'].to_numpy() == reference[f'line_num_{name}'].to_numpy()).mean())
+            for name in [*ALGORITHMS, CONSENSUS]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the drift-correction algorithms on eri_new.')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(), help='Processes for the pooled run.')
+    args = parser.parse_args()
+
+    pages = sorted(os.path.splitext(name)[0] for name in os.listdir(IMAGE_DIR) if name.endswith('.png'))
+    boxes = pd.concat([page_word_boxes(os.path.join(IMAGE_DIR, f'{page}.png'), page) for page in pages],
+                      ignore_index=True)
+    areas = InterestAreas.from_frame(boxes, 'boxes')
+    fixations = pd.read_csv(os.path.join(DATA_DIR, 'fixation_data.csv'))
+    n_trials = fixations.groupby(['subject', 'trial_id']).ngroups
+    print(f"{len(fixations)} fixations, {n_trials} trials, {len(areas)} words on {len(pages)} pages")
+
+    for name in ALGORITHMS:
+        start = time.perf_counter()
+        correct_drift(fixations, areas, [name])
+        elapsed = time.perf_counter() - start
+        print(f"  {name:<8} {elapsed:7.2f} s  {len(fixations) / elapsed / 1e3:8.1f}k fixations/s")
+
+    for workers in sorted({1, args.workers}):
+        start = time.perf_counter()
+        correct_drift(fixations, areas, workers=workers)
+        print(f"All algorithms, {workers} process(es): {time.perf_counter() - start:.2f} s")
+
+    # Wisdom of Crowds with cached per-trial results: only a retuned algorithm runs again
+    with tempfile.TemporaryDirectory() as directory:
+        cache = AssignmentCache(directory)
+        for label, options in [('cold cache', None), ('warm cache', None),
+                               ('warm cache, chain retuned', {'chain': {'y_thresh': 40}})]:
+            start = time.perf_counter()
+            correct_drift(fixations, areas, options=options, cache=cache)
+            print(f"All algorithms and consensus, {label}: {time.perf_counter() - start:.2f} s")
+
+    # Banded warp against the full DTW
+    geometry = page_geometry(areas)
+    trials = [(trial.sort_values('start')[['x', 'y']].to_numpy(np.float64), geometry[trial_id])
+              for (_, trial_id), trial in fixations.groupby(['subject', 'trial_id'])]
+    full = None
+    for band in (None, 0.3, 0.1):
+        start = time.perf_counter()
+        lines = [warp(XY, line_Y, word_XY, band=band) for XY, (line_Y, word_XY) in trials]
+        elapsed = time.perf_counter() - start
+        full = full or lines
+        same = sum(int((banded == exact).sum()) for banded, exact in zip(lines, full)) / len(fixations)
+        print(f"warp, DTW band {band}: {elapsed:.2f} s, {same:.2%} of fixations on the same line as the full DTW")
+
+    print("Agreement with GazeGenie on page 18:")
+    for name, share in gazegenie_agreement(areas).items():
+        print(f"  {name:<17} {share:.1%}")
+
+
+# Example usage:
+#   python ocr/benchmark_drift_correction.py -j 4
+if __name__ == '__main__':
+    main()
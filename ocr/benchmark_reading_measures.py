@@ -0,0 +1,77 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from interest_areas import InterestAreas
+from reading_measures import FIXATION_MEASURES, fixation_measures, word_measures, word_table
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eri_new')
+PAGE_18 = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'new_stimuli', 'output', '18.csv')
+SUFFIX = '_Wisdom_of_Crowds'
+
+
+def gazegenie_reading():
+    """
+    The reading of page 18 in corrected_fixations_data.csv, without GazeGenie's
+    measure columns, and the word table implied by its assignment.
+    """
+    reference = pd.read_csv(os.path.join(DATA_DIR, 'corrected_fixations_data.csv'), encoding='utf-8-sig')
+    reference = reference.rename(columns={'start_time': 'start'})
+    on_words = reference.drop_duplicates(f'on_word_number{SUFFIX}').dropna(subset=[f'on_word_number{SUFFIX}'])
+    words = pd.DataFrame({'trial_id': on_words['trial_id'], 'word_number': on_words[f'on_word_number{SUFFIX}'],
+                          'word': on_words[f'on_word{SUFFIX}'], 'word_length': on_words[f'on_word{SUFFIX}'].str.len(),
+                          'assigned_line': on_words[f'line_num{SUFFIX}'],
+                          'sentence_num': on_words[f'on_sentence_num{SUFFIX}']})
+    return reference, words
+
+
+def word_table_differences(words):
+    """
+    Columns of word_table, built from the renderer's coordinates of page 18,
+    that differ from GazeGenie's on the words GazeGenie assigned fixations to.
+    GazeGenie's line_num is the line of the fixation, not of the word, so
+    assigned_line is not compared.
+    """
+    own = word_table(InterestAreas.read(PAGE_18)).set_index('word_number')
+    theirs = words.set_index(words['word_number'].astype(int))
+    own = own.loc[theirs.index]
+    return [name for name in ['word', 'sentence_num']
+            if not (own[name].astype(str).to_numpy() == theirs[name].astype(str).to_numpy()).all()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the reading-measures engine on copies of page 18.')
+    parser.add_argument('-n', '--copies', type=int, default=10000, help='Readings to measure (copies of page 18).')
+    args = parser.parse_args()
+
+    reference, words = gazegenie_reading()
+    fixations = reference.drop(columns=[name + SUFFIX for name in FIXATION_MEASURES])
+    measured = fixation_measures(fixations, words, suffix=SUFFIX)
+    differ = [name for name in FIXATION_MEASURES
+              if not (measured[name + SUFFIX].astype('float64').fillna(-1).to_numpy() ==
+                      reference[name + SUFFIX].astype('float64').fillna(-1).to_numpy()).all()]
+    print(f"Measures differing from GazeGenie on page 18: {', '.join(differ) or 'none'}")
+    differ = word_table_differences(words)
+    print(f"word_table columns differing from GazeGenie on page 18: {', '.join(differ) or 'none'}")
+
+    # Many readings of the page, in shuffled row order
+    copies = pd.concat([fixations] * args.copies, ignore_index=True)
+    copies['subject'] = np.repeat(np.arange(args.copies), len(fixations))
+    copies = copies.sample(frac=1, random_state=0)
+    start = time.perf_counter()
+    measured = fixation_measures(copies, words, suffix=SUFFIX)
+    middle = time.perf_counter()
+    per_word = word_measures(measured, words, suffix=SUFFIX)
+    end = time.perf_counter()
+    print(f"{len(copies)} fixations: fixation measures {middle - start:.2f} s, "
+          f"{len(per_word)} word measures {end - middle:.2f} s "
+          f"({len(copies) / (end - start) / 1e6:.2f}M fixations/s)")
+
+
+# Example usage:
+#   python ocr/benchmark_reading_measures.py -n 10000
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+import time
+import random
+
+import pandas as pd
+
+from create_interest_areas_from_image2 import WORD_CHAR_COLUMNS, build_word_chars
+
+
+def make_tesseract_tables(n_glyphs, seed=0, image_width=3509, char_width=38, line_height=126):
+    """
+    Builds synthetic image_to_data / image_to_boxes tables for a page of text.
+
+    The page is laid out like the stimulus pages (monospaced glyphs, one
+    paragraph, fixed line height) so the benchmark does not need Tesseract.
+
+    Args:
+        n_glyphs: Approximate number of glyphs on the page.
+        seed: Seed for the word length generator.
+        image_width: Page width in pixels.
+        char_width: Glyph advance in pixels.
+        line_height: Distance between line tops in pixels.
+
+    Returns:
+        tuple: (df_words, df_chars), with df_chars already in image coordinates.
+    """
+    rng = random.Random(seed)
+    words, chars = [], []
+    line_num, word_num = 1, 0
+    x, y = 10, 350
+    line_rows = []
+    glyphs = 0
+    while glyphs < n_glyphs:
+        length = rng.randint(1, 12)
+        if x + length * char_width > image_width - 10:
+            line_num += 1
+            word_num = 0
+            x, y = 10, y + line_height
+        word_num += 1
+        text = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyzáéíóúñ') for _ in range(length))
+        top, height = y, 53
+        words.append([5, 1, 1, 1, line_num, word_num, x, top, length * char_width, height, 95.0, text])
+        for i, c in enumerate(text):
+            chars.append([c, x + i * char_width + 2, top + 1, x + (i + 1) * char_width - 2, top + height - 1, 0])
+        glyphs += length
+        x += (length + 1) * char_width
+
+    df_words = pd.DataFrame(words, columns=['level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num',
+                                            'left', 'top', 'width', 'height', 'conf', 'text'])
+    for line, group in df_words.groupby('line_num'):
+        left = group['left'].min()
+        right = (group['left'] + group['width']).max()
+        line_rows.append([4, 1, 1, 1, line, 0, left, group['top'].min(), right - left, 53, -1.0, None])
+    header = [[1, 1, 0, 0, 0, 0, 0, 0, image_width, 2480, -1.0, None],
+              [2, 1, 1, 0, 0, 0, 10, 350, image_width - 20, y + 53 - 350, -1.0, None],
+              [3, 1, 1, 1, 0, 0, 10, 350, image_width - 20, y + 53 - 350, -1.0, None]]
+    df_lines = pd.DataFrame(header + line_rows, columns=df_words.columns)
+    df_words = pd.concat([df_lines, df_words], ignore_index=True)
+    df_words = df_words.sort_values(['line_num', 'word_num'], kind='stable', ignore_index=True)
+    df_chars = pd.DataFrame(chars, columns=['char', 'left', 'top', 'right', 'bottom', 'unknown'])
+    return df_words, df_chars
+
+
+def legacy_build_word_chars(df_words, df_chars, trial_id):
+    """
+    The per-row pd.concat implementation recognize_text used before, kept here
+    as the reference the vectorized engine is compared against. Boxes with equal
+    left edges keep their TSV order (stable sort) so the comparison is exact.
+    """
+    df_spaces = pd.DataFrame(columns=['level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num', 'left', 'top', 'width', 'height', 'conf', 'text'])
+    grouped_lines = df_words.groupby(['block_num', 'par_num', 'line_num'])
+    for (block_num, par_num, line_num), line_words_df in grouped_lines:
+        sorted_words = line_words_df.sort_values(by='left', kind='stable')
+        previous_word = None
+        for index, current_word in sorted_words.iterrows():
+            if previous_word is not None:
+                space_left = int(previous_word['left']) + int(previous_word['width'])
+                space_width = int(current_word['left']) - space_left
+                if space_width > 0:
+                    space_data = {
+                        'level': 5, 'page_num': int(current_word['page_num']),
+                        'block_num': int(current_word['block_num']), 'par_num': int(current_word['par_num']),
+                        'line_num': int(current_word['line_num']), 'word_num': int(previous_word['word_num']),
+                        'left': space_left, 'top': int(previous_word['top']), 'width': space_width,
+                        'height': int(previous_word['height']), 'conf': 0, 'text': ' '
+                    }
+                    df_spaces = pd.concat([df_spaces, pd.DataFrame(space_data, index=[0])], ignore_index=True)
+            previous_word = current_word
+
+    df_word_chars = pd.DataFrame(columns=WORD_CHAR_COLUMNS)
+    for index_word, row_word in df_words.iterrows():
+        if isinstance(row_word['text'], str) and row_word['text'].strip() and row_word['level'] == 5:
+            word_left = int(row_word['left'])
+            word_top = int(row_word['top'])
+            word_right = word_left + int(row_word['width'])
+            word_bottom = word_top + int(row_word['height'])
+            char_index_in_word = 0
+            relevant_chars = df_chars[
+                (df_chars['left'] >= word_left) & (df_chars['right'] <= word_right) &
+                (df_chars['top'] >= word_top) & (df_chars['bottom'] <= word_bottom)
+            ].sort_values(by='left', kind='stable')
+            previous_char_right = word_left
+            for index_char, row_char in relevant_chars.iterrows():
+                char_left = previous_char_right
+                char_right = min(int(row_char['right']), word_right)
+                if char_left > char_right:
+                    char_right = int(row_char['right'])
+                char_data = [row_char['char'], char_left, word_top, char_right, word_bottom,
+                             int(row_word['block_num']), int(row_word['par_num']), int(row_word['line_num']),
+                             int(row_word['word_num']), char_index_in_word, row_word['text'],
+                             (char_left + char_right) / 2, (word_top + word_bottom) / 2, None, trial_id]
+                df_word_chars = pd.concat([df_word_chars, pd.DataFrame([char_data], columns=WORD_CHAR_COLUMNS)],
+                                          ignore_index=True)
+                char_index_in_word += 1
+                previous_char_right = char_right
+            spaces_following_word = df_spaces[
+                (df_spaces['word_num'] == int(row_word['word_num'])) &
+                (df_spaces['line_num'] == int(row_word['line_num'])) &
+                (df_spaces['block_num'] == int(row_word['block_num'])) &
+                (df_spaces['par_num'] == int(row_word['par_num']))
+            ]
+            for index_space, row_space in spaces_following_word.iterrows():
+                left, top = int(row_space['left']), int(row_space['top'])
+                right, bottom = left + int(row_space['width']), top + int(row_space['height'])
+                space_data = [' ', left, top, right, bottom,
+                              int(row_space['block_num']), int(row_space['par_num']), int(row_space['line_num']),
+                              int(row_space['word_num']), char_index_in_word, row_word['text'],
+                              (left + right) / 2, (top + bottom) / 2, None, trial_id]
+                df_word_chars = pd.concat([df_word_chars, pd.DataFrame([space_data], columns=WORD_CHAR_COLUMNS)],
+                                          ignore_index=True)
+                char_index_in_word += 1
+    return df_word_chars
+
+
+def time_call(function, *args, repeat=3):
+    """Returns the best wall time in seconds of `repeat` calls and the last result."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+if __name__ == '__main__':
+    print(f"{'glyphs':>8} {'legacy (s)':>12} {'vectorized (s)':>15} {'speedup':>9}")
+    for n_glyphs in [250, 500, 1000, 2000, 4000]:
+        df_words, df_chars = make_tesseract_tables(n_glyphs)
+        legacy_time, expected = time_call(legacy_build_word_chars, df_words, df_chars, 'bench', repeat=1)
+        new_time, result = time_call(build_word_chars, df_words, df_chars, 'bench')
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+        print(f"{len(df_chars):>8} {legacy_time:>12.3f} {new_time:>15.4f} {legacy_time / new_time:>8.0f}x")
@@ -0,0 +1,62 @@
+import glob
+import sys
+import time
+
+import pandas as pd
+
+from create_interest_areas_from_image2 import recognize_text
+
+
+def compare_passes(image_paths, tesseract_config='--psm 6 -l spa'):
+    """
+    Times recognize_text with two Tesseract passes (image_to_data + image_to_boxes)
+    against the single hOCR pass and against OCR of the text bands only
+    (roi='lines'), page by page. The OCR cache is bypassed.
+
+    Args:
+        image_paths: List of page images.
+        tesseract_config: Configuration string passed to Tesseract.
+
+    Returns:
+        pandas.DataFrame: One row per page with both wall times and how many
+        df_word_chars rows the two modes agree on.
+    """
+    rows = []
+    for image_path in image_paths:
+        start = time.perf_counter()
+        two_pass = recognize_text(image_path, tesseract_config, use_cache=False)
+        two_pass_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        one_pass = recognize_text(image_path, tesseract_config, single_pass=True, use_cache=False)
+        one_pass_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        roi_lines = recognize_text(image_path, tesseract_config, use_cache=False, roi='lines')
+        roi_time = time.perf_counter() - start
+
+        if len(two_pass) == len(one_pass):
+            same_rows = int((two_pass.astype(str).values == one_pass.astype(str).values).all(axis=1).sum())
+        else:
+            same_rows = 0
+        rows.append({'page': image_path,
+                     'two_pass_s': round(two_pass_time, 2),
+                     'single_pass_s': round(one_pass_time, 2),
+                     'speedup': round(two_pass_time / one_pass_time, 2),
+                     'roi_lines_s': round(roi_time, 2),
+                     'rows_two_pass': len(two_pass),
+                     'rows_single_pass': len(one_pass),
+                     'rows_roi_lines': len(roi_lines),
+                     'identical_rows': same_rows})
+    return pd.DataFrame(rows)
+
+
+# Example usage: python ocr/benchmark_tesseract_passes.py "eri_new/imágenes GazeGenie/page1*.png"
+if __name__ == '__main__':
+    patterns = sys.argv[1:] or ['new_stimuli/test/output.png']
+    image_paths = sorted(path for pattern in patterns for path in glob.glob(pattern))
+    results = compare_passes(image_paths)
+    print(results.to_string(index=False))
+    print(f"\nMean wall time per page: two passes {results['two_pass_s'].mean():.2f} s, "
+          f"single pass {results['single_pass_s'].mean():.2f} s, "
+          f"text bands only {results['roi_lines_s'].mean():.2f} s")
@@ -0,0 +1,140 @@
+import numpy as np
+
+
+class BoxIndex:
+    """
+    Spatial index over axis-aligned boxes given as (left, top, right, bottom).
+
+    Boxes are bucketed into lines and sorted by their left edge inside each line,
+    so a query only looks at the boxes of the lines it covers whose left edge
+    falls in the queried x range. Lines are either supplied by the caller (for
+    example Tesseract's block/paragraph/line numbers, or assigned_line) or taken
+    from a uniform grid of horizontal bands over the boxes' top edges.
+
+    All queries are vectorized: they take arrays of query boxes and return
+    (query_index, box_index) pairs.
+
+    Example:
+        index = BoxIndex(df_chars['left'], df_chars['top'], df_chars['right'], df_chars['bottom'])
+        word_idx, char_idx = index.contained_in(word_left, word_top, word_right, word_bottom)
+    """
+
+    def __init__(self, left, top, right, bottom, lines=None, band_height=None):
+        """
+        Args:
+            left, top, right, bottom: Arrays with the box edges in pixels.
+            lines: Optional non-negative integer line id per box. When given,
+                queries must pass the line ids they refer to.
+            band_height: Height in pixels of the grid bands used when no line
+                ids are given. Defaults to the median box height.
+        """
+        self.left = np.asarray(left, dtype=np.int64)
+        self.top = np.asarray(top, dtype=np.int64)
+        self.right = np.asarray(right, dtype=np.int64)
+        self.bottom = np.asarray(bottom, dtype=np.int64)
+
+        if lines is not None:
+            self.band_height = None
+            cells = np.asarray(lines, dtype=np.int64)
+        else:
+            if band_height is None:
+                heights = self.bottom - self.top
+                band_height = int(np.median(heights)) if len(heights) else 1
+            self.band_height = max(int(band_height), 1)
+            cells = self.top // self.band_height
+
+        # Boxes sorted by (cell, left) and encoded as a single int64 key
+        self._x_origin = int(self.left.min()) - 1 if len(self.left) else 0
+        self._x_span = int(self.left.max()) - self._x_origin + 2 if len(self.left) else 2
+        self._order = np.lexsort((self.left, cells))
+        self._keys = cells[self._order] * self._x_span + (self.left[self._order] - self._x_origin)
+
+    def __len__(self):
+        return len(self.left)
+
+    def _cell_pairs(self, query_idx, cells, x_from, x_to):
+        """Pairs of query rows and boxes in `cells` whose left edge is in [x_from, x_to]."""
+        x_from = np.clip(x_from, self._x_origin, self._x_origin + self._x_span - 1) - self._x_origin
+        x_to = np.clip(x_to, self._x_origin, self._x_origin + self._x_span - 1) - self._x_origin
+        lo = np.searchsorted(self._keys, cells * self._x_span + x_from, side='left')
+        hi = np.searchsorted(self._keys, cells * self._x_span + x_to, side='right')
+        counts = np.maximum(hi - lo, 0)
+
+        pair_query = np.repeat(query_idx, counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_box = self._order[np.repeat(lo, counts) + offsets]
+        return pair_query, pair_box
+
+    def _query_cells(self, top, bottom, lines):
+        """Expands every query into the cells it covers."""
+        if self.band_height is None:
+            if lines is None:
+                raise ValueError("This index was built with line ids; pass lines= to query it.")
+            cells = np.asarray(lines, dtype=np.int64)
+            query_idx = np.flatnonzero(cells >= 0)
+            return query_idx, cells[query_idx]
+
+        first = np.asarray(top, dtype=np.int64) // self.band_height
+        last = np.asarray(bottom, dtype=np.int64) // self.band_height
+        counts = np.maximum(last - first + 1, 0)
+        query_idx = np.repeat(np.arange(len(first)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return query_idx, first[query_idx] + offsets
+
+    def contained_in(self, left, top, right, bottom, lines=None):
+        """
+        Finds the indexed boxes that lie entirely inside each query box.
+
+        Args:
+            left, top, right, bottom: Arrays with the query box edges.
+            lines: Line id per query box, required if the index has line ids.
+                Queries with a negative line id match nothing.
+
+        Returns:
+            tuple: Arrays (query_index, box_index), ordered by query.
+        """
+        left = np.asarray(left, dtype=np.int64)
+        top = np.asarray(top, dtype=np.int64)
+        right = np.asarray(right, dtype=np.int64)
+        bottom = np.asarray(bottom, dtype=np.int64)
+        if len(self) == 0 or len(left) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        query_idx, cells = self._query_cells(top, bottom, lines)
+        pair_query, pair_box = self._cell_pairs(query_idx, cells, left[query_idx], right[query_idx])
+        inside = ((self.right[pair_box] <= right[pair_query]) &
+                  (self.top[pair_box] >= top[pair_query]) &
+                  (self.bottom[pair_box] <= bottom[pair_query]))
+        pair_query, pair_box = pair_query[inside], pair_box[inside]
+        order = np.argsort(pair_query, kind='stable')
+        return pair_query[order], pair_box[order]
+
+    def left_edge_in(self, x_from, x_to, lines=None, top=None, bottom=None):
+        """
+        Finds the indexed boxes whose left edge lies in [x_from, x_to].
+
+        With line ids the search is restricted to the query's line; otherwise
+        to the grid bands covered by [top, bottom].
+
+        Args:
+            x_from, x_to: Arrays with the inclusive x range per query.
+            lines: Line id per query, required if the index has line ids.
+            top, bottom: Vertical range per query, required for grid indexes.
+
+        Returns:
+            tuple: Arrays (query_index, box_index), ordered by query.
+        """
+        x_from = np.asarray(x_from, dtype=np.int64)
+        x_to = np.asarray(x_to, dtype=np.int64)
+        if len(self) == 0 or len(x_from) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        query_idx, cells = self._query_cells(top, bottom, lines)
+        pair_query, pair_box = self._cell_pairs(query_idx, cells, x_from[query_idx], x_to[query_idx])
+        if self.band_height is not None:
+            top = np.asarray(top, dtype=np.int64)
+            bottom = np.asarray(bottom, dtype=np.int64)
+            keep = (self.top[pair_box] >= top[pair_query]) & (self.top[pair_box] <= bottom[pair_query])
+            pair_query, pair_box = pair_query[keep], pair_box[keep]
+        order = np.argsort(pair_query, kind='stable')
+        return pair_query[order], pair_box[order]
@@ -0,0 +1,71 @@
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from create_interest_areas_from_image2 import assign_lines, build_word_chars, tesseract_tables
+
+
+def legacy_assign_lines(df_word_chars):
+    """
+    The loop-based line numbering and y-normalization recognize_text used
+    before, kept as the reference for assign_lines.
+    """
+    df_word_chars['assigned_line'] = 0
+    line_counter = 1
+    for block_num in sorted(df_word_chars['block'].unique()):
+        for par_num in sorted(df_word_chars.loc[df_word_chars['block'] == block_num, 'paragraph'].unique()):
+            for line_num in sorted(df_word_chars.loc[(df_word_chars['block'] == block_num) & (df_word_chars['paragraph'] == par_num), 'line_number'].unique()):
+                line_mask = (df_word_chars['line_number'] == line_num) & (df_word_chars['paragraph'] == par_num) & (df_word_chars['block'] == block_num)
+                df_word_chars.loc[line_mask, 'assigned_line'] = line_counter
+                line_counter += 1
+
+    for assigned_line in df_word_chars['assigned_line'].unique():
+        line_mask = (df_word_chars['assigned_line'] == assigned_line)
+        min_top = df_word_chars.loc[line_mask, 'char_ymin'].min()
+        max_bottom = df_word_chars.loc[line_mask, 'char_ymax'].max()
+        df_word_chars.loc[line_mask, 'char_ymin'] = min_top
+        df_word_chars.loc[line_mask, 'char_ymax'] = max_bottom
+    return df_word_chars
+
+
+def synthetic_word_chars(n_chars, seed=0):
+    """Random df_word_chars-like frame with several blocks, paragraphs and lines."""
+    rng = np.random.default_rng(seed)
+    top = rng.integers(0, 2400, n_chars)
+    return pd.DataFrame({
+        'char': 'x',
+        'char_xmin': rng.integers(0, 3400, n_chars),
+        'char_ymin': top,
+        'char_xmax': rng.integers(0, 3400, n_chars),
+        'char_ymax': top + rng.integers(20, 60, n_chars),
+        'block': rng.integers(1, 4, n_chars),
+        'paragraph': rng.integers(1, 4, n_chars),
+        'line_number': rng.integers(1, 12, n_chars),
+        'char_y_center': 0.0,
+        'assigned_line': None,
+    })
+
+
+def check(df_word_chars, label):
+    start = time.perf_counter()
+    expected = legacy_assign_lines(df_word_chars.copy())
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = assign_lines(df_word_chars.copy())
+    new_time = time.perf_counter() - start
+
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+    print(f"{label}: {len(result)} characters, {result['assigned_line'].nunique()} lines, "
+          f"identical output; loops {legacy_time:.3f} s, groupby {new_time:.4f} s")
+
+
+# Example usage: python ocr/check_assign_lines.py [page images...]
+if __name__ == '__main__':
+    for n_chars in [1000, 10000]:
+        check(synthetic_word_chars(n_chars), f"synthetic ({n_chars})")
+    for image_path in sys.argv[1:] or ['new_stimuli/test/output.png']:
+        df_words, df_chars = tesseract_tables(image_path)
+        check(build_word_chars(df_words, df_chars, 'check'), image_path)
@@ -0,0 +1,30 @@
+import glob
+import os
+import sys
+
+import pandas as pd
+
+from coordinate_tables import read_table
+from interest_areas import SCHEMAS, InterestAreas, detect_schema
+
+
+def check(path):
+    """
+    Converts a table to the canonical schema and back to its own schema and
+    asserts that every column of the schema comes back with the same values.
+    """
+    df = read_table(path)
+    schema = detect_schema(df.columns)
+    trial_id = None if 'trial_id' in df.columns else os.path.splitext(os.path.basename(path))[0]
+    areas = InterestAreas.from_frame(df, schema, trial_id)
+    columns = SCHEMAS[schema][0]
+    result = areas.to_frame(schema).reset_index(drop=True)
+    # The renderer writes whole numbers without ".0", so compare the values
+    pd.testing.assert_frame_equal(result[columns], df[columns], check_dtype=False)
+    print(f"{path}: {schema}, {len(df)} rows, identical after the round trip")
+
+
+# Example usage: python ocr/check_interest_areas.py [tables...]
+if __name__ == '__main__':
+    for path in sys.argv[1:] or sorted(glob.glob('new_stimuli/output/*.csv')):
+        check(path)
@@ -0,0 +1,282 @@
+import csv
+import os
+import zipfile
+
+import numpy as np
+import numpy.lib.format as npy_format
+import pandas as pd
+
+# File extensions of the supported table formats
+FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.feather': 'feather', '.npz': 'npz'}
+
+# Name of the npz member that stores the column order
+NPZ_COLUMNS = '__columns__'
+
+
+def table_format(path):
+    """Returns the table format ('csv', 'parquet', 'feather' or 'npz') from a file extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unknown table format for {path}; use one of {', '.join(FORMATS)}")
+    return FORMATS[extension]
+
+
+def format_value(value):
+    """
+    Formats one CSV cell: whole numbers without a decimal part (350, not 350.0),
+    other floats with repr so they read back exactly.
+    """
+    if isinstance(value, (bool, np.bool_)):
+        return str(value)
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))
+    if isinstance(value, (float, np.floating)):
+        if value != value:
+            return ''
+        if float(value).is_integer():
+            return str(int(value))
+        return repr(float(value))
+    return '' if value is None else str(value)
+
+
+def compact_dtypes(df):
+    """
+    Returns `df` with the smallest exact column types.
+
+    Whole-number columns become int16 or int32 (int64 only if needed), other
+    float columns become float32 when that loses nothing (half pixels do not),
+    and text columns such as char, word and trial_id become categoricals, which
+    Parquet and Feather store dictionary-encoded.
+    """
+    columns = {}
+    for name, column in df.items():
+        if isinstance(column.dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(column):
+            columns[name] = column
+        elif pd.api.types.is_numeric_dtype(column):
+            values = column.to_numpy()
+            if np.issubdtype(values.dtype, np.floating) and not (np.isfinite(values).all()
+                                                                 and (values == np.round(values)).all()):
+                exact = (values.astype(np.float32) == values) | np.isnan(values)
+                columns[name] = column.astype(np.float32) if exact.all() else column
+                continue
+            low, high = (values.min(), values.max()) if len(values) else (0, 0)
+            for dtype in (np.int16, np.int32, np.int64):
+                if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+                    columns[name] = column.astype(dtype)
+                    break
+        else:
+            columns[name] = column.astype('category')
+    return pd.DataFrame(columns, index=df.index)
+
+
+def _require_pyarrow(fmt):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError(f"Writing and reading {fmt} tables needs pyarrow (pip install pyarrow)") from None
+
+
+def write_table(df, path):
+    """
+    Writes a coordinate table in the format given by the extension of `path`.
+
+    CSV cells are written with format_value; Parquet, Feather and npz get the
+    compact column types of compact_dtypes. Feather is written uncompressed
+    and npz unzipped so that read_table can memory-map them.
+    """
+    fmt = table_format(path)
+    if fmt == 'csv':
+        with TableWriter(path, list(df.columns)) as writer:
+            writer.write_frame(df)
+        return
+
+    df = compact_dtypes(df).reset_index(drop=True)
+    if fmt == 'parquet':
+        _require_pyarrow(fmt)
+        df.to_parquet(path, index=False)
+    elif fmt == 'feather':
+        _require_pyarrow(fmt)
+        df.to_feather(path, compression='uncompressed')
+    else:
+        arrays = {NPZ_COLUMNS: np.array(df.columns, dtype=str)}
+        for name, column in df.items():
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                codes = column.cat.codes.to_numpy()
+                arrays[f'{name}.codes'] = codes.astype(np.int16 if len(column.cat.categories) < 2 ** 15 else np.int32)
+                arrays[f'{name}.categories'] = np.array(column.cat.categories, dtype=str)
+            else:
+                arrays[name] = column.to_numpy()
+        np.savez(path, **arrays)
+
+
+class TableWriter:
+    """
+    Writes a coordinate table row by row (or frame by frame).
+
+    CSV rows go to disk as they come, formatted with format_value. Parquet,
+    Feather and npz are columnar, so their rows are collected and written by
+    write_table when the writer is closed.
+    """
+
+    def __init__(self, path, columns):
+        """
+        Args:
+            path: Output file; the extension chooses the format.
+            columns: Column names, in order.
+        """
+        self.path = path
+        self.columns = list(columns)
+        self.format = table_format(path)
+        self._chunks = []
+        self._rows = []
+        if self.format == 'csv':
+            self._file = open(path, 'w', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self.columns)
+
+    def writerow(self, row):
+        if self.format == 'csv':
+            self._writer.writerow([format_value(value) for value in row])
+        else:
+            self._rows.append(row)
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def write_frame(self, df):
+        """Appends the rows of a DataFrame that has (at least) this writer's columns."""
+        df = df[self.columns]
+        if self.format == 'csv':
+            # Same cells as format_value, but whole-number float columns are cast at once
+            cells = {}
+            for name, column in df.items():
+                values = column.to_numpy()
+                if pd.api.types.is_float_dtype(column) and np.isfinite(values).all() \
+                        and (values == np.round(values)).all():
+                    cells[name] = values.astype(np.int64)
+                elif pd.api.types.is_float_dtype(column):
+                    cells[name] = [format_value(value) for value in values.tolist()]
+                elif isinstance(column.dtype, pd.api.extensions.ExtensionDtype):
+                    # Nullable integers and categoricals: to_numpy would turn 3 into 3.0 next to NA
+                    cells[name] = column.array
+                else:
+                    cells[name] = values
+            pd.DataFrame(cells).to_csv(self._file, header=False, index=False, lineterminator='\r\n')
+        else:
+            self._flush_rows()
+            self._chunks.append(df)
+
+    def _flush_rows(self):
+        if self._rows:
+            self._chunks.append(pd.DataFrame(self._rows, columns=self.columns))
+            self._rows = []
+
+    def close(self):
+        if self.format == 'csv':
+            self._file.close()
+            return
+        self._flush_rows()
+        df = pd.concat(self._chunks, ignore_index=True) if self._chunks else pd.DataFrame(columns=self.columns)
+        write_table(df, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _npz_memmap(path, zf, name):
+    """Memory-maps one member of an uncompressed npz file."""
+    info = zf.getinfo(name)
+    with open(path, 'rb') as f:
+        # Local file header: 30 bytes, then the file name and the extra field
+        f.seek(info.header_offset + 26)
+        name_length, extra_length = np.frombuffer(f.read(4), dtype='<u2')
+        f.seek(info.header_offset + 30 + int(name_length) + int(extra_length))
+        if npy_format.read_magic(f) == (1, 0):
+            shape, fortran_order, dtype = npy_format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = npy_format.read_array_header_2_0(f)
+        offset = f.tell()
+    if dtype.hasobject:
+        raise ValueError(f"{name} in {path} holds Python objects and cannot be memory-mapped")
+    if len(shape) == 0 or np.prod(shape) == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape,
+                     order='F' if fortran_order else 'C')
+
+
+def _read_npz(path, columns=None):
+    with zipfile.ZipFile(path) as zf:
+        members = {os.path.splitext(name)[0]: name for name in zf.namelist()}
+        if any(zf.getinfo(name).compress_type != zipfile.ZIP_STORED for name in members.values()):
+            # Compressed members cannot be mapped; fall back to a normal load
+            with np.load(path) as data:
+                arrays = {key: data[key] for key in data.files}
+        else:
+            arrays = {key: _npz_memmap(path, zf, name) for key, name in members.items()}
+
+    data = {}
+    for name in columns or [str(c) for c in arrays[NPZ_COLUMNS]]:
+        if f'{name}.codes' in arrays:
+            data[name] = pd.Categorical.from_codes(np.asarray(arrays[f'{name}.codes']),
+                                                   categories=np.asarray(arrays[f'{name}.categories']))
+        else:
+            data[name] = arrays[name]
+    return pd.DataFrame(data, copy=False)
+
+
+def read_arrow(path, columns=None):
+    """
+    Reads a Parquet or Feather coordinate table as a pyarrow.Table, without
+    converting it to pandas.
+
+    Feather files written by write_table are uncompressed and read through a
+    memory map, so the columns of the returned table point into the file and
+    are paged in only when used. Parquet has to be decoded, so its columns
+    are read into memory.
+
+    Args:
+        path: .parquet or .feather file.
+        columns: Optional list of columns to read.
+
+    Returns:
+        pyarrow.Table
+    """
+    fmt = table_format(path)
+    if fmt not in ('parquet', 'feather'):
+        raise ValueError(f"{path} is not a Parquet or Feather table; use read_table")
+    _require_pyarrow(fmt)
+    if fmt == 'parquet':
+        import pyarrow.parquet
+        return pyarrow.parquet.read_table(path, columns=columns, memory_map=True)
+    import pyarrow.feather
+    return pyarrow.feather.read_table(path, columns=columns, memory_map=True)
+
+
+def read_table(path, columns=None):
+    """
+    Reads a coordinate table written by write_table or TableWriter.
+
+    Only npz files are handed to pandas without a copy: their numeric columns
+    are memory-mapped straight from the archive. Parquet and Feather tables
+    are read with read_arrow and converted to pandas, which copies the
+    columns; the Arrow buffers are released column by column as they are
+    converted, so the table is not held twice. Callers that can work on
+    Arrow data should use read_arrow instead.
+
+    Args:
+        path: Table file; the extension chooses the format.
+        columns: Optional list of columns to read.
+
+    Returns:
+        pandas.DataFrame
+    """
+    fmt = table_format(path)
+    if fmt == 'csv':
+        return pd.read_csv(path, usecols=columns, keep_default_na=False, na_values=[''], encoding='utf-8')
+    if fmt in ('parquet', 'feather'):
+        return read_arrow(path, columns).to_pandas(self_destruct=True, split_blocks=True)
+    return _read_npz(path, columns)
@@ -2,6 +2,8 @@ import pytesseract
 from PIL import Image
 import pandas as pd
 
+from tesseract_parsing import read_image_to_data
+
 def image_to_csv_with_lines_and_words(image_path, csv_path, tesseract_cmd=None, language='spa'):
     """
     Extracts text from an image using pytesseract and saves detailed character
@@ -30,17 +32,8 @@ def image_to_csv_with_lines_and_words(image_path, csv_path, tesseract_cmd=None,
     # OCR and get data
     data = pytesseract.image_to_data(img, output_type=pytesseract.Output.STRING, config='--psm 6', lang=language)
 
-    # Parse TSV data
-    lines = data.splitlines()
-    header = lines[0].split('\t')
-    data_rows = [line.split('\t') for line in lines[1:]]
-    df = pd.DataFrame(data_rows, columns=header)
-
-    # Convert to numeric and clean data
-    numeric_cols = ['left', 'top', 'width', 'height', 'conf', 'line_num', 'word_num']
-    for col in numeric_cols:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-    df.dropna(subset=['text'], inplace=True)
+    # Parse TSV data, keeping only recognized words
+    df = read_image_to_data(data, words_only=True)
     df = df[df['conf'] != -1]
 
     # --- Character-Level Processing with Word Association ---
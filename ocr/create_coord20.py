@@ -1,9 +1,13 @@
 import pytesseract
-from PIL import Image, ImageDraw
+from PIL import Image
 import pandas as pd
-import io
-import csv
 import os
+import numpy as np
+
+from box_index import BoxIndex
+from tesseract_parsing import read_image_to_boxes, read_image_to_data
+from create_interest_areas_from_image2 import assign_lines
+from overlay import render_overlay
 
 def recognize_text(image_path, tesseract_config='--psm 6 -l spa'):
     """
@@ -28,15 +32,8 @@ def recognize_text(image_path, tesseract_config='--psm 6 -l spa'):
     data_words = pytesseract.image_to_data(image, config=tesseract_config)
     data_chars = pytesseract.image_to_boxes(image, config=tesseract_config)
 
-    df_words = pd.read_csv(io.StringIO(data_words), sep='\t', quoting=csv.QUOTE_NONE)
-    df_chars = pd.read_csv(io.StringIO(data_chars), sep=' ', header=None, names=['char', 'left', 'top', 'right', 'bottom', 'unknown'])
-
-    # Fix character coordinates
-    for index, row in df_chars.iterrows():
-        original_top = int(row['top'])
-        original_bottom = int(row['bottom'])
-        df_chars.at[index, 'top'] = image_height - original_bottom
-        df_chars.at[index, 'bottom'] = image_height - original_top
+    df_words = read_image_to_data(data_words)
+    df_chars = read_image_to_boxes(data_chars, image_height)
 
     # Create DataFrame to store spaces
     df_spaces = pd.DataFrame(columns=['level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num', 'left', 'top', 'width', 'height', 'conf', 'text'])
@@ -78,6 +75,23 @@ def recognize_text(image_path, tesseract_config='--psm 6 -l spa'):
                                          'char_x_center', 'char_y_center', 'assigned_line', 'trial_id'])
 
 
+    # Index glyphs and spaces once instead of masking every table for every word
+    words_right = df_words['left'] + df_words['width']
+    words_bottom = df_words['top'] + df_words['height']
+    glyph_index = BoxIndex(df_chars['left'], df_chars['top'], df_chars['right'], df_chars['bottom'])
+    glyph_word, glyph_rows = glyph_index.contained_in(df_words['left'], df_words['top'], words_right, words_bottom)
+    glyphs_by_word = np.split(glyph_rows, np.searchsorted(glyph_word, np.arange(1, len(df_words))))
+
+    space_lines = pd.MultiIndex.from_arrays([df_spaces['block_num'], df_spaces['par_num'], df_spaces['line_num']])
+    space_line_ids, line_keys = space_lines.factorize()
+    word_line_ids = line_keys.get_indexer(pd.MultiIndex.from_arrays(
+        [df_words['block_num'], df_words['par_num'], df_words['line_num']]))
+    space_index = BoxIndex(df_spaces['left'], df_spaces['top'],
+                           df_spaces['left'] + df_spaces['width'], df_spaces['top'] + df_spaces['height'],
+                           lines=space_line_ids)
+    space_word, space_rows = space_index.left_edge_in(words_right, words_right, lines=word_line_ids)
+    spaces_by_word = np.split(space_rows, np.searchsorted(space_word, np.arange(1, len(df_words))))
+
     for index_word, row_word in df_words.iterrows():
         if isinstance(row_word['text'], str) and row_word['text'].strip() and row_word['level'] == 5:
             word_left = int(row_word['left'])
@@ -89,10 +103,7 @@ def recognize_text(image_path, tesseract_config='--psm 6 -l spa'):
             word_text = row_word['text']
 
             char_index_in_word = 0
-            relevant_chars = df_chars[
-                (df_chars['left'] >= word_left) & (df_chars['right'] <= word_right) &
-                (df_chars['top'] >= word_top) & (df_chars['bottom'] <= word_bottom)
-            ]
+            relevant_chars = df_chars.iloc[glyphs_by_word[index_word]]
             relevant_chars = relevant_chars.sort_values(by='left')
             previous_char_right = word_left
 
@@ -127,12 +138,8 @@ def recognize_text(image_path, tesseract_config='--psm 6 -l spa'):
                 char_index_in_word += 1
                 previous_char_right = char_right
 
-            spaces_following_word = df_spaces[
-                (df_spaces['word_num'] == int(row_word['word_num'])) &
-                (df_spaces['line_num'] == int(row_word['line_num'])) &
-                (df_spaces['block_num'] == int(row_word['block_num'])) &
-                (df_spaces['par_num'] == int(row_word['par_num']))
-            ]
+            spaces_following_word = df_spaces.iloc[spaces_by_word[index_word]]
+            spaces_following_word = spaces_following_word[spaces_following_word['word_num'] == int(row_word['word_num'])]
 
             for index_space, row_space in spaces_following_word.iterrows():
                 space_data = {
@@ -155,25 +162,9 @@ def recognize_text(image_path, tesseract_config='--psm 6 -l spa'):
                 df_word_chars = pd.concat([df_word_chars, pd.DataFrame(space_data, index=[0])], ignore_index=True)
                 char_index_in_word += 1
 
-    # Create 'assigned_line' column
-    df_word_chars['assigned_line'] = 0
-    line_counter = 1
-    for block_num in sorted(df_word_chars['block'].unique()):
-        for par_num in sorted(df_word_chars.loc[df_word_chars['block'] == block_num, 'paragraph'].unique()):
-            for line_num in sorted(df_word_chars.loc[(df_word_chars['block'] == block_num) & (df_word_chars['paragraph'] == par_num), 'line_number'].unique()):
-                line_mask = (df_word_chars['line_number'] == line_num) & (df_word_chars['paragraph'] == par_num) & (df_word_chars['block'] == block_num)
-                df_word_chars.loc[line_mask, 'assigned_line'] = line_counter
-                line_counter += 1
-
-    # Adjust Y_Start, Y_End, and char_y_center, converting to integers
-    for assigned_line in df_word_chars['assigned_line'].unique():
-        line_mask = (df_word_chars['assigned_line'] == assigned_line)
-        min_top = df_word_chars.loc[line_mask, 'char_ymin'].min()
-        max_bottom = df_word_chars.loc[line_mask, 'char_ymax'].max()
-        new_y_center = (min_top + max_bottom) / 2
-        df_word_chars.loc[line_mask, 'char_ymin'] = int(round(min_top))      # Round and convert
-        df_word_chars.loc[line_mask, 'char_ymax'] = int(round(max_bottom))     # Round and convert
-        df_word_chars.loc[line_mask, 'char_y_center'] = int(round(new_y_center)) # Round and convert
+    # Number the lines and set char_ymin, char_ymax and char_y_center per line
+    df_word_chars = assign_lines(df_word_chars.infer_objects(), update_y_center=True)
+    df_word_chars['char_y_center'] = df_word_chars['char_y_center'].round()
 
     # Convert relevant columns to integers
     int_columns = ['char_xmin', 'char_ymin', 'char_xmax', 'char_ymax', 'block', 'paragraph',
@@ -186,26 +177,15 @@ def recognize_text(image_path, tesseract_config='--psm 6 -l spa'):
 
 def draw_char_boxes(image_path, df_word_chars, output_path='output_boxes_combined.png'):
     """
-    Draws bounding boxes around characters on the image.
+    Draws bounding boxes around characters on the image (purple, see overlay.render_overlay).
 
     Args:
         image_path: Path to the image file.
         df_word_chars: DataFrame containing character bounding box data.
         output_path: Path to save the image with bounding boxes.  Defaults to 'output_boxes_combined.png'.
     """
-    image = Image.open(image_path).convert('RGB')
-    draw = ImageDraw.Draw(image)
-
-    # Draw bounding boxes for characters (purple)
-    for index, row in df_word_chars.iterrows():
-        left = int(row['char_xmin'])
-        top = int(row['char_ymin'])
-        right = int(row['char_xmax'])
-        bottom = int(row['char_ymax'])
-        draw.rectangle([(left, top), (right, bottom)], outline='purple', width=1)
-
-    # Display or save the image
-    image.save(output_path)
+    # All boxes are rasterized at once instead of one ImageDraw call per glyph
+    render_overlay(image_path, {'ocr': df_word_chars}).save(output_path)
 
 
 # Example usage
@@ -1,10 +1,11 @@
 import pytesseract
-from PIL import Image, ImageDraw
+from PIL import Image
 import pandas as pd
-import io
-import csv
 import os
 
+from overlay import render_overlay
+from tesseract_parsing import read_image_to_boxes, read_image_to_data
+
 def recognize_text(image_path, tesseract_config='--psm 6 -l spa'):
     """
     Performs OCR on an image and returns a DataFrame with character bounding boxes
@@ -28,15 +29,8 @@ def recognize_text(image_path, tesseract_config='--psm 6 -l spa'):
     data_words = pytesseract.image_to_data(image, config=tesseract_config)
     data_chars = pytesseract.image_to_boxes(image, config=tesseract_config)
 
-    df_words = pd.read_csv(io.StringIO(data_words), sep='\t', quoting=csv.QUOTE_NONE)
-    df_chars = pd.read_csv(io.StringIO(data_chars), sep=' ', header=None, names=['char', 'left', 'top', 'right', 'bottom', 'unknown'])
-
-    # Fix character coordinates
-    for index, row in df_chars.iterrows():
-        original_top = int(row['top'])
-        original_bottom = int(row['bottom'])
-        df_chars.at[index, 'top'] = image_height - original_bottom
-        df_chars.at[index, 'bottom'] = image_height - original_top
+    df_words = read_image_to_data(data_words)
+    df_chars = read_image_to_boxes(data_chars, image_height)
 
     # Create DataFrame to store spaces
     df_spaces = pd.DataFrame(columns=['level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num', 'left', 'top', 'width', 'height', 'conf', 'text'])
@@ -177,26 +171,15 @@ def recognize_text(image_path, tesseract_config='--psm 6 -l spa'):
 
 def draw_char_boxes(image_path, df_word_chars, output_path='output_boxes_combined.png'):
     """
-    Draws bounding boxes around characters on the image.
+    Draws bounding boxes around characters on the image (purple, see overlay.render_overlay).
 
     Args:
         image_path: Path to the image file.
         df_word_chars: DataFrame containing character bounding box data.
         output_path: Path to save the image with bounding boxes.  Defaults to 'output_boxes_combined.png'.
     """
-    image = Image.open(image_path).convert('RGB')
-    draw = ImageDraw.Draw(image)
-
-    # Draw bounding boxes for characters (purple)
-    for index, row in df_word_chars.iterrows():
-        left = int(row['X_Start'])
-        top = int(row['Y_Start'])
-        right = int(row['X_End'])
-        bottom = int(row['Y_End'])
-        draw.rectangle([(left, top), (right, bottom)], outline='purple', width=1)
-
-    # Display or save the image
-    image.save(output_path)
+    # All boxes are rasterized at once instead of one ImageDraw call per glyph
+    render_overlay(image_path, {'ocr': df_word_chars}).save(output_path)
 
 
 # Example usage
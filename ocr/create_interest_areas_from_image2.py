@@ -1,11 +1,251 @@
 import pytesseract
-from PIL import Image, ImageDraw
+from PIL import Image
+import numpy as np
 import pandas as pd
-import io
-import csv
 import os
+from concurrent.futures import ThreadPoolExecutor
 
-def recognize_text(image_path, tesseract_config='--psm 6 -l spa'):
+from box_index import BoxIndex
+from ink_regions import find_text_regions
+from interest_areas import assign_lines
+from ocr_cache import cached_tesseract
+from overlay import render_overlay
+from tesseract_parsing import (HOCR_CHAR_BOXES_CONFIG, merge_region_tables, parse_hocr, read_image_to_boxes,
+                               read_image_to_data, word_mask)
+
+WORD_CHAR_COLUMNS = ['char', 'char_xmin', 'char_ymin', 'char_xmax', 'char_ymax',
+                     'block', 'paragraph', 'line_number',
+                     'word_nr', 'letter_nr', 'word',
+                     'char_x_center', 'char_y_center', 'assigned_line', 'trial_id']
+
+
+def find_word_spaces(df_words):
+    """
+    Finds the gaps between consecutive Tesseract boxes on the same line.
+
+    Rows are grouped by block, paragraph and line and sorted by their left edge.
+    Every positive gap between a box and the next one becomes a space that is
+    attributed to the box on its left.
+
+    Args:
+        df_words: DataFrame parsed from the image_to_data TSV.
+
+    Returns:
+        pandas.DataFrame: One row per space, with the image_to_data columns.
+    """
+    rows = df_words.sort_values(['block_num', 'par_num', 'line_num', 'left'], kind='stable')
+
+    block = rows['block_num'].to_numpy(dtype=np.int64)
+    par = rows['par_num'].to_numpy(dtype=np.int64)
+    line = rows['line_num'].to_numpy(dtype=np.int64)
+    left = rows['left'].to_numpy(dtype=np.int64)
+    top = rows['top'].to_numpy(dtype=np.int64)
+    width = rows['width'].to_numpy(dtype=np.int64)
+    height = rows['height'].to_numpy(dtype=np.int64)
+
+    # Compare every row with the previous row of the same line
+    same_line = (block[1:] == block[:-1]) & (par[1:] == par[:-1]) & (line[1:] == line[:-1])
+    space_left = left[:-1] + width[:-1]
+    space_width = left[1:] - space_left
+    keep = same_line & (space_width > 0)
+    current = np.flatnonzero(keep) + 1
+    previous = current - 1
+
+    return pd.DataFrame({
+        'level': 5,
+        'page_num': rows['page_num'].to_numpy(dtype=np.int64)[current],
+        'block_num': block[current],
+        'par_num': par[current],
+        'line_num': line[current],
+        'word_num': rows['word_num'].to_numpy(dtype=np.int64)[previous],
+        'left': space_left[keep],
+        'top': top[previous],
+        'width': space_width[keep],
+        'height': height[previous],
+        'conf': 0,
+        'text': ' '
+    })
+
+
+def build_word_chars(df_words, df_chars, trial_id):
+    """
+    Assigns Tesseract character boxes and inter-word spaces to their words.
+
+    Every non-empty level 5 word gets the characters whose box lies inside the
+    word box, ordered left to right, followed by the spaces that come after it.
+    Rows are collected in flat arrays and the DataFrame is built once.
+
+    Args:
+        df_words: DataFrame parsed from the image_to_data TSV.
+        df_chars: DataFrame parsed from image_to_boxes, with top/bottom already
+            flipped to image coordinates.
+        trial_id: Identifier written to the trial_id column.
+
+    Returns:
+        pandas.DataFrame: Character-level data (df_word_chars), with
+        assigned_line still set to None.
+    """
+    words = df_words[word_mask(df_words)]
+    n_words = len(words)
+
+    word_left = words['left'].to_numpy(dtype=np.int64)
+    word_top = words['top'].to_numpy(dtype=np.int64)
+    word_right = word_left + words['width'].to_numpy(dtype=np.int64)
+    word_bottom = word_top + words['height'].to_numpy(dtype=np.int64)
+    word_block = words['block_num'].to_numpy(dtype=np.int64)
+    word_par = words['par_num'].to_numpy(dtype=np.int64)
+    word_line = words['line_num'].to_numpy(dtype=np.int64)
+    word_num = words['word_num'].to_numpy(dtype=np.int64)
+    word_text = words['text'].to_numpy(dtype=object)
+
+    char_text = df_chars['char'].to_numpy(dtype=object)
+    char_left = df_chars['left'].to_numpy(dtype=np.int64)
+    char_top = df_chars['top'].to_numpy(dtype=np.int64)
+    char_right = df_chars['right'].to_numpy(dtype=np.int64)
+    char_bottom = df_chars['bottom'].to_numpy(dtype=np.int64)
+
+    # Glyphs inside each word, ordered by left edge within the word
+    glyph_index = BoxIndex(char_left, char_top, char_right, char_bottom)
+    glyph_word, glyph_char = glyph_index.contained_in(word_left, word_top, word_right, word_bottom)
+    order = np.lexsort((glyph_char, char_left[glyph_char], glyph_word))
+    glyph_word, glyph_char = glyph_word[order], glyph_char[order]
+
+    # A glyph starts where the previous glyph of its word ended. Containment
+    # guarantees its own right edge never exceeds the word's right edge.
+    glyph_xmax = char_right[glyph_char]
+    glyph_xmin = np.empty_like(glyph_xmax)
+    glyph_xmin[1:] = glyph_xmax[:-1]
+    first_glyph = np.ones(len(glyph_word), dtype=bool)
+    first_glyph[1:] = glyph_word[1:] != glyph_word[:-1]
+    glyph_xmin[first_glyph] = word_left[glyph_word[first_glyph]]
+
+    # Spaces following each word: a space starts at the right edge of the word
+    # that precedes it on the same line and carries that word's number
+    df_spaces = find_word_spaces(df_words)
+    space_lines = pd.MultiIndex.from_arrays([df_spaces['block_num'], df_spaces['par_num'], df_spaces['line_num']])
+    line_ids, line_keys = space_lines.factorize()
+    word_line_ids = line_keys.get_indexer(pd.MultiIndex.from_arrays([word_block, word_par, word_line]))
+    space_index = BoxIndex(df_spaces['left'], df_spaces['top'],
+                           df_spaces['left'] + df_spaces['width'], df_spaces['top'] + df_spaces['height'],
+                           lines=line_ids)
+    space_word, space_row = space_index.left_edge_in(word_right, word_right, lines=word_line_ids)
+    same_word = df_spaces['word_num'].to_numpy(dtype=np.int64)[space_row] == word_num[space_word]
+    space_word, space_row = space_word[same_word], space_row[same_word]
+
+    space_xmin = df_spaces['left'].to_numpy(dtype=np.int64)[space_row]
+    space_ymin = df_spaces['top'].to_numpy(dtype=np.int64)[space_row]
+    space_xmax = space_xmin + df_spaces['width'].to_numpy(dtype=np.int64)[space_row]
+    space_ymax = space_ymin + df_spaces['height'].to_numpy(dtype=np.int64)[space_row]
+
+    # Glyph rows first, then space rows, for every word in TSV order
+    row_word = np.concatenate([glyph_word, space_word])
+    row_kind = np.concatenate([np.zeros(len(glyph_word), dtype=np.int64),
+                               np.ones(len(space_word), dtype=np.int64)])
+    row_seq = np.concatenate([np.arange(len(glyph_word)), space_row])
+    order = np.lexsort((row_seq, row_kind, row_word))
+    row_word = row_word[order]
+
+    xmin = np.concatenate([glyph_xmin, space_xmin])[order]
+    ymin = np.concatenate([word_top[glyph_word], space_ymin])[order]
+    xmax = np.concatenate([glyph_xmax, space_xmax])[order]
+    ymax = np.concatenate([word_bottom[glyph_word], space_ymax])[order]
+    chars = np.concatenate([char_text[glyph_char],
+                            np.full(len(space_word), ' ', dtype=object)])[order]
+
+    word_start = np.ones(len(row_word), dtype=bool)
+    word_start[1:] = row_word[1:] != row_word[:-1]
+    start_pos = np.flatnonzero(word_start)
+    letter_nr = np.arange(len(row_word)) - np.repeat(start_pos, np.diff(np.append(start_pos, len(row_word))))
+
+    return pd.DataFrame({
+        'char': chars,
+        'char_xmin': xmin,
+        'char_ymin': ymin,
+        'char_xmax': xmax,
+        'char_ymax': ymax,
+        'block': word_block[row_word],
+        'paragraph': word_par[row_word],
+        'line_number': word_line[row_word],
+        'word_nr': word_num[row_word],
+        'letter_nr': letter_nr,
+        'word': word_text[row_word],
+        'char_x_center': (xmin + xmax) / 2,
+        'char_y_center': (ymin + ymax) / 2,
+        'assigned_line': None,
+        'trial_id': trial_id
+    }, columns=WORD_CHAR_COLUMNS)
+
+
+def _run_tesseract(image, tesseract_config, single_pass):
+    """Runs Tesseract on a PIL image and returns its raw outputs as a {name: text} dict."""
+    if single_pass:
+        hocr = pytesseract.image_to_pdf_or_hocr(image, extension='hocr',
+                                                config=f'{tesseract_config} {HOCR_CHAR_BOXES_CONFIG}')
+        return {'page.hocr': hocr.decode('utf-8')}
+    return {'words.tsv': pytesseract.image_to_data(image, config=tesseract_config),
+            'boxes.txt': pytesseract.image_to_boxes(image, config=tesseract_config)}
+
+
+def _parse_outputs(outputs, image_height, single_pass, prefix=''):
+    """Turns raw Tesseract outputs into (df_words, df_chars) in the image's coordinates."""
+    if single_pass:
+        # hOCR boxes are already in image coordinates
+        return parse_hocr(outputs[prefix + 'page.hocr'])
+    return (read_image_to_data(outputs[prefix + 'words.tsv']),
+            read_image_to_boxes(outputs[prefix + 'boxes.txt'], image_height))
+
+
+def tesseract_tables(image_path, tesseract_config='--psm 6 -l spa', single_pass=False, use_cache=True,
+                     roi=None, roi_workers=4):
+    """
+    Runs Tesseract on a page and returns its word and character tables.
+
+    Args:
+        image_path: Path to the image file.
+        tesseract_config: Configuration string for pytesseract (e.g., '--psm 6 -l spa').
+        single_pass: If True, run Tesseract once and read word and character boxes
+            from its hOCR output instead of calling image_to_data and image_to_boxes.
+        use_cache: If False, bypass the on-disk OCR cache (see ocr_cache.py) and
+            always run Tesseract.
+        roi: None to OCR the whole bitmap, 'ink' to OCR only the box around the
+            ink, or 'lines' to OCR every text band separately (see
+            ink_regions.find_text_regions). Blank margins are never sent to
+            Tesseract and coordinates are mapped back to the page.
+        roi_workers: Number of text bands OCRed at the same time in 'lines' mode.
+
+    Returns:
+        tuple: (df_words, df_chars), the image_to_data table and the character
+        boxes in image coordinates.
+    """
+    image = Image.open(image_path)
+    kind = 'hocr' if single_pass else 'data+boxes'
+
+    if roi is None:
+        outputs = cached_tesseract(image_path, tesseract_config, kind,
+                                   lambda: _run_tesseract(image.convert('RGB'), tesseract_config, single_pass),
+                                   use_cache)
+        return _parse_outputs(outputs, image.height, single_pass)
+
+    def run_regions():
+        rgb_image = image.convert('RGB')
+        regions = find_text_regions(rgb_image, mode=roi)
+        crops = [rgb_image.crop(region) for region in regions]
+        # Tesseract runs as a subprocess, so threads are enough to OCR bands in parallel
+        with ThreadPoolExecutor(max_workers=roi_workers) as executor:
+            region_outputs = list(executor.map(lambda crop: _run_tesseract(crop, tesseract_config, single_pass), crops))
+        outputs = {'regions.csv': '\n'.join(','.join(str(v) for v in region) for region in regions)}
+        for k, region_output in enumerate(region_outputs):
+            outputs.update({f'region{k}_{name}': text for name, text in region_output.items()})
+        return outputs
+
+    outputs = cached_tesseract(image_path, tesseract_config, f'{kind}:roi={roi}', run_regions, use_cache)
+    regions = [tuple(int(v) for v in line.split(',')) for line in outputs['regions.csv'].splitlines() if line]
+    region_tables = [_parse_outputs(outputs, bottom - top, single_pass, prefix=f'region{k}_')
+                     for k, (left, top, right, bottom) in enumerate(regions)]
+    return merge_region_tables(region_tables, regions, image.size)
+
+
+def recognize_text(image_path, tesseract_config='--psm 6 -l spa', single_pass=False, use_cache=True, roi=None):
     """
     Performs OCR on an image and returns a DataFrame with character bounding boxes
     and associated information.
@@ -13,191 +253,39 @@ def recognize_text(image_path, tesseract_config='--psm 6 -l spa'):
     Args:
         image_path: Path to the image file.
         tesseract_config: Configuration string for pytesseract (e.g., '--psm 6 -l spa').
+        single_pass: If True, run Tesseract once and read word and character boxes
+            from its hOCR output instead of calling image_to_data and image_to_boxes.
+        use_cache: If False, bypass the on-disk OCR cache (see ocr_cache.py) and
+            always run Tesseract.
+        roi: None to OCR the whole page, or 'ink'/'lines' to OCR only the inked
+            regions (see tesseract_tables).
 
     Returns:
         pandas.DataFrame: DataFrame containing character-level data (df_word_chars).
     """
-
-    image = Image.open(image_path).convert('RGB')
-    image_height = image.height
-
     # Extract filename for trial_id
     trial_id = os.path.splitext(os.path.basename(image_path))[0]
 
-    # Use pytesseract to extract data for words and characters
-    data_words = pytesseract.image_to_data(image, config=tesseract_config)
-    data_chars = pytesseract.image_to_boxes(image, config=tesseract_config)
-
-    df_words = pd.read_csv(io.StringIO(data_words), sep='\t', quoting=csv.QUOTE_NONE)
-    df_chars = pd.read_csv(io.StringIO(data_chars), sep=' ', header=None, names=['char', 'left', 'top', 'right', 'bottom', 'unknown'])
-
-    # Fix character coordinates
-    for index, row in df_chars.iterrows():
-        original_top = int(row['top'])
-        original_bottom = int(row['bottom'])
-        df_chars.at[index, 'top'] = image_height - original_bottom
-        df_chars.at[index, 'bottom'] = image_height - original_top
-
-    # Create DataFrame to store spaces
-    df_spaces = pd.DataFrame(columns=['level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num', 'left', 'top', 'width', 'height', 'conf', 'text'])
-
-    # Group words by line, block, and paragraph
-    grouped_lines = df_words.groupby(['block_num', 'par_num', 'line_num'])
-
-    for (block_num, par_num, line_num), line_words_df in grouped_lines:
-        sorted_words = line_words_df.sort_values(by='left')
-        previous_word = None
-        for index, current_word in sorted_words.iterrows():
-            if previous_word is not None:
-                space_left = int(previous_word['left']) + int(previous_word['width'])
-                space_width = int(current_word['left']) - space_left
-                if space_width > 0:
-                    space_top = int(previous_word['top'])
-                    space_height = int(previous_word['height'])
-                    space_data = {
-                        'level': 5,
-                        'page_num': int(current_word['page_num']),
-                        'block_num': int(current_word['block_num']),
-                        'par_num': int(current_word['par_num']),
-                        'line_num': int(current_word['line_num']),
-                        'word_num': int(previous_word['word_num']),
-                        'left': space_left,
-                        'top': space_top,
-                        'width': space_width,
-                        'height': space_height,
-                        'conf': 0,
-                        'text': ' '
-                    }
-                    df_spaces = pd.concat([df_spaces, pd.DataFrame(space_data, index=[0])], ignore_index=True)
-            previous_word = current_word
-
-    # Create DataFrame for characters within words (and spaces)
-    df_word_chars = pd.DataFrame(columns=['char', 'char_xmin', 'char_ymin', 'char_xmax', 'char_ymax',
-                                         'block', 'paragraph', 'line_number',
-                                         'word_nr', 'letter_nr', 'word',
-                                         'char_x_center', 'char_y_center', 'assigned_line', 'trial_id'])
-
-
-    for index_word, row_word in df_words.iterrows():
-        if isinstance(row_word['text'], str) and row_word['text'].strip() and row_word['level'] == 5:
-            word_left = int(row_word['left'])
-            word_top = int(row_word['top'])
-            word_width = int(row_word['width'])
-            word_height = int(row_word['height'])
-            word_right = word_left + word_width
-            word_bottom = word_top + word_height
-            word_text = row_word['text']
-
-            char_index_in_word = 0
-            relevant_chars = df_chars[
-                (df_chars['left'] >= word_left) & (df_chars['right'] <= word_right) &
-                (df_chars['top'] >= word_top) & (df_chars['bottom'] <= word_bottom)
-            ]
-            relevant_chars = relevant_chars.sort_values(by='left')
-            previous_char_right = word_left
-
-            for index_char, row_char in relevant_chars.iterrows():
-                char_text = row_char['char']
-                char_left = previous_char_right
-                char_right = int(row_char['right'])
-                char_right = min(char_right, word_right)
-                if char_left > char_right:
-                    char_right = int(row_char['right'])
-                char_top = word_top
-                char_bottom = word_bottom
-
-                char_data = {
-                    'char': char_text,
-                    'char_xmin': char_left,
-                    'char_ymin': char_top,
-                    'char_xmax': char_right,
-                    'char_ymax': char_bottom,
-                    'block': int(row_word['block_num']),
-                    'paragraph': int(row_word['par_num']),
-                    'line_number': int(row_word['line_num']),
-                    'word_nr': int(row_word['word_num']),
-                    'letter_nr': char_index_in_word,
-                    'word': word_text,
-                    'char_x_center': (char_left + char_right) / 2,
-                    'char_y_center': (char_top + char_bottom) / 2,
-                    'assigned_line': None,
-                    'trial_id': trial_id
-                }
-                df_word_chars = pd.concat([df_word_chars, pd.DataFrame(char_data, index=[0])], ignore_index=True)
-                char_index_in_word += 1
-                previous_char_right = char_right
-
-            spaces_following_word = df_spaces[
-                (df_spaces['word_num'] == int(row_word['word_num'])) &
-                (df_spaces['line_num'] == int(row_word['line_num'])) &
-                (df_spaces['block_num'] == int(row_word['block_num'])) &
-                (df_spaces['par_num'] == int(row_word['par_num']))
-            ]
-
-            for index_space, row_space in spaces_following_word.iterrows():
-                space_data = {
-                    'char': ' ',
-                    'char_xmin': int(row_space['left']),
-                    'char_ymin': int(row_space['top']),
-                    'char_xmax': int(row_space['left']) + int(row_space['width']),
-                    'char_ymax': int(row_space['top']) + int(row_space['height']),
-                    'block': int(row_space['block_num']),
-                    'paragraph': int(row_space['par_num']),
-                    'line_number': int(row_space['line_num']),
-                    'word_nr': int(row_space['word_num']),
-                    'letter_nr': char_index_in_word,
-                    'word': word_text,
-                    'char_x_center': (int(row_space['left']) + int(row_space['left']) + int(row_space['width'])) / 2,
-                    'char_y_center': (int(row_space['top']) + int(row_space['top']) + int(row_space['height'])) / 2,
-                    'assigned_line': None,
-                    'trial_id': trial_id
-                }
-                df_word_chars = pd.concat([df_word_chars, pd.DataFrame(space_data, index=[0])], ignore_index=True)
-                char_index_in_word += 1
-
-    # Create 'assigned_line' column
-    df_word_chars['assigned_line'] = 0
-    line_counter = 1
-    for block_num in sorted(df_word_chars['block'].unique()):
-        for par_num in sorted(df_word_chars.loc[df_word_chars['block'] == block_num, 'paragraph'].unique()):
-            for line_num in sorted(df_word_chars.loc[(df_word_chars['block'] == block_num) & (df_word_chars['paragraph'] == par_num), 'line_number'].unique()):
-                line_mask = (df_word_chars['line_number'] == line_num) & (df_word_chars['paragraph'] == par_num) & (df_word_chars['block'] == block_num)
-                df_word_chars.loc[line_mask, 'assigned_line'] = line_counter
-                line_counter += 1
-
-    # Adjust Y_Start and Y_End for all characters on the same line
-    for assigned_line in df_word_chars['assigned_line'].unique():
-        line_mask = (df_word_chars['assigned_line'] == assigned_line)
-        min_top = df_word_chars.loc[line_mask, 'char_ymin'].min()
-        max_bottom = df_word_chars.loc[line_mask, 'char_ymax'].max()
-        df_word_chars.loc[line_mask, 'char_ymin'] = min_top
-        df_word_chars.loc[line_mask, 'char_ymax'] = max_bottom
-
-    return df_word_chars
+    df_words, df_chars = tesseract_tables(image_path, tesseract_config, single_pass, use_cache, roi)
+
+    # Assign characters and spaces to words
+    df_word_chars = build_word_chars(df_words, df_chars, trial_id)
+
+    # Number the lines and adjust char_ymin/char_ymax for all characters on the same line
+    return assign_lines(df_word_chars)
 
 
 def draw_char_boxes(image_path, df_word_chars, output_path='output_boxes_combined.png'):
     """
-    Draws bounding boxes around characters on the image.
+    Draws bounding boxes around characters on the image (purple, see overlay.render_overlay).
 
     Args:
         image_path: Path to the image file.
         df_word_chars: DataFrame containing character bounding box data.
         output_path: Path to save the image with bounding boxes.  Defaults to 'output_boxes_combined.png'.
     """
-    image = Image.open(image_path).convert('RGB')
-    draw = ImageDraw.Draw(image)
-
-    # Draw bounding boxes for characters (purple)
-    for index, row in df_word_chars.iterrows():
-        left = int(row['char_xmin'])
-        top = int(row['char_ymin'])
-        right = int(row['char_xmax'])
-        bottom = int(row['char_ymax'])
-        draw.rectangle([(left, top), (right, bottom)], outline='purple', width=1)
-
-    # Display or save the image
-    image.save(output_path)
+    # All boxes are rasterized at once instead of one ImageDraw call per glyph
+    render_overlay(image_path, {'ocr': df_word_chars}).save(output_path)
 
 
 # Example usage
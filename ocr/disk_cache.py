@@ -0,0 +1,70 @@
+import os
+import shutil
+
+# Suffix of the files and folders that entries are written to before being
+# renamed into place; they belong to puts in progress and are never evicted
+TEMP_SUFFIX = '.tmp'
+
+
+class DiskCache:
+    """
+    Base of the on-disk caches: entries (files or folders) live in shards
+    named after the first two characters of their key, and the least recently
+    used ones are deleted by evict once the cache grows beyond `max_bytes`.
+
+    Several processes may share a cache folder, so entries can appear,
+    be replaced or vanish while the cache is scanned; evict skips whatever
+    disappears under it and leaves temporary (TEMP_SUFFIX) entries alone.
+    """
+
+    def __init__(self, directory, max_bytes):
+        """
+        Args:
+            directory: Folder holding the cache.
+            max_bytes: Size limit of the cache in bytes.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _entries(self):
+        """(mtime, size, path, is_dir) of every finished entry still on disk."""
+        try:
+            shards = [shard.path for shard in os.scandir(self.directory) if shard.is_dir()]
+        except FileNotFoundError:
+            return []
+        entries = []
+        for shard in shards:
+            try:
+                listing = list(os.scandir(shard))
+            except FileNotFoundError:
+                continue
+            for entry in listing:
+                if entry.name.endswith(TEMP_SUFFIX):
+                    continue
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path)) if is_dir else entry.stat().st_size
+                    entries.append((entry.stat().st_mtime, size, entry.path, is_dir))
+                except FileNotFoundError:
+                    # Evicted or replaced by another process meanwhile
+                    continue
+        return entries
+
+    def evict(self):
+        """Deletes least recently used entries until the cache fits in max_bytes."""
+        entries = self._entries()
+        total = sum(size for _, size, _, _ in entries)
+        for _, size, path, is_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if is_dir:
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
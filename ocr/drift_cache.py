@@ -0,0 +1,73 @@
+import hashlib
+import io
+import os
+import tempfile
+
+import numpy as np
+
+from disk_cache import TEMP_SUFFIX, DiskCache
+
+DEFAULT_CACHE_DIR = os.environ.get('DRIFT_CACHE_DIR',
+                                   os.path.join(os.path.expanduser('~'), '.cache', 'eri_reading_data', 'drift'))
+DEFAULT_MAX_BYTES = 256 * 1024 ** 2  # 256 MB
+
+
+class AssignmentCache(DiskCache):
+    """
+    On-disk cache of the line assignments of drift-correction algorithms.
+
+    One entry holds the 0-based lines that one algorithm gave the fixations of
+    one trial. The key is a SHA-256 over the algorithm name and version, its
+    options and the bytes of its inputs (fixation positions, line y and, for
+    the algorithms that use them, word centers), so changing the data, the
+    options or bumping an algorithm's version all miss the cache. Entries are
+    .npy files; reads refresh their timestamp and the least recently used
+    entries are deleted by evict once the cache grows beyond `max_bytes`.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Args:
+            directory: Folder holding the cache (default: $DRIFT_CACHE_DIR or
+                ~/.cache/eri_reading_data/drift).
+            max_bytes: Size limit of the cache in bytes.
+        """
+        super().__init__(directory, max_bytes)
+
+    def key(self, algorithm, version, options, arrays):
+        digest = hashlib.sha256()
+        digest.update(f'{algorithm}:{version}:{sorted(options.items())!r}'.encode('utf-8'))
+        for array in arrays:
+            array = np.ascontiguousarray(array, dtype=np.float64)
+            digest.update(repr(array.shape).encode('utf-8'))
+            digest.update(array.tobytes())
+        return digest.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.npy')
+
+    def get(self, key):
+        """Returns the cached line assignment for `key`, or None."""
+        entry = self._entry(key)
+        try:
+            lines = np.load(entry)
+            os.utime(entry)
+        except (FileNotFoundError, ValueError, EOFError):
+            return None
+        return lines
+
+    def put(self, key, lines):
+        """
+        Stores a line assignment under `key`. Entries are small and written
+        by the thousand, so eviction is left to an explicit call to evict.
+        """
+        entry = self._entry(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        buffer = io.BytesIO()
+        np.save(buffer, np.asarray(lines, dtype=np.int16))
+        # Write to a temporary file and rename it so parallel workers never
+        # see half-written entries
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(entry), suffix=TEMP_SUFFIX)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp, entry)
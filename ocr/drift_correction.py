@@ -0,0 +1,677 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from coordinate_tables import read_table, write_table
+from drift_cache import DEFAULT_CACHE_DIR, AssignmentCache
+from interest_areas import InterestAreas
+
+# Vertical drift correction: the algorithms of Carr et al. (2022), "Algorithms
+# for the automated correction of vertical drift in eye-tracking data", which
+# GazeGenie applies to produce the y_<algorithm> and line_num_<algorithm>
+# columns of corrected_fixations_data.csv. Every kernel takes the fixations of
+# one trial in temporal order (n x 2 array of x, y), the y of the text lines
+# (ascending) and the word centers in reading order, and returns the 0-based
+# line of every fixation. The default thresholds are those of the reference
+# implementation, in screen pixels. The Wisdom_of_Crowds consensus is a vote
+# over the results of the other algorithms, which can be cached per trial
+# (drift_cache.py) so that retuning one algorithm reruns only that one.
+
+
+def _nearest_line(line_Y, y):
+    """Index of the nearest line to every y (the upper one on a tie)."""
+    return np.searchsorted((line_Y[1:] + line_Y[:-1]) / 2, y, side='left')
+
+
+def _segment_ids(boundaries, n):
+    """Segment number of every fixation, given booleans that start a new segment after fixation i."""
+    ids = np.zeros(n, dtype=np.int64)
+    ids[1:] = np.cumsum(boundaries)
+    return ids
+
+
+def _segment_lines(fixation_XY, line_Y, ids):
+    """Moves every segment of fixations to the line nearest its mean y."""
+    mean_y = np.bincount(ids, weights=fixation_XY[:, 1]) / np.bincount(ids)
+    return _nearest_line(line_Y, mean_y)[ids]
+
+
+def kmeans_1d(values, k, n_init=10, max_iter=300, seed=0):
+    """
+    1-D k-means (Lloyd's algorithm) with k-means++ starts.
+
+    In one dimension the clusters are intervals, so every assignment step is
+    a searchsorted over the midpoints between the sorted centers.
+
+    Returns:
+        (labels, centers): Cluster of every value, numbered by increasing
+        center, and the sorted centers.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    k = min(k, len(np.unique(values)))
+    rng = np.random.default_rng(seed)
+    best = None
+    for _ in range(n_init):
+        centers = [values[rng.integers(len(values))]]
+        for _ in range(k - 1):
+            distance = np.min(np.abs(values[:, None] - np.array(centers)[None, :]), axis=1) ** 2
+            centers.append(values[rng.choice(len(values), p=distance / distance.sum())])
+        centers = np.sort(np.array(centers))
+        for _ in range(max_iter):
+            labels = np.searchsorted((centers[1:] + centers[:-1]) / 2, values)
+            counts = np.bincount(labels, minlength=k)
+            sums = np.bincount(labels, weights=values, minlength=k)
+            updated = np.sort(np.where(counts > 0, sums / np.maximum(counts, 1), centers))
+            if np.array_equal(updated, centers):
+                break
+            centers = updated
+        labels = np.searchsorted((centers[1:] + centers[:-1]) / 2, values)
+        inertia = ((values - centers[labels]) ** 2).sum()
+        if best is None or inertia < best[0]:
+            best = (inertia, labels, centers)
+    return best[1], best[2]
+
+
+def dtw(sequence1, sequence2, band=None):
+    """
+    Dynamic time warping between two sequences of points.
+
+    The accumulated cost is filled one row at a time, each as a few vector
+    operations: within a row, cost[j] = distance[j] + min(cost[j - 1],
+    above[j]) unrolls into a running minimum over prefix sums. With `band`,
+    every row is filled only within that many steps of the (scaled) diagonal
+    (Sakoe-Chiba band), so the work grows with the band instead of the
+    product of the lengths; a band below 1 is a fraction of the longer
+    sequence.
+
+    Returns:
+        (cost, path): Total cost and, for every point of sequence1, the list
+        of indices of sequence2 it is aligned to, last first (as in Carr et
+        al.).
+    """
+    a = np.asarray(sequence1, dtype=np.float64).reshape(len(sequence1), -1)
+    b = np.asarray(sequence2, dtype=np.float64).reshape(len(sequence2), -1)
+    n1, n2 = len(a), len(b)
+    rows = np.arange(n1)
+    if band is None:
+        lowest, highest = np.zeros(n1, dtype=np.int64), np.full(n1, n2 - 1)
+    else:
+        # Columns of every row within the band; at least one slope wide so the band stays connected
+        slope = (n2 - 1) / max(n1 - 1, 1)
+        radius = max(band * max(n1, n2) if band < 1 else band, slope, 1)
+        lowest = np.clip(np.ceil(rows * slope - radius), 0, n2 - 1).astype(np.int64)
+        highest = np.clip(np.floor(rows * slope + radius), 0, n2 - 1).astype(np.int64)
+
+    cost = np.full((n1, n2), np.inf)
+    previous = np.full(n2 + 1, np.inf)
+    previous[0] = 0
+    for i in range(n1):
+        lo, hi = lowest[i], highest[i] + 1
+        distance = np.sqrt(((b[lo:hi] - a[i]) ** 2).sum(axis=1))
+        # Best of the cells above and above-left; previous is shifted by one column
+        above = np.minimum(previous[lo + 1:hi + 1], previous[lo:hi])
+        total = np.cumsum(distance)
+        cost[i, lo:hi] = total + np.minimum.accumulate(above - (total - distance))
+        previous[:] = np.inf
+        previous[lo + 1:hi + 1] = cost[i, lo:hi]
+
+    # Backtrack from the last cell, preferring the diagonal, then up, then left
+    total = cost[-1, -1]
+    cost = cost.tolist()
+    path = [[] for _ in range(n1)]
+    i, j = n1 - 1, n2 - 1
+    while i > 0 or j > 0:
+        path[i].append(j)
+        diagonal = cost[i - 1][j - 1] if i > 0 and j > 0 else np.inf
+        up = cost[i - 1][j] if i > 0 else np.inf
+        left = cost[i][j - 1] if j > 0 else np.inf
+        if diagonal <= up and diagonal <= left:
+            i, j = i - 1, j - 1
+        elif up <= left:
+            i -= 1
+        else:
+            j -= 1
+    path[0].append(0)
+    return total, path
+
+
+def attach(fixation_XY, line_Y, word_XY=None):
+    """Every fixation goes to the nearest line."""
+    return _nearest_line(line_Y, fixation_XY[:, 1])
+
+
+def chain(fixation_XY, line_Y, word_XY=None, x_thresh=192, y_thresh=32):
+    """Chains of fixations linked by small saccades go to the line nearest their mean y."""
+    step = np.abs(np.diff(fixation_XY, axis=0))
+    boundaries = (step[:, 0] > x_thresh) | (step[:, 1] > y_thresh)
+    return _segment_lines(fixation_XY, line_Y, _segment_ids(boundaries, len(fixation_XY)))
+
+
+def cluster(fixation_XY, line_Y, word_XY=None):
+    """k-means on y with one cluster per line; clusters go to lines in order of their centers."""
+    labels, _ = kmeans_1d(fixation_XY[:, 1], len(line_Y))
+    return labels
+
+
+def compare(fixation_XY, line_Y, word_XY, x_thresh=512, n_nearest_lines=3, band=None):
+    """
+    Gaze lines (split at long return sweeps) go to the nearest of the
+    n_nearest_lines lines whose word x positions they match best (DTW).
+    """
+    n = len(fixation_XY)
+    ids = _segment_ids(np.diff(fixation_XY[:, 0]) < -x_thresh, n)
+    word_line = _nearest_line(line_Y, word_XY[:, 1])
+    lines = np.empty(n, dtype=np.int64)
+    for gaze_line_i in range(ids[-1] + 1):
+        gaze_line = fixation_XY[ids == gaze_line_i]
+        candidates = np.argsort(np.abs(line_Y - gaze_line[:, 1].mean()), kind='stable')[:n_nearest_lines]
+        costs = [dtw(gaze_line[:, 0], word_XY[word_line == line, 0], band)[0] if (word_line == line).any()
+                 else np.inf for line in candidates]
+        lines[ids == gaze_line_i] = candidates[int(np.argmin(costs))]
+    return lines
+
+
+def _combine_moments(a, b):
+    """
+    Moments (count, mean x, mean y, and the centered xx, xy, yy sums along
+    the last axis) of the union of two sets of fixations, by the pairwise
+    update of Chan et al., which stays exact where raw sums cancel.
+    """
+    count = a[..., 0] + b[..., 0]
+    dx, dy = b[..., 1] - a[..., 1], b[..., 2] - a[..., 2]
+    weight = a[..., 0] * b[..., 0] / count
+    return np.stack([count, a[..., 1] + dx * b[..., 0] / count, a[..., 2] + dy * b[..., 0] / count,
+                     a[..., 3] + b[..., 3] + dx * dx * weight, a[..., 4] + b[..., 4] + dx * dy * weight,
+                     a[..., 5] + b[..., 5] + dy * dy * weight], axis=-1)
+
+
+def _line_fits(moments):
+    """Slope and RMS error of the least-squares line through sets of fixations, from their moments."""
+    count, mean_x, mean_y, cxx, cxy, cyy = np.moveaxis(moments, -1, 0)
+    # For fixations with one x, the minimum-norm solution that np.polyfit gives in the reference implementation
+    vertical = cxx <= 1e-9
+    gradient = np.where(vertical, mean_x * mean_y / (mean_x ** 2 + 1), cxy / np.where(vertical, 1, cxx))
+    sse = np.where(vertical, cyy, cyy - gradient * cxy)
+    # Errors that differ only by rounding are ties, which go to the first pair
+    return gradient, np.round(np.sqrt(np.maximum(sse, 0) / count), 9)
+
+
+def merge(fixation_XY, line_Y, word_XY=None, y_thresh=32, gradient_thresh=0.1, error_thresh=20):
+    """
+    Progressive sequences (split at regressions and vertical jumps) are
+    merged pairwise, the pair with the best-fitting regression line first,
+    until there are as many as lines; they then go to the lines in order.
+
+    The fits of all pairs come in closed form from the moments of the
+    sequences; after a merger only the pairs of the merged sequence are fit.
+    """
+    n, m = len(fixation_XY), len(line_Y)
+    diff = np.diff(fixation_XY, axis=0)
+    ids = _segment_ids((diff[:, 0] < 0) | (np.abs(diff[:, 1]) > y_thresh), n)
+    sequences = [list(np.flatnonzero(ids == i)) for i in range(ids[-1] + 1)]
+    count = np.bincount(ids)
+    mean_x = np.bincount(ids, weights=fixation_XY[:, 0]) / count
+    mean_y = np.bincount(ids, weights=fixation_XY[:, 1]) / count
+    dx, dy = fixation_XY[:, 0] - mean_x[ids], fixation_XY[:, 1] - mean_y[ids]
+    moments = np.column_stack([count, mean_x, mean_y, np.bincount(ids, weights=dx * dx),
+                               np.bincount(ids, weights=dx * dy), np.bincount(ids, weights=dy * dy)])
+
+    for min_i, min_j, no_constraints in [(3, 3, False), (1, 3, False), (1, 1, False), (1, 1, True)]:
+
+        def pair_errors(first, second):
+            # Fit errors of the pairs that may merge in this phase, inf for the others
+            gradient, error = _line_fits(_combine_moments(first, second))
+            allowed = (first[..., 0] >= min_i) & (second[..., 0] >= min_j)
+            if not no_constraints:
+                allowed &= (np.abs(gradient) < gradient_thresh) & (error < error_thresh)
+            return np.where(allowed, error, np.inf)
+
+        # Pair (i, j) is kept in row i, column j for i before j
+        errors = np.where(np.tri(len(moments), dtype=bool), np.inf,
+                          pair_errors(moments[:, None, :], moments[None, :, :]))
+        while len(sequences) > m:
+            merge_i, merge_j = np.unravel_index(np.argmin(errors), errors.shape)
+            if errors[merge_i, merge_j] == np.inf:
+                break
+            # The merged sequence goes last, after the others
+            keep = np.ones(len(sequences), dtype=bool)
+            keep[[merge_i, merge_j]] = False
+            sequences = [sequences[i] for i in np.flatnonzero(keep)] + [sequences[merge_i] + sequences[merge_j]]
+            moments = np.vstack([moments[keep], _combine_moments(moments[merge_i], moments[merge_j])])
+            errors = errors[np.ix_(*[np.append(np.flatnonzero(keep), -1)] * 2)]
+            errors[:-1, -1] = pair_errors(moments[:-1], moments[-1])
+            errors[-1] = np.inf
+
+    lines = np.empty(n, dtype=np.int64)
+    for line, sequence in enumerate(np.argsort(moments[:, 2], kind='stable')):
+        lines[sequences[sequence]] = min(line, m - 1)
+    return lines
+
+
+def regress(fixation_XY, line_Y, word_XY=None, k_bounds=(-0.1, 0.1), o_bounds=(-50, 50), s_bounds=(1, 20),
+            n_starts=11, max_iter=50):
+    """
+    Fits a set of parallel, sloped lines (slope k, offset o, spread s) to the
+    fixations and gives every fixation the line of highest likelihood.
+
+    Instead of a general-purpose optimizer, the fit alternates two closed-form
+    steps - nearest-line assignment, and the least-squares slope and offset
+    of the residuals (with the MLE spread) - from several starting offsets
+    across o_bounds, and keeps the fit with the highest likelihood.
+    """
+    x, y = fixation_XY[:, 0], fixation_XY[:, 1]
+    n = len(x)
+    best = None
+    for o_start in np.linspace(o_bounds[0], o_bounds[1], n_starts):
+        k, o = 0.0, o_start
+        lines = None
+        for _ in range(max_iter):
+            updated = _nearest_line(line_Y, y - k * x - o)
+            if lines is not None and np.array_equal(updated, lines):
+                break
+            lines = updated
+            residual = y - line_Y[lines]
+            x_centered = x - x.mean()
+            denominator = (x_centered ** 2).sum()
+            k = float(np.clip((x_centered * residual).sum() / denominator if denominator else 0.0, *k_bounds))
+            o = float(np.clip((residual - k * x).mean(), *o_bounds))
+        sse = ((y - k * x - o - line_Y[lines]) ** 2).sum()
+        s = float(np.clip(np.sqrt(sse / n), *s_bounds))
+        log_likelihood = -n * np.log(s) - sse / (2 * s ** 2)
+        if best is None or log_likelihood > best[0]:
+            best = (log_likelihood, lines)
+    return best[1]
+
+
+def segment(fixation_XY, line_Y, word_XY=None):
+    """The m - 1 longest leftward saccades are taken as the return sweeps between the m lines."""
+    n, m = len(fixation_XY), len(line_Y)
+    sweeps = np.argsort(np.diff(fixation_XY[:, 0]), kind='stable')[:m - 1]
+    boundaries = np.zeros(max(n - 1, 0), dtype=bool)
+    boundaries[sweeps] = True
+    return np.minimum(_segment_ids(boundaries, n), m - 1)
+
+
+def split(fixation_XY, line_Y, word_XY=None):
+    """Saccades are split into return sweeps and the rest by 2-means on their x change."""
+    n = len(fixation_XY)
+    diff_X = np.diff(fixation_XY[:, 0])
+    if len(diff_X) < 2:
+        return attach(fixation_XY, line_Y)
+    labels, _ = kmeans_1d(diff_X, 2)
+    return _segment_lines(fixation_XY, line_Y, _segment_ids(labels == 0, n))
+
+
+def stretch(fixation_XY, line_Y, word_XY=None, scale_bounds=(0.9, 1.1), offset_bounds=(-50, 50), grid=41):
+    """
+    Scales and shifts all fixation y (within the bounds) so that they lie as
+    close as possible to the lines, then attaches them.
+
+    The cost is evaluated on a grid of scales and offsets at once, and again
+    on a finer grid around the best point.
+    """
+    y = fixation_XY[:, 1]
+    mids = (line_Y[1:] + line_Y[:-1]) / 2
+    scales = np.linspace(*scale_bounds, grid)
+    offsets = np.linspace(*offset_bounds, grid)
+    for _ in range(2):
+        candidate = y[None, None, :] * scales[:, None, None] + offsets[None, :, None]
+        cost = np.abs(candidate - line_Y[np.searchsorted(mids, candidate)]).sum(axis=2)
+        # On equal cost, prefer the smallest change
+        cost += 1e-9 * (np.abs(scales - 1)[:, None] + np.abs(offsets / 100)[None, :])
+        i, j = np.unravel_index(np.argmin(cost), cost.shape)
+        scale, offset = scales[i], offsets[j]
+        scale_step, offset_step = scales[1] - scales[0], offsets[1] - offsets[0]
+        scales = np.clip(np.linspace(scale - scale_step, scale + scale_step, grid), *scale_bounds)
+        offsets = np.clip(np.linspace(offset - offset_step, offset + offset_step, grid), *offset_bounds)
+    return _nearest_line(line_Y, y * scale + offset)
+
+
+def _nearest_point_y(points, x):
+    """y of the point of `points` nearest in x to every x (the earlier point on a tie)."""
+    order = np.argsort(points[:, 0], kind='stable')
+    xs = points[order, 0]
+    right = np.clip(np.searchsorted(xs, x), 0, len(xs) - 1)
+    left = np.clip(np.searchsorted(xs, xs[np.maximum(right - 1, 0)]), 0, len(xs) - 1)
+    right = np.clip(np.searchsorted(xs, xs[right]), 0, len(xs) - 1)
+    to_left, to_right = np.abs(x - xs[left]), np.abs(xs[right] - x)
+    use_left = (to_left < to_right) | ((to_left == to_right) & (order[left] <= order[right]))
+    return points[order[np.where(use_left, left, right)], 1]
+
+
+def slice_(fixation_XY, line_Y, word_XY=None, x_thresh=192, y_thresh=32, w_thresh=32, n_thresh=90):
+    """
+    Runs of fixations (split at large saccades) are grouped into proto-lines
+    that grow up and down from the widest run, by the mean vertical distance
+    of every run to the proto-line; the proto-lines then go to the lines in
+    order, from the top.
+    """
+    n = len(fixation_XY)
+    line_height = np.mean(np.diff(line_Y)) if len(line_Y) > 1 else 0.0
+    step = np.abs(np.diff(fixation_XY, axis=0))
+    ids = _segment_ids((step[:, 0] > x_thresh) | (step[:, 1] > y_thresh), n)
+    runs = [np.flatnonzero(ids == i) for i in range(ids[-1] + 1)]
+    proto_lines, phantom_proto_lines = {}, {}
+
+    def proto_line_XY(proto_line):
+        if len(proto_lines[proto_line]):
+            return fixation_XY[proto_lines[proto_line]]
+        return phantom_proto_lines[proto_line]
+
+    def run_differences(points, runs):
+        # Mean y difference of every run to the proto-line points nearest in x, for all runs at once
+        rows = np.concatenate(runs)
+        run_ids = np.repeat(np.arange(len(runs)), [len(run) for run in runs])
+        differences = fixation_XY[rows, 1] - _nearest_point_y(points, fixation_XY[rows, 0])
+        return np.bincount(run_ids, weights=differences) / np.bincount(run_ids)
+
+    widest = int(np.argmax([fixation_XY[run[-1], 0] - fixation_XY[run[0], 0] for run in runs]))
+    proto_lines[0] = list(runs.pop(widest))
+    while runs:
+        merged = False
+        # As in the reference implementation, both directions get a (possibly empty) new proto-line
+        for proto_line, direction in [(min(proto_lines), -1), (max(proto_lines), 1)]:
+            proto_lines[proto_line + direction] = []
+            points = proto_line_XY(proto_line)
+            differences = run_differences(points, runs) if runs else np.zeros(0)
+            into_current = np.flatnonzero(np.abs(differences) < w_thresh)
+            into_adjacent = np.flatnonzero((differences * direction >= w_thresh) & (differences * direction < n_thresh))
+            for index in into_current:
+                proto_lines[proto_line].extend(runs[index])
+            for index in into_adjacent:
+                proto_lines[proto_line + direction].extend(runs[index])
+            if not len(into_adjacent):
+                average_x, average_y = points.mean(axis=0)
+                phantom_proto_lines[proto_line + direction] = np.array([[average_x,
+                                                                         average_y + direction * line_height]])
+            merged_runs = set(into_current) | set(into_adjacent)
+            runs = [run for index, run in enumerate(runs) if index not in merged_runs]
+            merged = merged or bool(merged_runs)
+        if not merged:
+            break
+
+    # Leftover runs go to the proto-line they are closest to on average
+    for run in runs:
+        distances = {proto_line: abs(run_differences(proto_line_XY(proto_line), [run])[0])
+                     for proto_line in proto_lines}
+        proto_lines[min(distances, key=distances.get)].extend(run)
+
+    # Trim the smaller end proto-line until there are no more proto-lines than lines
+    while len(proto_lines) > len(line_Y):
+        top, bottom = min(proto_lines), max(proto_lines)
+        if len(proto_lines[top]) < len(proto_lines[bottom]):
+            proto_lines[top + 1].extend(proto_lines.pop(top))
+        else:
+            proto_lines[bottom - 1].extend(proto_lines.pop(bottom))
+
+    lines = np.empty(n, dtype=np.int64)
+    for line, proto_line in enumerate(sorted(proto_lines)):
+        lines[proto_lines[proto_line]] = line
+    return lines
+
+
+def warp(fixation_XY, line_Y, word_XY, band=None):
+    """
+    Aligns the fixations to the word centers in reading order with DTW; every
+    fixation goes to the most common line of the words it is aligned to (on
+    a tie, the line of the last of those words, as statistics.mode picks in
+    the reference implementation).
+    """
+    _, path = dtw(fixation_XY, word_XY, band)
+    word_line = _nearest_line(line_Y, word_XY[:, 1])
+    fixation = np.repeat(np.arange(len(path)), [len(words) for words in path])
+    counts = np.zeros((len(path), len(line_Y)), dtype=np.int64)
+    np.add.at(counts, (fixation, word_line[np.concatenate(path)]), 1)
+    return len(line_Y) - 1 - np.argmax(counts[:, ::-1], axis=1)
+
+
+# Name -> kernel, in the column order of corrected_fixations_data.csv (slice_ keeps the builtin slice usable)
+ALGORITHMS = {
+    'compare': compare, 'attach': attach, 'segment': segment, 'split': split, 'stretch': stretch,
+    'slice': slice_, 'warp': warp, 'chain': chain, 'regress': regress, 'cluster': cluster, 'merge': merge,
+}
+# Bump an algorithm's version whenever its kernel changes what it returns: cached results are keyed by it
+ALGORITHM_VERSIONS = {name: 1 for name in ALGORITHMS}
+# Algorithms that need the word positions
+WORD_ALGORITHMS = {'compare', 'warp'}
+
+# Name of the consensus of the other algorithms, as in GazeGenie
+CONSENSUS = 'Wisdom_of_Crowds'
+
+
+def page_geometry(areas):
+    """
+    Returns the line y and word centers of every page, as the kernels take
+    them: {trial_id: (line_Y, word_XY)}, lines top to bottom and words in
+    reading order with the y of their line.
+    """
+    words = areas.words().frame
+    geometry = {}
+    for trial_id, page in areas.frame.groupby('trial_id', sort=False):
+        line_Y = page.groupby('assigned_line')['char_y_center'].mean()
+        page_words = words[words['trial_id'] == trial_id].sort_values(['assigned_line', 'char_xmin'], kind='stable')
+        word_XY = np.column_stack([page_words['char_x_center'].to_numpy(np.float64),
+                                   line_Y.loc[page_words['assigned_line']].to_numpy(np.float64)])
+        order = np.argsort(line_Y.to_numpy(), kind='stable')
+        geometry[str(trial_id)] = (line_Y.to_numpy(np.float64)[order], word_XY)
+    return geometry
+
+
+def correct_trial(fixation_XY, line_Y, word_XY, algorithms=tuple(ALGORITHMS), options=None, cache=None):
+    """
+    Runs drift-correction algorithms on the fixations of one trial.
+
+    Args:
+        fixation_XY: n x 2 array of fixation x, y in temporal order.
+        line_Y: y of the text lines, ascending.
+        word_XY: Word centers in reading order (x, line y).
+        algorithms: Names from ALGORITHMS.
+        options: {algorithm: {parameter: value}} to override thresholds.
+        cache: drift_cache.AssignmentCache; algorithms whose version, options
+            and inputs are unchanged are read from it instead of run.
+
+    Returns:
+        dict: Algorithm -> 0-based line of every fixation.
+    """
+    options = options or {}
+    fixation_XY = np.asarray(fixation_XY, dtype=np.float64)
+    results = {}
+    for name in algorithms:
+        if cache is None:
+            results[name] = ALGORITHMS[name](fixation_XY, line_Y, word_XY, **options.get(name, {}))
+            continue
+        inputs = (fixation_XY, line_Y, word_XY) if name in WORD_ALGORITHMS else (fixation_XY, line_Y)
+        key = cache.key(name, ALGORITHM_VERSIONS[name], options.get(name, {}), inputs)
+        lines = cache.get(key)
+        if lines is None:
+            lines = ALGORITHMS[name](fixation_XY, line_Y, word_XY, **options.get(name, {}))
+            cache.put(key, lines)
+        results[name] = lines.astype(np.int64)
+    return results
+
+
+def wisdom_of_crowds(lines):
+    """
+    Consensus line of every fixation: the line most algorithms gave it.
+
+    Args:
+        lines: n x k array of 0-based lines, one column per algorithm in
+            ALGORITHMS order; negative for missing.
+
+    Returns:
+        numpy.ndarray: The most common line of every row, on a tie the one
+        given by the earliest column (as GazeGenie votes); -1 for rows
+        without lines.
+    """
+    lines = np.asarray(lines, dtype=np.int64)
+    n, k = lines.shape
+    n_lines = max(int(lines.max(initial=-1)) + 1, 1)
+    rows, columns = np.nonzero(lines >= 0)
+    votes = np.zeros((n, n_lines), dtype=np.int64)
+    first = np.full((n, n_lines), k, dtype=np.int64)
+    np.add.at(votes, (rows, lines[rows, columns]), 1)
+    np.minimum.at(first, (rows, lines[rows, columns]), columns)
+    # More votes win; among equal votes, the earliest column
+    consensus = np.argmax(votes * (k + 1) - first, axis=1)
+    return np.where(votes.any(axis=1), consensus, -1)
+
+
+def _correct_group(task):
+    rows, fixation_XY, line_Y, word_XY, algorithms, options, cache = task
+    return rows, correct_trial(fixation_XY, line_Y, word_XY, algorithms, options, cache)
+
+
+def add_wisdom_of_crowds(corrected, algorithms=None, group_by=('subject',)):
+    """
+    Adds GazeGenie's Wisdom_of_Crowds columns: a per-fixation vote over the
+    line_num_<algorithm> columns already in the table, so changing one
+    algorithm only needs its own columns recomputed before voting again.
+
+    Args:
+        corrected: DataFrame with line_num_<algorithm> and y_<algorithm>
+            columns (from correct_drift or GazeGenie), trial_id, y and
+            optionally start.
+        algorithms: Names to vote over, in ALGORITHMS order (default: all
+            with columns in the table).
+        group_by: Columns that, with trial_id, identify one reading of a page.
+
+    Returns:
+        pandas.DataFrame: `corrected` with y_Wisdom_of_Crowds (y of the
+        consensus line), y_Wisdom_of_Crowds_correction (its difference to y),
+        line_num_y_Wisdom_of_Crowds and line_num_Wisdom_of_Crowds (0-based
+        consensus line) and line_change_Wisdom_of_Crowds (lines moved since
+        the previous fixation of the reading).
+    """
+    algorithms = [name for name in algorithms or ALGORITHMS if f'line_num_{name}' in corrected.columns]
+    lines = np.column_stack([corrected[f'line_num_{name}'].to_numpy(np.float64, na_value=np.nan)
+                             for name in algorithms])
+    lines = np.where(np.isnan(lines), -1, lines).astype(np.int64)
+    consensus = wisdom_of_crowds(lines)
+    voted = consensus >= 0
+
+    # The y of the consensus line, from the first algorithm that chose it
+    line_y = np.column_stack([corrected[f'y_{name}'].to_numpy(np.float64, na_value=np.nan) for name in algorithms])
+    winner = np.argmax(lines == consensus[:, None], axis=1)
+    consensus_y = np.where(voted, line_y[np.arange(len(lines)), winner], np.nan)
+
+    # Line changes within every reading, in temporal order
+    keys = [key for key in group_by if key in corrected.columns] + ['trial_id']
+    reading = corrected.groupby(keys, sort=False, observed=True, dropna=False).ngroup().to_numpy()
+    start = corrected['start'].to_numpy() if 'start' in corrected.columns else np.arange(len(corrected))
+    order = np.lexsort((start, reading))
+    change = np.zeros(len(corrected), dtype=np.int64)
+    change[order[1:]] = np.diff(consensus[order])
+    change[order[np.flatnonzero(np.diff(reading[order])) + 1]] = 0
+    previous_voted = np.ones(len(corrected), dtype=bool)
+    previous_voted[order[1:]] = voted[order[:-1]] | (np.diff(reading[order]) != 0)
+
+    line_num = pd.arrays.IntegerArray(np.maximum(consensus, 0), ~voted)
+    columns = {
+        f'y_{CONSENSUS}': consensus_y,
+        f'y_{CONSENSUS}_correction': consensus_y - corrected['y'].to_numpy(np.float64),
+        f'line_num_y_{CONSENSUS}': line_num,
+        f'line_num_{CONSENSUS}': line_num.copy(),
+        f'line_change_{CONSENSUS}': pd.arrays.IntegerArray(change, ~voted | ~previous_voted),
+    }
+    return corrected.assign(**{name: pd.Series(values, index=corrected.index) for name, values in columns.items()})
+
+
+def correct_drift(fixations, areas, algorithms=tuple(ALGORITHMS), workers=1, options=None, group_by=('subject',),
+                  cache=None, consensus=True):
+    """
+    Applies drift-correction algorithms to every trial of every subject.
+
+    Args:
+        fixations: DataFrame like fixation_data.csv (x, y, start, trial_id,
+            subject); fixations are taken in start order within each trial.
+        areas: InterestAreas of the pages, with trial_ids matching the
+            fixations.
+        algorithms: Names from ALGORITHMS.
+        workers: Processes to spread the trials over (1: no pool).
+        options: {algorithm: {parameter: value}} to override thresholds.
+        group_by: Columns that, with trial_id, identify one reading of a page.
+        cache: drift_cache.AssignmentCache to reuse the results of algorithms
+            whose version, options and inputs did not change.
+        consensus: Add the Wisdom_of_Crowds columns (add_wisdom_of_crowds)
+            when more than one algorithm runs.
+
+    Returns:
+        pandas.DataFrame: The fixations with y_<algorithm> (y of the assigned
+        line) and line_num_<algorithm> (0-based) columns; NA for trials
+        without areas.
+    """
+    geometry = page_geometry(areas)
+    keys = [key for key in group_by if key in fixations.columns] + ['trial_id']
+    order = np.argsort(fixations['start'].to_numpy(), kind='stable') if 'start' in fixations.columns \
+        else np.arange(len(fixations))
+    ordered = fixations.iloc[order]
+    XY = ordered[['x', 'y']].to_numpy(np.float64)
+    options = {name: options[name] for name in options or {} if name in algorithms}
+
+    tasks = []
+    for key, rows in ordered.groupby(keys, sort=False, observed=True, dropna=False).indices.items():
+        trial_id = str(key[-1] if isinstance(key, tuple) else key)
+        if trial_id in geometry:
+            line_Y, word_XY = geometry[trial_id]
+            tasks.append((order[rows], XY[rows], line_Y, word_XY, list(algorithms), options, cache))
+
+    lines = {name: np.full(len(fixations), -1, dtype=np.int64) for name in algorithms}
+    line_y = {name: np.full(len(fixations), np.nan) for name in algorithms}
+
+    def collect(results):
+        for (rows, result), task in zip(results, tasks):
+            for name, assigned in result.items():
+                lines[name][rows] = assigned
+                line_y[name][rows] = task[2][assigned]
+
+    if workers == 1:
+        collect(map(_correct_group, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Trials are small: hand them out in batches to amortize the pickling
+            chunksize = max(1, len(tasks) // (4 * (workers or os.cpu_count())))
+            collect(executor.map(_correct_group, tasks, chunksize=chunksize))
+    if cache is not None:
+        cache.evict()
+
+    columns = {}
+    for name in algorithms:
+        columns[f'y_{name}'] = line_y[name]
+        columns[f'line_num_{name}'] = pd.arrays.IntegerArray(np.maximum(lines[name], 0), lines[name] < 0)
+    corrected = fixations.assign(**{name: pd.Series(values, index=fixations.index)
+                                    for name, values in columns.items()})
+    if consensus and len(algorithms) > 1:
+        corrected = add_wisdom_of_crowds(corrected, algorithms, group_by)
+    return corrected
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Correct the vertical drift of fixations with the algorithms of '
+                                                 'Carr et al. (2022) and their Wisdom-of-Crowds consensus.')
+    parser.add_argument('fixations', help='fixation_data.csv-shaped table.')
+    parser.add_argument('areas', nargs='+', help='Interest-area tables or DynamicAOI XML files; the trial_id of a '
+                                                 'file without one is its name.')
+    parser.add_argument('-o', '--output', default='corrected_fixations_data.csv', help='Output table.')
+    parser.add_argument('-a', '--algorithms', nargs='+', choices=list(ALGORITHMS), default=list(ALGORITHMS))
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(), help='Number of worker processes.')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='Folder of the per-trial result cache.')
+    parser.add_argument('--no-cache', action='store_true', help='Run every algorithm, ignoring the cache.')
+    args = parser.parse_args()
+
+    areas = InterestAreas(pd.concat([InterestAreas.read(path).frame for path in args.areas], ignore_index=True))
+    fixations = read_table(args.fixations)
+    cache = None if args.no_cache else AssignmentCache(args.cache_dir)
+    start = time.perf_counter()
+    corrected = correct_drift(fixations, areas, args.algorithms, workers=args.workers, cache=cache)
+    print(f"{len(fixations)} fixations corrected in {time.perf_counter() - start:.2f} s")
+    write_table(corrected, args.output)
+
+
+# Example usage:
+#   python ocr/drift_correction.py "prueba 1920/fixation_data.csv" "prueba 1920/df_word_chars_10.csv" -j 4
+if __name__ == '__main__':
+    main()
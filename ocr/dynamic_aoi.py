@@ -0,0 +1,342 @@
+import argparse
+import csv
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+
+from coordinate_tables import FORMATS, format_value
+from interest_areas import InterestAreas
+
+# Columns of word_df_with_region_info.csv (read_xml_paragraph_file.R)
+REGION_INFO_COLUMNS = ['Name', 'char_xmin', 'char_ymin', 'char_xmax', 'char_ymax', 'width', 'height', 'paragraph',
+                       'section', 'word', 'letter', 'region', 'assigned_line', 'char', 'char_x_center',
+                       'char_y_center', 'trial_id']
+
+# Fields of AOI names such as "__re_p1_s1_w1_c1_r0_l1_H", extracted like
+# str_extract(Name, "p\\d+") and friends in the R script
+NAME_FIELDS = [('paragraph', re.compile(r'p\d+')), ('section', re.compile(r's\d+')), ('word', re.compile(r'w\d+')),
+               ('letter', re.compile(r'c\d+')), ('region', re.compile(r'r\d+')),
+               ('assigned_line', re.compile(r'l\d+'))]
+NAME_STRING = re.compile(r'_([^_]+)$')
+
+# One DynamicAOI element, as ExperimentCenter exports it (see P3_Word coordinates.xml)
+AOI_TEMPLATE = """  <DynamicAOI>
+    <ID>{id}</ID>
+    <ParentID>1</ParentID>
+    <TrackingUsage>None</TrackingUsage>
+    <Group>{group}</Group>
+    <Enabled>{enabled}</Enabled>
+    <Scope>Local</Scope>
+    <Transparency>50</Transparency>
+    <Points>
+      <Point>
+        <X>{x1}</X>
+        <Y>{y1}</Y>
+      </Point>
+      <Point>
+        <X>{x2}</X>
+        <Y>{y2}</Y>
+      </Point>
+    </Points>
+    <BorderWidth>2</BorderWidth>
+    <Type>Rectangle</Type>
+    <Style>Transparent</Style>
+    <HatchStyle>DarkDownwardDiagonal</HatchStyle>
+    <Color>NamedColor:{color}</Color>
+    <Name>{name}</Name>
+    <Font>
+      <FontName>Microsoft Sans Serif</FontName>
+      <FontSize>15</FontSize>
+      <FontStyle>Regular</FontStyle>
+      <FontUnit>Point</FontUnit>
+      <FontGdiCharSet>1</FontGdiCharSet>
+      <FontGdiVerticalFont>false</FontGdiVerticalFont>
+    </Font>
+    <ReferenceStimulusID>0</ReferenceStimulusID>
+    <MovieFrameRate>0</MovieFrameRate>
+    <PlaneGridRows>0</PlaneGridRows>
+    <PlaneGridColumns>0</PlaneGridColumns>
+    <Visible>true</Visible>
+    <CurrentTimestamp>0</CurrentTimestamp>
+    <KeyFrames>
+      <KeyFrame>
+        <Points>
+          <Point>
+            <X>{x1}</X>
+            <Y>{y1}</Y>
+          </Point>
+          <Point>
+            <X>{x2}</X>
+            <Y>{y2}</Y>
+          </Point>
+        </Points>
+        <PinPoints />
+        <Visible>true</Visible>
+        <Timestamp>0</Timestamp>
+        <Angle>0</Angle>
+        <Area>{area}</Area>
+        <ManuallyCreated>true</ManuallyCreated>
+      </KeyFrame>
+    </KeyFrames>
+    <TrackedKeyFrames />
+  </DynamicAOI>
+"""
+XML_HEADER = ('<?xml version="1.0"?>\n<ArrayOfDynamicAOI xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+              'xmlns:xsd="http://www.w3.org/2001/XMLSchema">\n')
+XML_FOOTER = '</ArrayOfDynamicAOI>'
+
+# Enabled flag and color of each AOI group, as in the lab's exports
+AOI_GROUPS = {'Line': ('false', 'Blue'), 'Word': ('true', 'Yellow'), 'Character': ('false', 'Red')}
+
+# Line AOIs are named after their first characters, like the Sentence AOIs of the exports
+LINE_NAME_LENGTH = 10
+
+
+def parse_aoi_name(name):
+    """
+    Splits an AOI name like "__re_p1_s1_w1_c1_r0_l1_H" into its numbered fields
+    and the trailing string, the same way read_xml_paragraph_file.R does.
+
+    Returns:
+        dict: paragraph, section, word, letter, region and assigned_line as
+        strings of digits, and char; a field that is not found is None.
+    """
+    fields = {}
+    for field, pattern in NAME_FIELDS:
+        match = pattern.search(name)
+        fields[field] = re.sub('[a-z]', '', match.group(0), count=1) if match else None
+    match = NAME_STRING.search(name)
+    fields['char'] = match.group(1) if match else None
+    return fields
+
+
+def _number(text):
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+
+def iter_dynamic_aois(xml_path, group='Character'):
+    """
+    Streams the AOIs of an ExperimentCenter DynamicAOI export.
+
+    The file is read with iterparse and every DynamicAOI element is dropped
+    once it has been read, so memory stays flat whatever the file size.
+
+    Args:
+        xml_path: Path to the exported XML.
+        group: Only yield AOIs of this Group (None for all).
+
+    Yields:
+        tuple: (name, x1, y1, x2, y2) from the first and last point of the
+        AOI's outline, as the R script takes them.
+    """
+    context = ET.iterparse(xml_path, events=('start', 'end'))
+    _, root = next(context)
+    for event, element in context:
+        if event != 'end' or element.tag != 'DynamicAOI':
+            continue
+        if group is None or (element.findtext('Group') or '') == group:
+            points = element.findall('Points/Point')
+            if points:
+                yield (element.findtext('Name') or '',
+                       _number(points[0].findtext('X')), _number(points[0].findtext('Y')),
+                       _number(points[-1].findtext('X')), _number(points[-1].findtext('Y')))
+        root.clear()
+
+
+def region_info_rows(xml_path, group='Character', trial_id=1):
+    """
+    Yields the rows of word_df_with_region_info.csv for an AOI export.
+
+    Repeated AOIs (same name and corners) are dropped with a set of the ones
+    already seen, keeping the first, like duplicated() in the R script.
+    """
+    seen = set()
+    for aoi in iter_dynamic_aois(xml_path, group):
+        if aoi in seen:
+            continue
+        seen.add(aoi)
+        name, x1, y1, x2, y2 = aoi
+        fields = parse_aoi_name(name)
+        yield [name, x1, y1, x2, y2, x2 - x1, y2 - y1, fields['paragraph'], fields['section'], fields['word'],
+               fields['letter'], fields['region'], fields['assigned_line'], fields['char'],
+               (x1 + x2) / 2, (y1 + y2) / 2, trial_id]
+
+
+def write_region_info(xml_path, output_csv, group='Character', trial_id=1):
+    """
+    Converts an AOI export into word_df_with_region_info.csv, row by row.
+
+    Cells are written the way readr::write_csv does (whole numbers without a
+    decimal part, NA for missing fields, LF line endings).
+
+    Returns:
+        int: Number of rows written.
+    """
+    n_rows = 0
+    with open(output_csv, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(REGION_INFO_COLUMNS)
+        for row in region_info_rows(xml_path, group, trial_id):
+            writer.writerow(['NA' if value is None else format_value(value) for value in row])
+            n_rows += 1
+    return n_rows
+
+
+def read_region_info(xml_path, group='Character', trial_id=1):
+    """Returns the word_df_with_region_info table of an AOI export as a DataFrame."""
+    df = pd.DataFrame(region_info_rows(xml_path, group, trial_id), columns=REGION_INFO_COLUMNS)
+    for column in ['paragraph', 'section', 'word', 'letter', 'region', 'assigned_line']:
+        df[column] = pd.to_numeric(df[column])
+    return df
+
+
+def _group_boxes(key, names, xmin, ymin, xmax, ymax):
+    """
+    One box around the rows of every value of `key` (integer array), in key
+    order: names[i] is called with the row positions of the i-th group.
+    """
+    order = np.argsort(key, kind='stable')
+    starts = np.flatnonzero(np.concatenate([[True], key[order][1:] != key[order][:-1]]))
+    ends = np.append(starts[1:], len(order))
+    return pd.DataFrame({
+        # Whole pixels that cover the box: ExperimentCenter points are integers
+        'name': [names(order[a:b]) for a, b in zip(starts.tolist(), ends.tolist())],
+        'x1': np.floor(np.minimum.reduceat(xmin[order], starts)).astype(np.int64),
+        'y1': np.floor(np.minimum.reduceat(ymin[order], starts)).astype(np.int64),
+        'x2': np.ceil(np.maximum.reduceat(xmax[order], starts)).astype(np.int64),
+        'y2': np.ceil(np.maximum.reduceat(ymax[order], starts)).astype(np.int64),
+    })
+
+
+def dynamic_aoi_boxes(areas):
+    """
+    Returns the Line, Word and Character AOIs of one page.
+
+    Characters are named like the lab's exports ("__re_p1_s1_w3_c2_r0_l1_u",
+    see InterestAreas.to_frame('dynamic_aoi')), words the same way with c0 and
+    the word as the string, and lines with w0_c0 and their first characters.
+
+    Args:
+        areas: InterestAreas of one page (character level).
+
+    Returns:
+        dict: Group name -> DataFrame with name, x1, y1, x2, y2.
+    """
+    if areas.frame['trial_id'].nunique() > 1:
+        raise ValueError("A DynamicAOI file holds the AOIs of one page; select one trial_id first")
+    df = areas.to_frame('dynamic_aoi')
+    name = df['Name'].tolist()
+    char = df['char'].tolist()
+    paragraph = df['paragraph'].to_numpy()
+    line = df['assigned_line'].to_numpy()
+    word = df['word'].to_numpy()
+    boxes = [df[column].to_numpy(np.float64) for column in ['char_xmin', 'char_ymin', 'char_xmax', 'char_ymax']]
+
+    # Line names hold the line text with its spaces, which the character AOIs do not have
+    line_text = areas.frame.groupby('assigned_line')['char'].agg(''.join).str.strip().to_dict()
+
+    def line_name(rows):
+        text = line_text[line[rows[0]]]
+        if len(text) > LINE_NAME_LENGTH:
+            text = text[:LINE_NAME_LENGTH] + '...'
+        return f'__re_p{paragraph[rows[0]]}_s1_w0_c0_r0_l{line[rows[0]]}_{text}'
+
+    def word_name(rows):
+        return (f'__re_p{paragraph[rows[0]]}_s1_w{word[rows[0]]}_c0_r0_l{line[rows[0]]}_' +
+                ''.join(char[i] for i in rows))
+
+    return {
+        'Line': _group_boxes(line, line_name, *boxes),
+        'Word': _group_boxes(word, word_name, *boxes),
+        'Character': pd.DataFrame({'name': name, 'x1': np.floor(boxes[0]).astype(np.int64),
+                                   'y1': np.floor(boxes[1]).astype(np.int64),
+                                   'x2': np.ceil(boxes[2]).astype(np.int64),
+                                   'y2': np.ceil(boxes[3]).astype(np.int64)}),
+    }
+
+
+def write_dynamic_aoi(areas, xml_path, groups=('Line', 'Word', 'Character'), first_id=1):
+    """
+    Writes the AOIs of one page as an ExperimentCenter DynamicAOI file (the
+    format of P3_Word coordinates.xml), so they can be imported instead of
+    drawn by hand.
+
+    Every AOI is one fill of AOI_TEMPLATE, written as it is formatted; the
+    file reads back with region_info_rows.
+
+    Args:
+        areas: InterestAreas of one page, e.g. InterestAreas.read() of a
+            renderer coordinate table or InterestAreas.from_frame() of the
+            recognize_text output.
+        xml_path: Output file.
+        groups: AOI groups to write, in order (Line, Word and/or Character).
+        first_id: ID of the first AOI; the others follow.
+
+    Returns:
+        int: Number of AOIs written.
+    """
+    aois = dynamic_aoi_boxes(areas)
+    aoi_id = first_id
+    with open(xml_path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(XML_HEADER)
+        for group in groups:
+            enabled, color = AOI_GROUPS[group]
+            boxes = aois[group]
+            for name, x1, y1, x2, y2 in zip(boxes['name'].tolist(), boxes['x1'].tolist(), boxes['y1'].tolist(),
+                                            boxes['x2'].tolist(), boxes['y2'].tolist()):
+                f.write(AOI_TEMPLATE.format(id=aoi_id, group=group, enabled=enabled, color=color, name=escape(name),
+                                            x1=x1, y1=y1, x2=x2, y2=y2, area=(x2 - x1) * (y2 - y1)))
+                aoi_id += 1
+        f.write(XML_FOOTER)
+    return aoi_id - first_id
+
+
+def load_page_areas(path, trial_id=None):
+    """
+    Returns the InterestAreas of a page from a coordinate table (any schema
+    and format) or from a page image (renderer ground truth when there is a
+    valid manifest, OCR otherwise).
+    """
+    if os.path.splitext(path)[1].lower() in FORMATS:
+        return InterestAreas.read(path, trial_id=trial_id)
+    from render_manifest import interest_areas
+    return InterestAreas.from_frame(interest_areas(path), 'word_chars')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Convert between ExperimentCenter DynamicAOI XML and character coordinates. An .xml input is '
+                    'read into word_df_with_region_info.csv; a coordinate table or page image is written as '
+                    'DynamicAOI XML.')
+    parser.add_argument('input', help='DynamicAOI XML file, coordinate table (.csv, .parquet, .feather, .npz) '
+                                      'or page image.')
+    parser.add_argument('-o', '--output', help='Output file (default: word_df_with_region_info.csv for XML input, '
+                                               'the input name with .xml otherwise).')
+    parser.add_argument('--group', default='Character', help='AOI group to extract from XML input.')
+    parser.add_argument('--groups', nargs='+', choices=list(AOI_GROUPS), default=list(AOI_GROUPS),
+                        help='AOI groups to write to XML output.')
+    parser.add_argument('--first-id', type=int, default=1, help='ID of the first AOI written to XML output.')
+    parser.add_argument('--trial-id', default=None, help='Value of the trial_id column (default: 1 for XML input).')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.input.lower().endswith('.xml'):
+        output = args.output or 'word_df_with_region_info.csv'
+        n_rows = write_region_info(args.input, output, args.group, 1 if args.trial_id is None else args.trial_id)
+    else:
+        output = args.output or os.path.splitext(args.input)[0] + '.xml'
+        n_rows = write_dynamic_aoi(load_page_areas(args.input, args.trial_id), output, args.groups, args.first_id)
+    print(f"{n_rows} AOIs saved to {output} in {time.perf_counter() - start:.2f} s")
+
+
+# Example usage:
+#   python ocr/dynamic_aoi.py "P3_Word coordinates.xml" -o word_df_with_region_info.csv
+#   python ocr/dynamic_aoi.py new_stimuli/output/10.csv -o "10_Word coordinates.xml"
+if __name__ == '__main__':
+    main()
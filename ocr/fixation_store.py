@@ -0,0 +1,275 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from coordinate_tables import read_table, table_format, write_table
+
+# Partition keys, in directory order, and the value stored for a missing key
+PARTITION_KEYS = ['trial_id', 'subject']
+MISSING_KEY = 'NA'
+
+# Leading underscore: pyarrow.dataset skips the file
+INDEX_FILE = '_index.json'
+CHUNK_ROWS = 200_000
+# Rows build keeps in memory before it spills them, partition by partition, to temporary npz files
+SPILL_ROWS = 2_000_000
+
+
+def _key_values(column):
+    """Partition keys as strings ("10", "NRC2905_04"); missing values become MISSING_KEY."""
+    values = column.astype(object).where(column.notna(), MISSING_KEY)
+    return values.map(lambda value: str(int(value)) if isinstance(value, float) and value.is_integer()
+                      else str(value))
+
+
+def _as_list(values):
+    if values is None:
+        return None
+    if isinstance(values, (str, int, float, np.integer)):
+        values = [values]
+    return {str(value) for value in values}
+
+
+def _read_source(source):
+    """Yields fixation_data.csv-shaped chunks of a DataFrame or table file."""
+    if isinstance(source, pd.DataFrame):
+        yield source
+    elif table_format(source) == 'csv':
+        with pd.read_csv(source, dtype={key: str for key in PARTITION_KEYS}, keep_default_na=False,
+                         na_values=['', 'NA'], chunksize=CHUNK_ROWS, encoding='utf-8') as reader:
+            yield from reader
+    else:
+        yield read_table(source)
+
+
+class FixationStore:
+    """
+    Fixations on disk, partitioned by trial_id and subject.
+
+    Every (trial_id, subject) pair is one table - <root>/trial_id=<t>/subject=<s>/
+    fixations.<format>, written by coordinate_tables.write_table - sorted by
+    start, without the key columns. _index.json lists the partitions with
+    their row counts and time span, so a query reads only the partitions that
+    match its subjects, trials and time window, and within a partition only
+    the rows of the window. With the default npz format partitions are
+    memory-mapped; Parquet partitions can also be read by pyarrow.dataset
+    with hive partitioning.
+    """
+
+    def __init__(self, root):
+        """
+        Args:
+            root: Store directory (created by build).
+        """
+        self.root = root
+        with open(os.path.join(root, INDEX_FILE), encoding='utf-8') as f:
+            index = json.load(f)
+        self.format = index['format']
+        self.columns = index['columns']
+        self.index = pd.DataFrame(index['partitions'],
+                                  columns=PARTITION_KEYS + ['path', 'n_rows', 'start_min', 'stop_max'])
+
+    @classmethod
+    def build(cls, root, sources, fmt='npz'):
+        """
+        Writes fixations into a store, replacing the partitions they cover and
+        keeping the others, so subjects or pages can be added one at a time.
+        CSV sources are read in chunks and rows beyond SPILL_ROWS wait in
+        temporary files under root, so memory holds about SPILL_ROWS rows
+        plus the partition being sorted.
+
+        Args:
+            root: Store directory.
+            sources: DataFrames or table files (CSV, Parquet, Feather, npz)
+                with the fixation_data.csv columns (x, y, start, stop, subject,
+                trial_id, and any others).
+            fmt: Partition format: 'npz', 'parquet' or 'feather'.
+
+        Returns:
+            FixationStore
+        """
+        os.makedirs(root, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix='_build-', dir=root) as spill_dir:
+            parts, spills, n_spills, columns = cls._split(sources, spill_dir)
+
+            index_path = os.path.join(root, INDEX_FILE)
+            partitions = {}
+            if os.path.exists(index_path):
+                with open(index_path, encoding='utf-8') as f:
+                    index = json.load(f)
+                if index['format'] != fmt or (columns is not None and index['columns'] != columns):
+                    raise ValueError(f"{root} holds {index['format']} partitions with columns {index['columns']}; "
+                                     f"build a new store for other formats or columns")
+                columns = index['columns']
+                partitions = {tuple(entry[key] for key in PARTITION_KEYS): entry for entry in index['partitions']}
+
+            partitions.update(cls._merge(root, fmt, parts, spills, spill_dir, n_spills))
+
+        with open(index_path, 'w', encoding='utf-8') as f:
+            json.dump({'format': fmt, 'columns': columns,
+                       'partitions': [partitions[key] for key in sorted(partitions)]}, f, indent=1)
+        return cls(root)
+
+    @staticmethod
+    def _split(sources, spill_dir):
+        """
+        Reads the sources chunk by chunk and splits the rows by partition.
+        Once more than SPILL_ROWS rows are held, they are written, partition
+        after partition, to the next npz file in spill_dir (0.npz, 1.npz, ...)
+        and dropped from memory.
+
+        Returns:
+            tuple: ({key: [DataFrame]} still in memory, {key: [(spill file
+            number, first row, end row)]} in spill order, number of spill
+            files, value columns or None if there were no rows).
+        """
+        parts, spills, columns = {}, {}, None
+        held = n_spills = 0
+        for source in sources:
+            for chunk in _read_source(source):
+                keys = pd.DataFrame({key: _key_values(chunk[key]) for key in PARTITION_KEYS})
+                values = chunk.drop(columns=PARTITION_KEYS)
+                columns = columns or list(values.columns)
+                for key, rows in values.groupby([keys[key] for key in PARTITION_KEYS], sort=False):
+                    parts.setdefault(key, []).append(rows)
+                held += len(chunk)
+                if held > SPILL_ROWS:
+                    frames, end = [], 0
+                    for key, rows in parts.items():
+                        frames.extend(rows)
+                        begin, end = end, end + sum(len(df) for df in rows)
+                        spills.setdefault(key, []).append((n_spills, begin, end))
+                    write_table(pd.concat(frames, ignore_index=True), os.path.join(spill_dir, f'{n_spills}.npz'))
+                    parts, held, n_spills = {}, 0, n_spills + 1
+        return parts, spills, n_spills, columns
+
+    @staticmethod
+    def _merge(root, fmt, parts, spills, spill_dir, n_spills):
+        """
+        Writes every partition of _split sorted by start and returns their
+        index entries. The spill files are memory-mapped, and closed again on
+        return.
+        """
+        spilled = [read_table(os.path.join(spill_dir, f'{n}.npz')) for n in range(n_spills)]
+        partitions = {}
+        # Spilled rows come first: they were read before the rows still in memory
+        for key in dict.fromkeys([*spills, *parts]):
+            frames = [spilled[n].iloc[begin:end] for n, begin, end in spills.get(key, [])]
+            df = pd.concat(frames + parts.pop(key, []), ignore_index=True)
+            df = df.iloc[np.argsort(df['start'].to_numpy(), kind='stable')].reset_index(drop=True)
+            path = os.path.join(*(f'{name}={quote(value, safe="")}' for name, value in zip(PARTITION_KEYS, key)),
+                                f'fixations.{fmt}')
+            os.makedirs(os.path.join(root, os.path.dirname(path)), exist_ok=True)
+            write_table(df, os.path.join(root, path))
+            partitions[key] = dict(zip(PARTITION_KEYS, key), path=path.replace(os.sep, '/'), n_rows=len(df),
+                                   start_min=float(df['start'].min()), stop_max=float(df['stop'].max()))
+        return partitions
+
+    def partitions(self, subject=None, trial_id=None, start=None, stop=None):
+        """
+        Returns the index rows of the partitions a query has to read.
+
+        Args:
+            subject: A subject or list of subjects (default: all).
+            trial_id: A trial_id or list of trial_ids (default: all).
+            start, stop: Time window in ms; partitions without a fixation that
+                overlaps it are skipped.
+        """
+        index = self.index
+        keep = np.ones(len(index), dtype=bool)
+        for name, values in (('subject', _as_list(subject)), ('trial_id', _as_list(trial_id))):
+            if values is not None:
+                keep &= index[name].isin(values).to_numpy()
+        if start is not None:
+            keep &= (index['stop_max'] >= start).to_numpy()
+        if stop is not None:
+            keep &= (index['start_min'] <= stop).to_numpy()
+        return index[keep]
+
+    def read(self, subject=None, trial_id=None, start=None, stop=None, columns=None):
+        """
+        Returns the fixations that match a query.
+
+        A fixation is in the window [start, stop] if it overlaps it. Only the
+        matching partitions are opened, and the window is found in each with
+        a binary search on the sorted start times.
+
+        Args:
+            subject, trial_id, start, stop: See partitions.
+            columns: Columns to return besides subject and trial_id (default:
+                all).
+
+        Returns:
+            pandas.DataFrame: The fixations, by trial_id, subject and start,
+            in the fixation_data.csv column order with subject and trial_id as
+            categoricals.
+        """
+        columns = list(columns or self.columns)
+        read_columns = list(dict.fromkeys(columns + [name for name, bound in (('start', stop), ('stop', start))
+                                                     if bound is not None]))
+        frames, keys = [], []
+        for entry in self.partitions(subject, trial_id, start, stop).itertuples(index=False):
+            df = read_table(os.path.join(self.root, entry.path), columns=read_columns)
+            if stop is not None:
+                df = df.iloc[:np.searchsorted(df['start'].to_numpy(), stop, side='right')]
+            if start is not None:
+                df = df[df['stop'].to_numpy() >= start]
+            frames.append(df[columns])
+            keys.append((entry.trial_id, entry.subject, len(df)))
+
+        if not frames:
+            return pd.DataFrame(columns=columns + ['subject', 'trial_id'])
+        df = pd.concat(frames, ignore_index=True)
+        counts = [n for _, _, n in keys]
+        for name in ['subject', 'trial_id']:
+            values = [key[PARTITION_KEYS.index(name)] for key in keys]
+            categories = sorted(set(values))
+            codes = np.repeat([categories.index(value) for value in values], counts)
+            df[name] = pd.Categorical.from_codes(codes, categories=categories)
+        return df
+
+    def __len__(self):
+        return int(self.index['n_rows'].sum())
+
+    def __repr__(self):
+        return (f"FixationStore({self.root!r}, {len(self)} fixations, {self.index['subject'].nunique()} subjects, "
+                f"{self.index['trial_id'].nunique()} trials)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or query a fixation store partitioned by trial and subject.')
+    parser.add_argument('store', help='Store directory.')
+    parser.add_argument('inputs', nargs='*', help='fixation_data.csv-shaped tables to add to the store.')
+    parser.add_argument('--format', choices=['npz', 'parquet', 'feather'], default='npz',
+                        help='Partition format when building.')
+    parser.add_argument('--subject', nargs='+', help='Subjects to read.')
+    parser.add_argument('--trial-id', nargs='+', help='trial_ids to read.')
+    parser.add_argument('--start', type=float, help='Start of the time window in ms.')
+    parser.add_argument('--stop', type=float, help='End of the time window in ms.')
+    parser.add_argument('-o', '--output', help='Write the fixations that match the query to this table.')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.inputs:
+        store = FixationStore.build(args.store, args.inputs, args.format)
+        print(f"Built {store} in {time.perf_counter() - start:.2f} s")
+    else:
+        store = FixationStore(args.store)
+    if args.output:
+        start = time.perf_counter()
+        df = store.read(args.subject, args.trial_id, args.start, args.stop)
+        write_table(df, args.output)
+        print(f"{len(df)} fixations saved to {args.output} in {time.perf_counter() - start:.3f} s")
+
+
+# Example usage:
+#   python ocr/fixation_store.py eri_new/fixations eri_new/fixation_data.csv
+#   python ocr/fixation_store.py eri_new/fixations --trial-id page30 --subject NRC2905_04 -o page30.csv
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from coordinate_tables import read_table, write_table
+
+# The canonical columns are those of df_word_chars (create_interest_areas_from_image2.py)
+CANONICAL_DTYPES = {
+    'char': str, 'char_xmin': np.float64, 'char_ymin': np.float64, 'char_xmax': np.float64,
+    'char_ymax': np.float64, 'block': np.int32, 'paragraph': np.int32, 'line_number': np.int32,
+    'word_nr': np.int32, 'letter_nr': np.int32, 'word': str, 'char_x_center': np.float64,
+    'char_y_center': np.float64, 'assigned_line': np.int32, 'trial_id': str,
+}
+CANONICAL_COLUMNS = list(CANONICAL_DTYPES)
+
+# Column names of the other schemas in the project
+RENDER_COLUMNS = ['Character', 'X_Start', 'Y_Start', 'X_End', 'Y_End', 'Line_Number', 'Word_Number',
+                  'Char_Number_in_Word', 'X_Center', 'Y_Center']
+LEGACY_OCR_COLUMNS = ['Character', 'X_Start', 'Y_Start', 'X_End', 'Y_End', 'Block_Number', 'Paragraph_Number',
+                      'Line_Number', 'Word_Number', 'Char_Number_in_Word', 'Word', 'X_Center', 'Y_Center',
+                      'assigned_line', 'trial_id']
+DYNAMIC_AOI_COLUMNS = ['Name', 'char_xmin', 'char_ymin', 'char_xmax', 'char_ymax', 'width', 'height', 'paragraph',
+                       'section', 'word', 'letter', 'region', 'assigned_line', 'char', 'char_x_center',
+                       'char_y_center', 'trial_id']
+BOX_COLUMNS = ['char', 'char_x_center', 'char_y_center', 'char_xmax', 'char_xmin', 'char_ymax', 'char_ymin',
+               'trial_id', 'assigned_line']
+
+# Renderer columns the canonical schema cannot hold as they are: the top, bottom and
+# centre of every glyph (canonical rows get those of their line and box), Line_Number
+# 0 of the title and subtitle, the page-wide word numbers with their gaps and the
+# letter numbers of the title. Pages read from the renderer keep them in these
+# extra columns of the frame, and to_frame('render') writes them back unchanged.
+RENDER_KEPT_COLUMNS = {'Y_Start': 'render_y_start', 'Y_End': 'render_y_end', 'Line_Number': 'render_line_number',
+                       'Word_Number': 'render_word_number', 'Char_Number_in_Word': 'render_char_number',
+                       'X_Center': 'render_x_center', 'Y_Center': 'render_y_center'}
+
+# Legacy OCR columns that are plain renames of canonical columns
+LEGACY_OCR_RENAMES = {'Character': 'char', 'X_Start': 'char_xmin', 'Y_Start': 'char_ymin', 'X_End': 'char_xmax',
+                      'Y_End': 'char_ymax', 'Block_Number': 'block', 'Paragraph_Number': 'paragraph',
+                      'Line_Number': 'line_number', 'Word_Number': 'word_nr', 'Char_Number_in_Word': 'letter_nr',
+                      'Word': 'word', 'X_Center': 'char_x_center', 'Y_Center': 'char_y_center'}
+
+
+def _group_starts(keys):
+    """True at the first row of every run of equal keys (rows must be ordered)."""
+    starts = np.zeros(len(keys[0]), dtype=bool)
+    starts[:1] = True
+    for key in keys:
+        starts[1:] |= key[1:] != key[:-1]
+    return starts
+
+
+def _count_within(starts, line_start):
+    """Running count of `starts`, restarted at every line start (ordered rows)."""
+    count = np.cumsum(starts)
+    return count - np.maximum.accumulate(np.where(line_start, count - starts, 0))
+
+
+def _words_in_lines(chars, lines):
+    """
+    Numbers the words of character rows in reading order: words are runs of
+    non-space characters, numbered from 1 within their line, and a space
+    belongs to the word before it. Returns (word_nr, letter_nr).
+    """
+    is_space = chars == ' '
+    line_start = _group_starts([lines])
+    previous_space = np.concatenate([[True], is_space[:-1]])
+    word_nr = _count_within(~is_space & (previous_space | line_start), line_start)
+
+    group_start = _group_starts([lines, word_nr])
+    positions = np.arange(len(chars))
+    letter_nr = positions - np.maximum.accumulate(np.where(group_start, positions, 0))
+    return word_nr, letter_nr
+
+
+def assign_lines(df_word_chars, update_y_center=False):
+    """
+    Numbers the text lines of a page and gives every character its line's height.
+
+    assigned_line counts the (block, paragraph, line_number) groups in sorted
+    order starting at 1; char_ymin/char_ymax of every character are set to the
+    minimum top and maximum bottom of its line. Works in place.
+
+    Args:
+        df_word_chars: Character-level DataFrame (build_word_chars in create_interest_areas_from_image2.py).
+        update_y_center: Also set char_y_center to the middle of the line.
+
+    Returns:
+        pandas.DataFrame: The same DataFrame.
+    """
+    df_word_chars['assigned_line'] = df_word_chars.groupby(['block', 'paragraph', 'line_number'], sort=True).ngroup() + 1
+
+    by_line = df_word_chars.groupby('assigned_line')
+    df_word_chars['char_ymin'] = by_line['char_ymin'].transform('min')
+    df_word_chars['char_ymax'] = by_line['char_ymax'].transform('max')
+    if update_y_center:
+        df_word_chars['char_y_center'] = (df_word_chars['char_ymin'] + df_word_chars['char_ymax']) / 2
+    return df_word_chars
+
+
+def _word_text(df, keys):
+    """Text of the word each row belongs to (its non-space characters joined)."""
+    if not len(df):
+        return pd.Series('', index=df.index, dtype=str)
+    group = df.groupby(keys, sort=False).ngroup().to_numpy()
+    order = np.argsort(group, kind='stable')
+    chars = df['char'].to_numpy(dtype=object)[order]
+    # One string concatenation per group over the characters laid out group by group
+    words = np.add.reduceat(chars, np.flatnonzero(_group_starts([group[order]])))
+    return pd.Series(pd.Series(words, dtype=str).str.strip().to_numpy()[group], index=df.index)
+
+
+def _global_word_numbers(df):
+    """Words numbered from 1 over each page, in line and word order."""
+    group = df.groupby(['trial_id', 'assigned_line', 'word_nr']).ngroup()
+    return (group - group.groupby(df['trial_id']).transform('min') + 1).to_numpy()
+
+
+def _from_render(df, trial_id):
+    chars = df['Character'].astype(str).to_numpy()
+    # Title and subtitle share Line_Number 0, so those are told apart by their y position
+    line_number = df['Line_Number'].to_numpy()
+    y_start = np.where(line_number == 0, df['Y_Start'].to_numpy(), 0)
+    line = np.unique(np.stack([line_number, y_start], axis=1), axis=0, return_inverse=True)[1].ravel() + 1
+    word_nr, letter_nr = _words_in_lines(chars, line)
+    out = pd.DataFrame({
+        'char': chars,
+        'char_xmin': df['X_Start'].to_numpy(dtype=float),
+        'char_ymin': df['Y_Start'].to_numpy(dtype=float),
+        'char_xmax': df['X_End'].to_numpy(dtype=float),
+        'char_ymax': df['Y_End'].to_numpy(dtype=float),
+        'block': 1,
+        'paragraph': 1,
+        'line_number': line,
+        'word_nr': word_nr,
+        'letter_nr': letter_nr,
+    })
+    out['word'] = _word_text(out, ['line_number', 'word_nr'])
+    out['char_x_center'] = (out['char_xmin'] + out['char_xmax']) / 2
+    out['char_y_center'] = 0.0
+    out['assigned_line'] = 0
+    out['trial_id'] = trial_id
+    out = assign_lines(out[CANONICAL_COLUMNS], update_y_center=True)
+    return out.assign(**{kept: df[column].to_numpy() for column, kept in RENDER_KEPT_COLUMNS.items()})
+
+
+def _kept(df, column, derived):
+    """The renderer's own values of a column where the frame kept them, else the derived ones."""
+    if column not in df.columns:
+        return derived
+    return df[column].where(df[column].notna(), derived)
+
+
+def _to_render(df):
+    is_space = df['char'].to_numpy() == ' '
+    return pd.DataFrame({
+        'Character': df['char'],
+        'X_Start': df['char_xmin'],
+        'Y_Start': _kept(df, 'render_y_start', df['char_ymin']),
+        'X_End': df['char_xmax'],
+        'Y_End': _kept(df, 'render_y_end', df['char_ymax']),
+        'Line_Number': _kept(df, 'render_line_number', df['assigned_line']),
+        'Word_Number': _kept(df, 'render_word_number', _global_word_numbers(df)),
+        'Char_Number_in_Word': _kept(df, 'render_char_number', np.where(is_space, 0, df['letter_nr'].to_numpy() + 1)),
+        'X_Center': _kept(df, 'render_x_center', df['char_x_center']),
+        'Y_Center': _kept(df, 'render_y_center', df['char_y_center']),
+    })
+
+
+def _from_legacy_ocr(df, trial_id):
+    out = df.rename(columns=LEGACY_OCR_RENAMES)
+    if out['assigned_line'].isna().any():
+        out['assigned_line'] = out.groupby(['block', 'paragraph', 'line_number']).ngroup() + 1
+    return out
+
+
+def _to_legacy_ocr(df):
+    return df.rename(columns={v: k for k, v in LEGACY_OCR_RENAMES.items()})[LEGACY_OCR_COLUMNS]
+
+
+def _from_dynamic_aoi(df, trial_id):
+    out = df.drop(columns=['Name', 'width', 'height', 'section', 'region', 'word', 'letter'])
+    out['char'] = df['char'].astype(str)
+    out['block'] = 1
+    out['line_number'] = df['assigned_line']
+    # The exports have no spaces and often the same w number for every
+    # character, so a word starts wherever the letter count restarts
+    trial, line = df['trial_id'].to_numpy(), df['assigned_line'].to_numpy()
+    line_start = _group_starts([trial, line])
+    word_start = _group_starts([trial, line, df['word'].to_numpy()]) | (df['letter'].to_numpy() == 1)
+    out['word_nr'] = _count_within(word_start, line_start)
+    out['letter_nr'] = df['letter'] - 1
+    out['word'] = _word_text(out, ['trial_id', 'assigned_line', 'word_nr'])
+    return out
+
+
+def _to_dynamic_aoi(df):
+    # DynamicAOI tables hold the characters only
+    df = df[df['char'] != ' ']
+    word = _global_word_numbers(df)
+    letter = df['letter_nr'].to_numpy() + 1
+    names = ('__re_p' + df['paragraph'].astype(str) + '_s1_w' + pd.Series(word, index=df.index).astype(str) +
+             '_c' + pd.Series(letter, index=df.index).astype(str) + '_r0_l' + df['assigned_line'].astype(str) +
+             '_' + df['char'].astype(str))
+    return pd.DataFrame({
+        'Name': names,
+        'char_xmin': df['char_xmin'],
+        'char_ymin': df['char_ymin'],
+        'char_xmax': df['char_xmax'],
+        'char_ymax': df['char_ymax'],
+        'width': df['char_xmax'] - df['char_xmin'],
+        'height': df['char_ymax'] - df['char_ymin'],
+        'paragraph': df['paragraph'],
+        'section': 1,
+        'word': word,
+        'letter': letter,
+        'region': 0,
+        'assigned_line': df['assigned_line'],
+        'char': df['char'],
+        'char_x_center': df['char_x_center'],
+        'char_y_center': df['char_y_center'],
+        'trial_id': df['trial_id'],
+    })
+
+
+def _is_word_level(df):
+    return bool((df['char'].astype(str).str.len() > 1).any())
+
+
+def _from_boxes(df, trial_id):
+    out = df.assign(char=df['char'].astype(str), block=1, paragraph=1, line_number=df['assigned_line'])
+    if _is_word_level(out):
+        # Word boxes (ocr/create_coord.py): char holds the whole word
+        out = out.sort_values(['trial_id', 'assigned_line', 'char_xmin'], kind='stable')
+        return out.assign(word_nr=out.groupby(['trial_id', 'assigned_line']).cumcount() + 1,
+                          letter_nr=0, word=out['char'])
+    # Character boxes with the same columns, in reading order
+    lines = out.groupby(['trial_id', 'assigned_line'], sort=False).ngroup().to_numpy()
+    word_nr, letter_nr = _words_in_lines(out['char'].to_numpy(), lines)
+    out = out.assign(word_nr=word_nr, letter_nr=letter_nr)
+    return out.assign(word=_word_text(out, ['trial_id', 'assigned_line', 'word_nr']))
+
+
+def _to_boxes(df):
+    # Character boxes; use InterestAreas.words() first for word boxes
+    return df[BOX_COLUMNS]
+
+
+# name: (columns that identify the schema, to canonical, from canonical)
+SCHEMAS = {
+    'word_chars': (CANONICAL_COLUMNS, None, None),
+    'legacy_ocr': (LEGACY_OCR_COLUMNS, _from_legacy_ocr, _to_legacy_ocr),
+    'render': (RENDER_COLUMNS, _from_render, _to_render),
+    'dynamic_aoi': (DYNAMIC_AOI_COLUMNS, _from_dynamic_aoi, _to_dynamic_aoi),
+    'boxes': (BOX_COLUMNS, _from_boxes, _to_boxes),
+}
+
+
+def detect_schema(columns):
+    """
+    Returns the name of the schema in SCHEMAS whose columns are all present,
+    preferring the schema with the most columns.
+    """
+    columns = set(columns)
+    matches = [name for name, (required, _, _) in SCHEMAS.items() if set(required) <= columns]
+    if not matches:
+        raise ValueError(f"Columns {sorted(columns)} do not match any interest-area schema")
+    return max(matches, key=lambda name: len(SCHEMAS[name][0]))
+
+
+class InterestAreas:
+    """
+    Character (or word) interest areas of one or more pages in one typed,
+    columnar schema.
+
+    The schema is that of df_word_chars. Tables in the other schemas of the
+    project - the renderer CSV, the old create_interest_areas_from_image.py
+    output, the DynamicAOI table of read_xml_paragraph_file.R and the word
+    (or character) boxes of ocr/create_coord.py - are converted on the way in and out with
+    whole-column operations. Converting a table that is already in the
+    canonical schema renames nothing and copies no columns. Renderer pages
+    also keep the renderer's values that the canonical columns cannot hold
+    (RENDER_KEPT_COLUMNS), so they are written back to the renderer schema
+    unchanged. The other schemas come back with the same boxes, but word
+    boxes in line and x order and DynamicAOI Names with the words numbered
+    over the page.
+    """
+
+    def __init__(self, frame, level='char'):
+        """
+        Args:
+            frame: DataFrame with CANONICAL_COLUMNS (and any RENDER_KEPT_COLUMNS).
+            level: 'char' for character areas, 'word' for word areas.
+        """
+        kept = [column for column in RENDER_KEPT_COLUMNS.values() if column in frame.columns]
+        self.frame = frame[CANONICAL_COLUMNS + kept].astype(CANONICAL_DTYPES, copy=False)
+        self.level = level
+
+    @classmethod
+    def from_frame(cls, df, schema=None, trial_id=None):
+        """
+        Builds InterestAreas from a DataFrame in any of the known schemas.
+
+        Args:
+            df: The table.
+            schema: Name of its schema in SCHEMAS (default: detected).
+            trial_id: trial_id for schemas without one (the renderer CSV).
+        """
+        schema = schema or detect_schema(df.columns)
+        convert = SCHEMAS[schema][1]
+        if convert is not None:
+            df = convert(df, trial_id)
+        if 'trial_id' not in df.columns:
+            df = df.assign(trial_id=trial_id)
+        return cls(df, level='word' if schema == 'boxes' and _is_word_level(df) else 'char')
+
+    @classmethod
+    def read(cls, path, schema=None, trial_id=None):
+        """
+        Reads a table written in any known schema and format (see
+        coordinate_tables.read_table), or the character AOIs of an
+        ExperimentCenter DynamicAOI export (.xml). trial_id defaults to the
+        file name.
+        """
+        if trial_id is None:
+            trial_id = os.path.splitext(os.path.basename(path))[0]
+        if os.path.splitext(path)[1].lower() == '.xml':
+            from dynamic_aoi import read_region_info
+            return cls.from_frame(read_region_info(path, trial_id=trial_id), 'dynamic_aoi', trial_id)
+        return cls.from_frame(read_table(path), schema, trial_id)
+
+    def to_frame(self, schema='word_chars'):
+        """Returns the interest areas as a DataFrame in the given schema."""
+        convert = SCHEMAS[schema][2]
+        return self.frame[CANONICAL_COLUMNS] if convert is None else convert(self.frame)
+
+    def write(self, path, schema='word_chars'):
+        """Writes the interest areas in the given schema; the extension chooses the format."""
+        write_table(self.to_frame(schema), path)
+
+    def words(self):
+        """
+        Returns word interest areas: one box around the non-space characters of
+        each word, with char and word holding the word's text.
+        """
+        if self.level == 'word':
+            return self
+        df = self.frame[self.frame['char'] != ' ']
+        keys = ['trial_id', 'block', 'paragraph', 'line_number', 'word_nr']
+        words = df.groupby(keys, sort=False).agg(
+            char_xmin=('char_xmin', 'min'), char_ymin=('char_ymin', 'min'), char_xmax=('char_xmax', 'max'),
+            char_ymax=('char_ymax', 'max'), word=('word', 'first'), assigned_line=('assigned_line', 'first'),
+        ).reset_index()
+        words['char'] = words['word']
+        words['letter_nr'] = 0
+        words['char_x_center'] = (words['char_xmin'] + words['char_xmax']) / 2
+        words['char_y_center'] = (words['char_ymin'] + words['char_ymax']) / 2
+        return InterestAreas(words, level='word')
+
+    def __len__(self):
+        return len(self.frame)
+
+    def __repr__(self):
+        return (f"InterestAreas({len(self)} {self.level} areas, "
+                f"{self.frame['trial_id'].nunique()} trials, {self.frame['assigned_line'].nunique()} lines)")
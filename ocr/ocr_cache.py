@@ -0,0 +1,122 @@
+import functools
+import hashlib
+import itertools
+import os
+import shutil
+import tempfile
+
+import pytesseract
+
+from disk_cache import TEMP_SUFFIX, DiskCache
+
+DEFAULT_CACHE_DIR = os.environ.get('OCR_CACHE_DIR',
+                                   os.path.join(os.path.expanduser('~'), '.cache', 'eri_reading_data', 'ocr'))
+DEFAULT_MAX_BYTES = 1024 ** 3  # 1 GB
+# put evicts once every this many stores of a process; batch runs also evict once at the end
+EVICT_EVERY = 200
+
+_puts = itertools.count(1)
+
+
+@functools.lru_cache(maxsize=None)
+def tesseract_version():
+    """Returns the installed Tesseract version as a string (queried once per process)."""
+    return str(pytesseract.get_tesseract_version())
+
+
+class OcrCache(DiskCache):
+    """
+    On-disk cache of raw Tesseract outputs, keyed by content.
+
+    The key is a SHA-256 over the image file bytes, the Tesseract configuration
+    string, the Tesseract version and the kind of output requested, so editing
+    the page, the config or upgrading Tesseract all miss the cache. Each entry
+    is a folder holding the raw outputs as text files (e.g. the image_to_data
+    TSV and the image_to_boxes output). Reads refresh the entry's timestamp and
+    the least recently used entries are deleted by evict (every EVICT_EVERY
+    puts, and at the end of batch_ocr runs) once the cache grows beyond
+    `max_bytes`.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Args:
+            directory: Folder holding the cache (default: $OCR_CACHE_DIR or
+                ~/.cache/eri_reading_data/ocr).
+            max_bytes: Size limit of the cache in bytes.
+        """
+        super().__init__(directory, max_bytes)
+
+    def key(self, image_bytes, tesseract_config, kind):
+        digest = hashlib.sha256()
+        for part in (image_bytes, tesseract_config.encode('utf-8'),
+                     tesseract_version().encode('utf-8'), kind.encode('utf-8')):
+            digest.update(hashlib.sha256(part).digest())
+        return digest.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """
+        Returns the cached outputs for `key` as a {name: text} dict, or None.
+        """
+        entry = self._entry(key)
+        try:
+            outputs = {}
+            for name in os.listdir(entry):
+                with open(os.path.join(entry, name), encoding='utf-8') as f:
+                    outputs[name] = f.read()
+            os.utime(entry)
+        except FileNotFoundError:
+            return None
+        return outputs
+
+    def put(self, key, outputs):
+        """
+        Stores a {name: text} dict of outputs under `key`, evicting old entries
+        every EVICT_EVERY puts of the process.
+        """
+        entry = self._entry(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        # Write to a temporary folder and rename it so parallel workers never
+        # see half-written entries
+        tmp = tempfile.mkdtemp(dir=os.path.dirname(entry), suffix=TEMP_SUFFIX)
+        for name, text in outputs.items():
+            with open(os.path.join(tmp, name), 'w', encoding='utf-8') as f:
+                f.write(text)
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            # Another process stored the same entry first
+            shutil.rmtree(tmp, ignore_errors=True)
+        if next(_puts) % EVICT_EVERY == 0:
+            self.evict()
+
+
+def cached_tesseract(image_path, tesseract_config, kind, run, use_cache=True, cache=None):
+    """
+    Returns the raw Tesseract outputs for a page, running Tesseract only on a miss.
+
+    Args:
+        image_path: Path to the page image (its bytes are part of the key).
+        tesseract_config: Configuration string passed to Tesseract.
+        kind: Name of the kind of output requested (e.g. 'data+boxes' or 'hocr').
+        run: Function without arguments that runs Tesseract and returns a
+            {name: text} dict of outputs.
+        use_cache: Set to False to bypass the cache and always call `run`.
+        cache: OcrCache to use (default: OcrCache()).
+
+    Returns:
+        dict: {name: text} outputs.
+    """
+    if not use_cache:
+        return run()
+    cache = cache or OcrCache()
+    with open(image_path, 'rb') as f:
+        key = cache.key(f.read(), tesseract_config, kind)
+    outputs = cache.get(key)
+    if outputs is None:
+        outputs = run()
+        cache.put(key, outputs)
+    return outputs
@@ -0,0 +1,239 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageColor
+
+from coordinate_tables import FORMATS, read_table
+from interest_areas import InterestAreas
+from pages import find_page_images, page_number
+
+# QA overlays of interest areas and fixations on page images. The outlines of
+# all boxes of a layer are rasterized at once: every edge becomes a run of flat
+# pixel indices (np.repeat plus a running offset), so drawing a page costs time
+# proportional to the outline pixels, not one Python call per glyph. One-pixel
+# outlines of boxes on the page match those of PIL's ImageDraw.rectangle.
+
+# Default color of every layer (PIL color names); other layers take PALETTE colors in turn
+LAYER_COLORS = {'ocr': 'purple', 'renderer': 'green', 'fixations': 'red'}
+PALETTE = ['blue', 'orange', 'cyan', 'magenta', 'brown']
+
+# Extensions of the interest-area tables looked up next to each page
+AREA_EXTENSIONS = [*FORMATS, '.xml']
+
+
+def _segment_pixels(shape, fixed, start, end, axis):
+    """
+    Flat indices of the pixels of segments at position fixed[i] (a row if axis
+    is 1, a column if 0) from start[i] to end[i] inclusive, clipped to the image.
+    """
+    height, width = shape
+    length, across = (width, height) if axis == 1 else (height, width)
+    keep = (fixed >= 0) & (fixed < across) & (end >= 0) & (start < length) & (start <= end)
+    fixed, start, end = fixed[keep], np.maximum(start[keep], 0), np.minimum(end[keep], length - 1)
+    counts = end - start + 1
+    offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    if axis == 1:
+        return np.repeat(fixed * width + start, counts) + offset
+    return np.repeat(start * width + fixed, counts) + offset * width
+
+
+def outline_pixels(shape, boxes, width=1):
+    """
+    Flat indices (into an image of the given shape) of the outlines of many
+    boxes, drawn like ImageDraw.rectangle: edges on the inclusive corner
+    pixels, thicker outlines growing inward.
+
+    Args:
+        shape: (height, width) of the image.
+        boxes: n x 4 array of xmin, ymin, xmax, ymax in pixels.
+        width: Outline width in pixels.
+
+    Returns:
+        numpy.ndarray: Flat pixel indices (pixels on several edges repeat).
+    """
+    boxes = np.rint(np.asarray(boxes, dtype=np.float64).reshape(-1, 4)).astype(np.int64)
+    x0, x1 = np.minimum(boxes[:, 0], boxes[:, 2]), np.maximum(boxes[:, 0], boxes[:, 2])
+    y0, y1 = np.minimum(boxes[:, 1], boxes[:, 3]), np.maximum(boxes[:, 1], boxes[:, 3])
+    pixels = []
+    for inset in range(width):
+        left, right, top, bottom = x0 + inset, x1 - inset, y0 + inset, y1 - inset
+        inside = (left <= right) & (top <= bottom)
+        left, right, top, bottom = left[inside], right[inside], top[inside], bottom[inside]
+        pixels.append(_segment_pixels(shape, np.concatenate([top, bottom]), np.concatenate([left, left]),
+                                      np.concatenate([right, right]), axis=1))
+        pixels.append(_segment_pixels(shape, np.concatenate([left, right]), np.concatenate([top, top]),
+                                      np.concatenate([bottom, bottom]), axis=0))
+    return np.concatenate(pixels)
+
+
+def box_outlines(shape, boxes, width=1):
+    """Boolean mask of the outlines of many boxes (see outline_pixels)."""
+    mask = np.zeros(shape, dtype=bool)
+    mask.ravel()[outline_pixels(shape, boxes, width)] = True
+    return mask
+
+
+def point_pixels(shape, points, radius=3):
+    """Flat indices of filled disks of the given radius around every (x, y) point."""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    points = np.rint(points[np.isfinite(points).all(axis=1)]).astype(np.int64)
+    dy, dx = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+    disk = dx ** 2 + dy ** 2 <= radius ** 2 + radius
+    x = (points[:, :1] + dx[disk]).ravel()
+    y = (points[:, 1:] + dy[disk]).ravel()
+    inside = (x >= 0) & (x < shape[1]) & (y >= 0) & (y < shape[0])
+    return y[inside] * shape[1] + x[inside]
+
+
+def _layer_boxes(df):
+    """Box coordinates of an interest-area table in any known schema."""
+    if 'char_xmin' in df.columns:
+        return df[['char_xmin', 'char_ymin', 'char_xmax', 'char_ymax']].to_numpy(np.float64)
+    if 'X_Start' in df.columns:
+        # Renderer and legacy OCR tables, possibly without their other columns
+        return df[['X_Start', 'Y_Start', 'X_End', 'Y_End']].to_numpy(np.float64)
+    return _layer_boxes(InterestAreas.from_frame(df).frame)
+
+
+def render_overlay(image, layers, colors=None, max_size=None, box_width=1, fixation_radius=3):
+    """
+    Draws layers of interest areas and fixations over a page image.
+
+    Args:
+        image: Path or PIL image of the page (transparent pages are put on white).
+        layers: {name: DataFrame}: interest-area tables (any schema known to
+            InterestAreas) are drawn as box outlines, tables with x and y
+            columns (fixations) as dots; later layers are drawn on top.
+        colors: {name: color} overriding LAYER_COLORS (PIL color names or RGB).
+        max_size: If given, the longest side of the output in pixels; boxes
+            and dots are drawn at that size, so outlines stay one pixel wide.
+        box_width: Outline width in pixels.
+        fixation_radius: Radius of the fixation dots in pixels.
+
+    Returns:
+        PIL.Image.Image: The RGB overlay.
+    """
+    if not isinstance(image, Image.Image):
+        image = Image.open(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        page = Image.new('RGB', image.size, 'white')
+        page.paste(image, mask=image.getchannel('A'))
+        image = page
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    scale = min(1.0, max_size / max(image.size)) if max_size else 1.0
+    if scale < 1:
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                             Image.LANCZOS)
+    pixels = np.array(image)
+    shape = pixels.shape[:2]
+    flat = pixels.reshape(-1, 3)
+
+    colors = {**LAYER_COLORS, **(colors or {})}
+    palette = iter(PALETTE * (len(layers) // len(PALETTE) + 1))
+    for name, df in layers.items():
+        if df is None or not len(df):
+            continue
+        color = colors.get(name) or next(palette)
+        if {'x', 'y'} <= set(df.columns) and 'char_xmin' not in df.columns:
+            drawn = point_pixels(shape, df[['x', 'y']].to_numpy(np.float64) * scale, fixation_radius)
+        else:
+            drawn = outline_pixels(shape, _layer_boxes(df) * scale, box_width)
+        flat[drawn] = ImageColor.getrgb(color) if isinstance(color, str) else color
+    return Image.fromarray(pixels)
+
+
+def find_area_table(directory, name):
+    """The interest-area table <directory>/<name>.<ext> of a page, or None."""
+    for extension in AREA_EXTENSIONS:
+        path = os.path.join(directory, name + extension)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _render_page(task):
+    image_path, layers, output_path, options = task
+    start = time.perf_counter()
+    frames = {name: InterestAreas.read(layer).frame if isinstance(layer, str) else layer
+              for name, layer in layers.items()}
+    render_overlay(image_path, frames, **options).save(output_path)
+    return time.perf_counter() - start
+
+
+def render_thumbnails(image_paths, output_dir, area_dirs=None, fixations=None, workers=None, max_size=800,
+                      **options):
+    """
+    Writes one overlay thumbnail per page image, spread over a process pool.
+
+    Args:
+        image_paths: Page images.
+        output_dir: Folder for the thumbnails (<page name>.png).
+        area_dirs: {layer name: folder}: the interest areas of a page are the
+            table (or DynamicAOI XML) with the page's name in each folder.
+        fixations: Optional fixation table (x, y, trial_id); a page gets the
+            fixations whose trial_id ends with the same page number.
+        workers: Number of worker processes (default: number of CPUs).
+        max_size: Longest side of the thumbnails in pixels (None: full size).
+        **options: colors, box_width and fixation_radius of render_overlay.
+
+    Returns:
+        list: Paths of the thumbnails, in the order of image_paths.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if fixations is not None:
+        pages = page_number(fixations['trial_id'])
+        fixations = {page: rows[['x', 'y']] for page, rows in fixations.groupby(pages, sort=False)}
+    tasks = []
+    for image_path in image_paths:
+        name = os.path.splitext(os.path.basename(image_path))[0]
+        layers = {}
+        for layer, directory in (area_dirs or {}).items():
+            path = find_area_table(directory, name)
+            if path:
+                layers[layer] = path
+        if fixations is not None:
+            layers['fixations'] = fixations.get(page_number([name])[0])
+        output_path = os.path.join(output_dir, f'{name}.png')
+        tasks.append((image_path, layers, output_path, dict(options, max_size=max_size)))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for done, ((image_path, layers, _, _), seconds) in enumerate(
+                zip(tasks, executor.map(_render_page, tasks)), start=1):
+            drawn = ', '.join(name for name, layer in layers.items() if layer is not None) or 'no layers'
+            print(f"[{done}/{len(tasks)}] {image_path}: {drawn} in {seconds:.2f} s")
+    return [task[2] for task in tasks]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Draw QA thumbnails of interest areas and fixations over pages.')
+    parser.add_argument('inputs', nargs='+', help='Image files, directories or glob patterns.')
+    parser.add_argument('-o', '--output-dir', default='qa_overlays', help='Folder for the thumbnails.')
+    parser.add_argument('--ocr', help='Folder with the OCR interest areas of the pages (<page>.csv, ...).')
+    parser.add_argument('--renderer', help='Folder with the renderer coordinates of the pages (<page>.csv, ...).')
+    parser.add_argument('--fixations', help='Fixation table (x, y, trial_id) to draw on the matching pages.')
+    parser.add_argument('--max-size', type=int, default=800, help='Longest side of the thumbnails (0: full size).')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(), help='Number of worker processes.')
+    args = parser.parse_args()
+
+    image_paths = find_page_images(args.inputs)
+    if not image_paths:
+        parser.error('no images found')
+    area_dirs = {name: directory for name, directory in (('renderer', args.renderer), ('ocr', args.ocr))
+                 if directory}
+    fixations = read_table(args.fixations, columns=['x', 'y', 'trial_id']) if args.fixations else None
+    start = time.perf_counter()
+    render_thumbnails(image_paths, args.output_dir, area_dirs, fixations, workers=args.workers,
+                      max_size=args.max_size or None)
+    print(f"{len(image_paths)} thumbnails saved to {args.output_dir} in {time.perf_counter() - start:.1f} s")
+
+
+# Example usage:
+#   python ocr/overlay.py new_stimuli/output --renderer new_stimuli/output --ocr ocr_tables \
+#       --fixations eri_new/fixation_data.csv -o qa_overlays -j 4
+if __name__ == '__main__':
+    main()
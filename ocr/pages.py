@@ -0,0 +1,38 @@
+import glob
+import os
+
+import pandas as pd
+
+# Finding page images and matching pages across tables. Kept free of the OCR,
+# interest-area and reading-measure modules so that any of them can use it.
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp')
+
+
+def find_page_images(inputs):
+    """
+    Expands directories and glob patterns into a sorted list of page images.
+
+    Args:
+        inputs: List of image paths, directories or glob patterns.
+
+    Returns:
+        list: Unique image paths in sorted order.
+    """
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = [os.path.join(item, name) for name in os.listdir(item)]
+        else:
+            candidates = glob.glob(item)
+        paths.update(p for p in candidates if p.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(p))
+    return sorted(paths)
+
+
+def page_number(trial_ids):
+    """
+    Page of every trial_id: the number it ends with ('page18',
+    'AMD1111_03_page18' and '18' are all page '18'), or the trial_id itself.
+    """
+    trial_ids = pd.Series(trial_ids).astype(str)
+    return trial_ids.str.extract(r'(\d+)\s*$', expand=False).fillna(trial_ids).to_numpy()
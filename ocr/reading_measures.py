@@ -0,0 +1,404 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from assign_fixations import CharacterIndex, _positions_within, _runs_within
+from coordinate_tables import read_table, write_table
+from interest_areas import InterestAreas, _group_starts
+
+# Reading measures as in GazeGenie's corrected_fixations_data.csv (popEye
+# definitions, 0-based word, sentence and letter numbers). They are computed
+# over the fixations of every reading (subject and trial_id) in start order,
+# all readings at once: shifted comparisons for saccades, refixations and
+# regressions, running maxima for first-pass skips and cumulative sums over
+# run starts for runs. Every column gets the suffix of the assignment it is
+# computed from (e.g. "_Wisdom_of_Crowds").
+FIXATION_MEASURES = ['word_cland', 'on_sentence_num', 'sac_in', 'sac_out', 'word_launch', 'word_refix',
+                     'sentence_refix', 'word_reg_out', 'word_reg_in', 'word_reg_out_to', 'sentence_reg_in_from',
+                     'word_reg_in_from', 'sentence_reg_in', 'sentence_reg_out', 'sentence_reg_out_to',
+                     'word_firstskip', 'sentence_firstskip', 'word_runid', 'sentence_runid', 'word_fix',
+                     'sentence_fix', 'word_run', 'sentence_run', 'word_run_fix', 'sentence_run_fix']
+
+# Per-word aggregates, named as in GazeGenie's own word measures
+WORD_MEASURES = ['number_of_fixations', 'number_of_runs', 'skip', 'firstrun_skip', 'initial_landing_position',
+                 'firstrun_nfix', 'initial_fixation_duration', 'gaze_duration', 'go_past_duration',
+                 'total_fixation_duration', 'number_of_regressions_in', 'number_of_regressions_out']
+
+# A word ending with one of these (and optional closing quotes or brackets) ends its sentence in
+# GazeGenie's numbering (word_table); sentences.tokenize uses it too, with exceptions
+SENTENCE_END = r'[.!?…]["\'»”’)\]]*$'
+# GazeGenie also ends a sentence at a mark inside a word (the "45." of "45.000"); the word opens the next one
+SENTENCE_END_IN_WORD = r'[.!?…](?=\w)'
+
+
+def word_table(areas):
+    """
+    Words of the pages, numbered as CharacterIndex numbers them (0-based
+    within each page, in reading order).
+
+    sentence_num follows GazeGenie's on_sentence_num: sentences are numbered
+    from 0 on every page and a new one starts after each word that matches
+    SENTENCE_END, abbreviations included, and at each word that matches
+    SENTENCE_END_IN_WORD (numbers such as 45.000), while titles run on into
+    the text.
+    This is not the sentence_nr of sentences.tokenize (the R analysis
+    convention), which differs on some pages; do not mix the two.
+
+    Args:
+        areas: InterestAreas of the pages, or the CharacterIndex already
+            built from them.
+
+    Returns:
+        pandas.DataFrame: trial_id, word_number, word, word_length (letters
+        of the word's text), assigned_line (0-based) and sentence_num.
+    """
+    index = areas if isinstance(areas, CharacterIndex) else CharacterIndex(areas)
+    first = np.flatnonzero(index.word_land == 0)
+    words = pd.Series(np.asarray(index.on_word)[first]).astype(str).str.strip()
+    trial = index.char_trial[first]
+    ends = words.str.contains(SENTENCE_END).to_numpy()
+    trial_start = _group_starts([trial])
+    sentence_start = (trial_start | np.concatenate([[False], ends[:-1]]) |
+                      words.str.contains(SENTENCE_END_IN_WORD).to_numpy())
+    return pd.DataFrame({
+        'trial_id': np.asarray(index.trials)[trial],
+        'word_number': index.on_word_number[first],
+        'word': words.to_numpy(),
+        'word_length': words.str.len().to_numpy(),
+        'assigned_line': index.line_num[index.char_slot[first]],
+        'sentence_num': _runs_within(sentence_start, trial_start),
+    })
+
+
+def _numbers(values, found):
+    """Nullable integers: `values` where `found`, NA elsewhere."""
+    return pd.arrays.IntegerArray(np.where(found, values, 0).astype(np.int64), ~found)
+
+
+def _previous(values, first, fill):
+    """values[i - 1] for every fixation; `fill` at the first fixation of each reading."""
+    previous = np.empty_like(values)
+    previous[1:] = values[:-1]
+    previous[first] = fill
+    return previous
+
+
+def _next(values, last, fill):
+    """values[i + 1] for every fixation; `fill` at the last fixation of each reading."""
+    following = np.empty_like(values)
+    following[:-1] = values[1:]
+    following[last] = fill
+    return following
+
+
+def _readings(df, group_by):
+    """Reading number of every fixation (first-appearance order) and the temporal order of the table."""
+    keys = [key for key in group_by if key in df.columns] + ['trial_id']
+    reading = df.groupby(keys, sort=False, observed=True, dropna=False).ngroup().to_numpy()
+    start = df['start'].to_numpy() if 'start' in df.columns else np.arange(len(df))
+    return keys, reading, np.lexsort((start, reading))
+
+
+def _word_rows(words, trial_ids, word_numbers):
+    """Row of `words` (sorted by trial_id and word_number) of every fixation, or -1."""
+    trials = pd.Index(words['trial_id'].astype(str).unique())
+    trial = trials.get_indexer(pd.Series(trial_ids).astype(str))
+    span = int(words['word_number'].max()) + 2 if len(words) else 1
+    keys = trials.get_indexer(words['trial_id'].astype(str)) * span + words['word_number'].to_numpy()
+    wanted = trial * span + word_numbers
+    row = np.clip(np.searchsorted(keys, wanted), 0, max(len(keys) - 1, 0))
+    found = (trial >= 0) & (word_numbers >= 0) & (keys[row] == wanted) if len(keys) else np.zeros(len(wanted), bool)
+    return np.where(found, row, -1)
+
+
+def _sort_words(words):
+    return words.assign(_trial=words['trial_id'].astype(str)).sort_values(
+        ['_trial', 'word_number'], kind='stable').drop(columns='_trial').reset_index(drop=True)
+
+
+def _sequence_measures(unit, valid, first, last):
+    """
+    Refixations, regressions, first-pass skips and runs over a sequence of
+    word or sentence numbers (-1 off the text), readings one after another
+    in temporal order.
+    """
+    n = len(unit)
+    previous = _previous(unit, first, -1)
+    following = _next(unit, last, -1)
+    pair = valid & _previous(valid, first, False)
+    refix = pair & (unit == previous)
+    reg_in = pair & (unit < previous)
+    reg_out = _next(reg_in, last, False)
+
+    # Largest unit read before every fixation of the reading
+    reading = np.cumsum(first) - 1
+    span = int(unit.max()) + 2 if n else 1
+    running = np.maximum.accumulate(np.where(valid, unit, -1) + reading * span) - reading * span
+    before = _previous(running, first, -1)
+
+    # n-th fixation on its unit and n-th visit of it: count over (reading, unit) in temporal order
+    order = np.lexsort((np.arange(n), unit, reading))
+    unit_start = _group_starts([reading[order], unit[order]])
+    run_start = valid & ~refix
+    fix = np.empty(n, dtype=np.int64)
+    fix[order] = _positions_within(unit_start) + 1
+    run = np.empty(n, dtype=np.int64)
+    run[order] = _runs_within(run_start[order], unit_start) + 1
+
+    # Runs of regressions: a new one starts at every regression not preceded by another
+    reg_start = reg_in & ~_previous(reg_in, first, False)
+    return {
+        'refix': refix,
+        'reg_out': reg_out,
+        'reg_in': reg_in,
+        'reg_out_to': _numbers(following, reg_out),
+        'reg_in_from': _numbers(previous, reg_in),
+        'firstskip': (valid & (fix == 1) & (unit < before)).astype(np.int64),
+        'runid': _runs_within(reg_start, first) - 1,
+        'fix': _numbers(fix, valid),
+        'run': _numbers(run, valid),
+        'run_fix': _numbers(_positions_within(run_start | ~valid | first) + 1, valid),
+    }
+
+
+def fixation_measures(fixations, words, suffix='', group_by=('subject',)):
+    """
+    Adds GazeGenie's per-fixation reading measures (FIXATION_MEASURES).
+
+    Saccade lengths are in letters: differences of letternum between
+    fixations on the same line and of line_let for saccades to a later line.
+    Saccades back to an earlier line keep GazeGenie's conventions: sac_in is
+    line_let[previous] - line_let[current], and sac_out measures each
+    fixation's letter from the start of the other fixation's line.
+
+    Args:
+        fixations: Fixations with the ASSIGNMENT_COLUMNS of assign_fixations
+            (with `suffix`), trial_id and optionally subject and start.
+        words: Word table of the pages (word_table), giving the length and
+            sentence of every word.
+        suffix: Suffix of the assignment columns, also given to the added ones.
+        group_by: Columns that, with trial_id, identify one reading of a page.
+
+    Returns:
+        pandas.DataFrame: `fixations` with the FIXATION_MEASURES columns; NA
+        (False for the boolean ones) where a fixation or its neighbour is off
+        the text.
+    """
+    words = _sort_words(words)
+    _, reading, order = _readings(fixations, group_by)
+    reading = reading[order]
+    first = _group_starts([reading])
+    last = np.append(first[1:], True)
+
+    def column(name):
+        values = fixations[name + suffix].to_numpy(np.float64, na_value=np.nan)[order]
+        return np.where(np.isnan(values), -1, values).astype(np.int64)
+
+    word, letternum, line_let, word_land, line = (column(name) for name in
+                                                  ['on_word_number', 'letternum', 'line_let', 'word_land', 'line_num'])
+    row = _word_rows(words, fixations['trial_id'].to_numpy()[order], word)
+    valid = (word >= 0) & (letternum >= 0) & (row >= 0)
+    safe_row = np.maximum(row, 0)
+    word = np.where(valid, word, -1)
+    sentence = np.where(valid, words['sentence_num'].to_numpy()[safe_row], -1)
+    length = words['word_length'].to_numpy()[safe_row]
+
+    # Saccades between consecutive fixations i - 1 and i, both on the text
+    pair = valid & _previous(valid, first, False)
+    previous_letter, previous_line_let = _previous(letternum, first, -1), _previous(line_let, first, -1)
+    previous_line = _previous(line, first, -1)
+    line_start, previous_line_start = letternum - line_let, previous_letter - previous_line_let
+    sac_in = np.select([line == previous_line, line > previous_line],
+                       [letternum - previous_letter, line_let - previous_line_let],
+                       previous_line_let - line_let)
+    sac_out = np.select([line == previous_line, line > previous_line],
+                        [letternum - previous_letter, line_let - previous_line_let],
+                        (previous_letter - line_start) - (letternum - previous_line_start))
+    landed_before = _previous(word_land, first, -1)
+    launch = np.where(sac_in >= 0, sac_in - word_land, sac_in + landed_before)
+
+    measures = {
+        'word_cland': np.where(valid, word_land - (length + 1) / 2, np.nan),
+        'on_sentence_num': _numbers(sentence, valid),
+        'sac_in': _numbers(sac_in, pair),
+        'sac_out': _numbers(_next(sac_out, last, 0), _next(pair, last, False)),
+        'word_launch': _numbers(launch, pair),
+    }
+    for level, units in [('word', word), ('sentence', sentence)]:
+        for name, values in _sequence_measures(units, valid, first, last).items():
+            measures[f'{level}_{name}'] = values
+
+    # Back to the row order of the table
+    inverse = np.empty_like(order)
+    inverse[order] = np.arange(len(order))
+    columns = {name + suffix: pd.Series(measures[name][inverse], index=fixations.index) for name in FIXATION_MEASURES}
+    return fixations.assign(**columns)
+
+
+def _durations(df):
+    if 'duration' in df.columns:
+        return df['duration'].to_numpy(np.float64)
+    return (df['stop'] - df['start']).to_numpy(np.float64)
+
+
+def _next_beyond(values, positions, ends):
+    """
+    For every position p, the first q > p (before ends[p]) with values[q] >
+    values[p], or ends[p] if there is none. All positions are searched at
+    once over a sparse table of the maxima of values[i:i + 2**level].
+    """
+    n = len(values)
+    limit = int((ends[positions] - positions).max()) if len(positions) else 0
+    maxima = [values]
+    while 2 ** len(maxima) <= limit:
+        step = 2 ** (len(maxima) - 1)
+        previous = maxima[-1]
+        maxima.append(np.maximum(previous, previous[np.minimum(np.arange(n) + step, n - 1)]))
+    target, end = values[positions], ends[positions]
+    found = positions + 1
+    # Skip the largest blocks that hold nothing beyond the target
+    for level in reversed(range(len(maxima))):
+        size = 2 ** level
+        skip = (found + size <= end) & (maxima[level][np.minimum(found, n - 1)] <= target)
+        found = np.where(skip, found + size, found)
+    return found
+
+
+def word_measures(measured, words, suffix='', group_by=('subject',)):
+    """
+    Aggregates the fixations of every reading into word measures
+    (WORD_MEASURES), for all words of the page, fixated or not.
+
+    As in GazeGenie, a word is skipped when it was never fixated, and the
+    first-run measures come from the first visit of the word whenever it
+    happened: its first fixation (initial_fixation_duration and the 1-based
+    initial_landing_position), its fixations (firstrun_nfix) and their
+    duration (gaze_duration). go_past_duration runs from the first fixation
+    on the word until the first fixation on a later word, regressions
+    included. firstrun_skip flags words first visited after a later word had
+    been read (popEye's first-pass skip), whose first-run measures are not
+    first-pass ones. Durations are taken from the duration column, or
+    stop - start.
+
+    Args:
+        measured: Output of fixation_measures.
+        words: Word table of the pages (word_table).
+        suffix: Suffix of the assignment and fixation-measure columns.
+        group_by: Columns that, with trial_id, identify one reading of a page.
+
+    Returns:
+        pandas.DataFrame: One row per reading and word: the reading keys, the
+        columns of `words` and the WORD_MEASURES with `suffix`; first-run
+        measures are NA for skipped words.
+    """
+    words = _sort_words(words)
+    keys, reading, order = _readings(measured, group_by)
+    readings = measured[keys].drop_duplicates().reset_index(drop=True)
+
+    # Every reading gets the words of its trial, as a block of rows
+    trials = pd.Index(words['trial_id'].astype(str).unique())
+    words_trial = trials.get_indexer(words['trial_id'].astype(str))
+    trial_first = np.searchsorted(words_trial, np.arange(len(trials)))
+    trial_size = np.bincount(words_trial, minlength=len(trials))
+    reading_trial = trials.get_indexer(readings['trial_id'].astype(str))
+    size = np.where(reading_trial >= 0, trial_size[np.maximum(reading_trial, 0)], 0)
+    offset = np.concatenate([[0], np.cumsum(size)])
+    block = np.repeat(np.arange(len(readings)), size)
+    word_rows = trial_first[reading_trial[block]] + np.arange(offset[-1]) - offset[block]
+    table = pd.concat([readings.iloc[block].reset_index(drop=True),
+                       words.drop(columns='trial_id').iloc[word_rows].reset_index(drop=True)], axis=1)
+    table = table[keys + [c for c in words.columns if c != 'trial_id']]
+    n = len(table)
+
+    # Row of the table of every fixation on a word, in temporal order
+    reading = reading[order]
+    first = _group_starts([reading])
+    word = measured['on_word_number' + suffix].to_numpy(np.float64, na_value=np.nan)[order]
+    word = np.where(np.isnan(word), -1, word).astype(np.int64)
+    row = _word_rows(words, measured['trial_id'].to_numpy()[order], word)
+    row = np.where(row >= 0, offset[reading] + row - trial_first[words_trial[np.maximum(row, 0)]], -1)
+    on_word = row >= 0
+    word = np.where(on_word, word, -1)
+    duration = _durations(measured)[order]
+
+    def column(name):
+        return measured[name + suffix].to_numpy(np.float64, na_value=np.nan)[order]
+
+    def total(where=on_word, weights=None):
+        return np.bincount(row[where], weights=None if weights is None else weights[where], minlength=n)
+
+    # Duration and fixations of every run (visit), in temporal order
+    run_start = on_word & (column('word_run_fix') == 1)
+    run = np.cumsum(run_start) - 1
+    run_duration = np.bincount(run[on_word], weights=duration[on_word], minlength=int(run_start.sum()))
+    run_fixations = np.bincount(run[on_word], minlength=int(run_start.sum()))
+
+    # First fixation on every word; go-past time runs until a later word is fixated or the reading ends
+    entries = np.flatnonzero(on_word & (column('word_fix') == 1))
+    reading_end = np.append(np.flatnonzero(first)[1:], len(reading))[np.cumsum(first) - 1]
+    go_past_end = _next_beyond(word, entries, reading_end)
+    elapsed = np.concatenate([[0], np.cumsum(duration)])
+
+    read = np.zeros(n, dtype=bool)
+    read[row[entries]] = True
+    firstrun_skip = np.ones(n, dtype=bool)
+    firstrun_skip[row[entries]] = column('word_firstskip')[entries] == 1
+    first_run = {
+        'initial_landing_position': column('word_land')[entries] + 1,
+        'firstrun_nfix': run_fixations[run[entries]],
+        'initial_fixation_duration': duration[entries],
+        'gaze_duration': run_duration[run[entries]],
+        'go_past_duration': elapsed[go_past_end] - elapsed[entries],
+    }
+    columns = {
+        'number_of_fixations': total(),
+        'number_of_runs': total(run_start),
+        'skip': ~read,
+        'firstrun_skip': firstrun_skip,
+        'total_fixation_duration': total(weights=duration),
+        'number_of_regressions_in': total(on_word & (column('word_reg_in') == 1)),
+        'number_of_regressions_out': total(on_word & (column('word_reg_out') == 1)),
+    }
+    for name, values in first_run.items():
+        full = np.full(n, np.nan)
+        full[row[entries]] = values
+        columns[name] = full
+    for name in ('initial_landing_position', 'firstrun_nfix'):
+        columns[name] = _numbers(np.nan_to_num(columns[name]), read)
+    return table.assign(**{name + suffix: columns[name] for name in WORD_MEASURES})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compute per-fixation and per-word reading measures.')
+    parser.add_argument('fixations', help='Corrected fixations table (from drift_correction.py or GazeGenie).')
+    parser.add_argument('areas', nargs='+', help='Interest-area tables or DynamicAOI XML files; the trial_id of a '
+                                                 'file without one is its name.')
+    parser.add_argument('-o', '--output', default='fixation_measures.csv', help='Output table of fixations.')
+    parser.add_argument('-w', '--words-output', default='word_measures.csv', help='Output table of words.')
+    parser.add_argument('--suffix', default='_Wisdom_of_Crowds',
+                        help='Suffix of the line_num column to assign with and of the measure columns.')
+    args = parser.parse_args()
+
+    areas = InterestAreas(pd.concat([InterestAreas.read(path).frame for path in args.areas], ignore_index=True))
+    fixations = read_table(args.fixations)
+    start = time.perf_counter()
+    index = CharacterIndex(areas)
+    if 'on_word_number' + args.suffix not in fixations.columns:
+        line = 'line_num' + args.suffix if 'line_num' + args.suffix in fixations.columns else None
+        fixations = index.assign(fixations, line=line, suffix=args.suffix)
+    words = word_table(index)
+    measured = fixation_measures(fixations, words, suffix=args.suffix)
+    per_word = word_measures(measured, words, suffix=args.suffix)
+    print(f"{len(measured)} fixations and {len(per_word)} words measured in {time.perf_counter() - start:.2f} s")
+    write_table(measured, args.output)
+    write_table(per_word, args.words_output)
+    print(f"Saved to {args.output} and {args.words_output}")
+
+
+# Example usage:
+#   python ocr/drift_correction.py "prueba 1920/fixation_data.csv" "prueba 1920/df_word_chars_10.csv"
+#   python ocr/reading_measures.py corrected_fixations_data.csv "prueba 1920/df_word_chars_10.csv"
+if __name__ == '__main__':
+    main()
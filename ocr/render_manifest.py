@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+
+from coordinate_tables import read_table
+from interest_areas import InterestAreas
+
+
+def manifest_path_for(image_path):
+    """Returns the path of the render manifest that belongs to an image (same name, .json)."""
+    return os.path.splitext(image_path)[0] + '.json'
+
+
+def load_render_manifest(image_path):
+    """
+    Returns the render manifest of an image, or None if the image was not
+    rendered by us.
+
+    The manifest is only trusted if the hash it records matches the image on
+    disk and the coordinate table it points to exists; a re-saved, edited or
+    foreign image has to go through OCR.
+
+    Args:
+        image_path: Path to the page image.
+
+    Returns:
+        dict or None: The manifest, with 'coordinates' resolved to a path.
+    """
+    path = manifest_path_for(image_path)
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if not isinstance(manifest, dict) or 'image_sha256' not in manifest or 'coordinates' not in manifest:
+        return None
+
+    with open(image_path, 'rb') as f:
+        if hashlib.sha256(f.read()).hexdigest() != manifest['image_sha256']:
+            return None
+    coordinates_path = os.path.join(os.path.dirname(os.path.abspath(image_path)), manifest['coordinates'])
+    if not os.path.isfile(coordinates_path):
+        return None
+    return dict(manifest, coordinates=coordinates_path)
+
+
+def word_chars_from_render(df_render, trial_id):
+    """
+    Converts the renderer's coordinate table into the df_word_chars schema of
+    recognize_text (see InterestAreas for how lines and words are numbered).
+
+    Args:
+        df_render: DataFrame with the renderer's columns, in drawing order.
+        trial_id: Value for the trial_id column.
+
+    Returns:
+        pandas.DataFrame: Characters in the df_word_chars columns, with assigned_line.
+    """
+    return InterestAreas.from_frame(df_render, 'render', trial_id).to_frame()
+
+
+def interest_areas(image_path, use_manifest=True, **ocr_options):
+    """
+    Returns the character interest areas of a page, from the renderer's ground
+    truth when there is a valid manifest and from OCR otherwise.
+
+    Args:
+        image_path: Path to the page image.
+        use_manifest: Set to False to always OCR the page.
+        **ocr_options: Passed to recognize_text (tesseract_config, single_pass,
+            use_cache, roi) when OCR is needed.
+
+    Returns:
+        pandas.DataFrame: df_word_chars with assigned_line.
+    """
+    manifest = load_render_manifest(image_path) if use_manifest else None
+    if manifest is None:
+        # Tesseract is only loaded for pages that need OCR, so the renderer can use this module
+        from create_interest_areas_from_image2 import recognize_text
+        return recognize_text(image_path, **ocr_options)
+    trial_id = os.path.splitext(os.path.basename(image_path))[0]
+    df_render = read_table(manifest['coordinates'])
+    return word_chars_from_render(df_render, trial_id)
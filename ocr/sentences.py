@@ -0,0 +1,236 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from assign_fixations import _positions_within, _runs_within
+from coordinate_tables import read_table, write_table
+from interest_areas import _group_starts
+from pages import page_number
+from reading_measures import SENTENCE_END, _durations, _readings, _sequence_measures
+
+# Words and sentences of the stimulus texts (new_stimuli/input/*.txt), laid out
+# as the renderer lays them out: the title (# line), the subtitle (## line),
+# then the paragraphs, with words split at whitespace. Their 0-based running
+# number on the page is the on_word_number that assign_fixations gives to
+# fixations on the rendered page.
+
+# Spanish abbreviations whose full stop does not end a sentence (lowercase)
+ABBREVIATIONS = {'a.c.', 'd.c.', 'aprox.', 'cap.', 'dr.', 'dra.', 'ej.', 'fig.', 'núm.', 'p.', 'pág.', 'págs.',
+                 'sr.', 'sra.', 'srta.', 'ud.', 'uds.', 'vol.'}
+
+# Opening punctuation skipped when looking at the first letter of the next word
+OPENING = '¿¡«“‘"\'([—-'
+
+# Columns of sentences_words_page_18.csv (1-based numbers)
+WORD_COLUMNS = ['word', 'word_nr', 'sentence_nr', 'overall_word_nr']
+
+SENTENCE_MEASURES = ['number_of_fixations', 'number_of_runs', 'skip', 'first_pass_reading_time',
+                     'total_reading_time', 'rereading_time', 'number_of_regressions_in', 'number_of_regressions_out']
+
+
+def read_stimuli(paths):
+    """
+    Reads stimulus text files into one row per text block, in the order the
+    renderer lays them out (title, subtitle, then the paragraphs).
+
+    Returns:
+        pandas.DataFrame: trial_id (the file name without extension), block
+        ('title', 'subtitle' or 'paragraph') and text.
+    """
+    frames = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            text = pd.Series(f.read().splitlines(), dtype=str).str.strip()
+        frames.append(pd.DataFrame({'trial_id': os.path.splitext(os.path.basename(path))[0], 'text': text}))
+    lines = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['trial_id', 'text'])
+    kind = np.select([lines['text'].str.startswith('##'), lines['text'].str.startswith('#')], [1, 0], 2)
+    lines = lines.assign(block=np.array(['title', 'subtitle', 'paragraph'])[kind], _kind=kind,
+                         text=lines['text'].str.replace(r'^#+', '', regex=True).str.strip())
+    lines = lines[lines['text'] != '']
+    return lines.sort_values(['trial_id', '_kind'], kind='stable')[['trial_id', 'block', 'text']].reset_index(drop=True)
+
+
+def tokenize(blocks):
+    """
+    Splits text blocks into words and numbers them within their sentence and
+    page, as in sentences_words_page_18.csv (the R analysis convention).
+
+    A sentence ends with its block (so a title is a sentence of its own) or
+    with a word matching SENTENCE_END, unless the word is a known
+    abbreviation or the next word starts with a lowercase letter; opening ¿
+    and ¡ and a full stop inside a number (45.000) do not split. These
+    1-based sentence_nr are not GazeGenie's on_sentence_num
+    (reading_measures.word_table), which differs on some pages; do not mix
+    the two.
+
+    Args:
+        blocks: DataFrame with trial_id and text (read_stimuli), in page order.
+
+    Returns:
+        pandas.DataFrame: trial_id, word, word_nr, sentence_nr and
+        overall_word_nr (1-based) of every word.
+    """
+    words = blocks['text'].str.split().explode().dropna()
+    block = words.index.to_numpy()
+    trial_ids = blocks['trial_id'].to_numpy()[block]
+    words = words.reset_index(drop=True).astype(str)
+
+    block_end = np.append(block[1:] != block[:-1], True)
+    next_lower = np.append(words.str.lstrip(OPENING).str[:1].str.islower().to_numpy(dtype=bool)[1:], False)
+    ends = words.str.contains(SENTENCE_END).to_numpy() & ~words.str.lower().isin(ABBREVIATIONS).to_numpy()
+    sentence_end = block_end | (ends & ~next_lower)
+
+    trial = pd.factorize(trial_ids)[0]
+    trial_start = _group_starts([trial])
+    sentence_start = trial_start | np.concatenate([[False], sentence_end[:-1]])
+    return pd.DataFrame({
+        'trial_id': trial_ids,
+        'word': words.to_numpy(),
+        'word_nr': _positions_within(sentence_start) + 1,
+        'sentence_nr': _runs_within(sentence_start, trial_start) + 1,
+        'overall_word_nr': _positions_within(trial_start) + 1,
+    })
+
+
+def sentence_table(words):
+    """
+    Sentences of the pages: trial_id, sentence_nr, sentence (its text),
+    n_words and the overall_word_nr of its first and last words.
+    """
+    return words.groupby(['trial_id', 'sentence_nr'], sort=False).agg(
+        sentence=('word', ' '.join), n_words=('word', 'size'),
+        first_word=('overall_word_nr', 'min'), last_word=('overall_word_nr', 'max'),
+    ).reset_index()
+
+
+def join_sentences(df, words, word='on_word_number'):
+    """
+    Adds the word_nr and sentence_nr of the text to every row of `df` that is
+    on a word, through an index on (page, word number).
+
+    Args:
+        df: Fixations (or words) with trial_id and a 0-based word column.
+        words: Output of tokenize.
+        word: Column of `df` with the 0-based word number on the page (e.g.
+            on_word_number_Wisdom_of_Crowds); it is overall_word_nr - 1.
+
+    Returns:
+        pandas.DataFrame: `df` with word_nr and sentence_nr (NA off the text).
+    """
+    # Pages are matched on the distinct trial_ids only, then looked up by integer key
+    pages = pd.Index(pd.unique(page_number(words['trial_id'])))
+    span = int(words['overall_word_nr'].max()) + 1 if len(words) else 1
+    index = pd.Index(pages.get_indexer(page_number(words['trial_id'])) * span
+                     + words['overall_word_nr'].to_numpy() - 1)
+    codes, trial_ids = pd.factorize(df['trial_id'])
+    page = np.append(pages.get_indexer(page_number(trial_ids)), -1)[codes]
+    numbers = df[word].to_numpy(np.float64, na_value=np.nan)
+    on_word = ~np.isnan(numbers) & (page >= 0)
+    row = np.where(on_word, index.get_indexer(page * span + np.where(on_word, numbers, 0).astype(np.int64)), -1)
+    found = row >= 0
+    columns = {}
+    for name in ('word_nr', 'sentence_nr'):
+        values = words[name].to_numpy()[np.maximum(row, 0)]
+        columns[name] = pd.Series(pd.arrays.IntegerArray(np.where(found, values, 0).astype(np.int64), ~found),
+                                  index=df.index)
+    return pd.concat([df.drop(columns=list(columns), errors='ignore'), pd.DataFrame(columns, index=df.index)], axis=1)
+
+
+def sentence_reading_times(fixations, words, suffix='', group_by=('subject',)):
+    """
+    Reading times of every sentence in every reading (subject and trial_id),
+    for all pages at once.
+
+    First-pass reading time is the duration of the first visit of the
+    sentence (consecutive fixations on it); rereading time is the rest of its
+    total reading time. Durations are taken from the duration column, or
+    stop - start.
+
+    Args:
+        fixations: Fixations with on_word_number<suffix> (assign_fixations).
+        words: Output of tokenize for the pages read.
+        suffix: Suffix of the on_word_number column and of the added columns.
+        group_by: Columns that, with trial_id, identify one reading of a page.
+
+    Returns:
+        pandas.DataFrame: One row per reading and sentence of its page, with
+        the columns of sentence_table and the SENTENCE_MEASURES with `suffix`.
+    """
+    joined = join_sentences(fixations, words, 'on_word_number' + suffix)
+    keys, reading, order = _readings(joined, group_by)
+    readings = joined[keys].drop_duplicates().reset_index(drop=True)
+
+    # Every reading gets the sentences of its page, as a block of rows
+    sentences = sentence_table(words)
+    pages = page_number(sentences['trial_id'])
+    sentences = sentences.drop(columns='trial_id')
+    first_sentence = pd.Series(np.arange(len(pages))).groupby(pages, sort=False).min()
+    count = pd.Series(pages).value_counts(sort=False)
+    reading_page = page_number(readings['trial_id'])
+    size = count.reindex(reading_page).fillna(0).to_numpy(np.int64)
+    offset = np.concatenate([[0], np.cumsum(size)])
+    block = np.repeat(np.arange(len(readings)), size)
+    sentence_rows = first_sentence.reindex(reading_page).fillna(0).to_numpy(np.int64)[block] + \
+        np.arange(offset[-1]) - offset[block]
+    table = pd.concat([readings.iloc[block].reset_index(drop=True),
+                       sentences.iloc[sentence_rows].reset_index(drop=True)], axis=1)
+    n = len(table)
+
+    # Sentence visits over the fixations of every reading, in temporal order
+    reading = reading[order]
+    first = _group_starts([reading])
+    last = np.append(first[1:], True)
+    sentence = joined['sentence_nr'].to_numpy(np.float64, na_value=np.nan)[order]
+    valid = ~np.isnan(sentence)
+    sentence = np.where(valid, sentence, 0).astype(np.int64)
+    measures = _sequence_measures(np.where(valid, sentence, -1), valid, first, last)
+    row = np.where(valid, offset[reading] + sentence - 1, -1)
+    duration = _durations(joined)[order]
+    first_pass = valid & (measures['run'].to_numpy(np.int64, na_value=0) == 1)
+
+    def total(where=valid, weights=None):
+        return np.bincount(row[where], weights=None if weights is None else weights[where], minlength=n)
+
+    total_time = total(weights=duration)
+    first_pass_time = total(first_pass, duration)
+    columns = {
+        'number_of_fixations': total(),
+        'number_of_runs': total(valid & (measures['run_fix'].to_numpy(np.int64, na_value=0) == 1)),
+        'skip': total() == 0,
+        'first_pass_reading_time': first_pass_time,
+        'total_reading_time': total_time,
+        'rereading_time': total_time - first_pass_time,
+        'number_of_regressions_in': total(valid & measures['reg_in']),
+        'number_of_regressions_out': total(valid & measures['reg_out']),
+    }
+    return table.assign(**{name + suffix: columns[name] for name in SENTENCE_MEASURES})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Segment the stimulus texts into sentences and compute sentence '
+                                                 'reading times.')
+    parser.add_argument('fixations', help='Fixations assigned to words (corrected_fixations_data.csv-shaped).')
+    parser.add_argument('texts', nargs='+', help='Stimulus text files (new_stimuli/input/*.txt).')
+    parser.add_argument('-o', '--output', default='sentence_reading_times.csv', help='Output table of sentences.')
+    parser.add_argument('-w', '--words-output', help='Optional output table of words (sentences_words schema).')
+    parser.add_argument('--suffix', default='_Wisdom_of_Crowds', help='Suffix of the on_word_number column.')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    words = tokenize(read_stimuli(args.texts))
+    fixations = read_table(args.fixations)
+    times = sentence_reading_times(fixations, words, suffix=args.suffix)
+    print(f"{len(words)} words in {words.groupby('trial_id')['sentence_nr'].max().sum()} sentences; "
+          f"{len(times)} sentence readings in {time.perf_counter() - start:.2f} s")
+    write_table(times, args.output)
+    if args.words_output:
+        write_table(words, args.words_output)
+
+
+# Example usage:
+#   python ocr/sentences.py eri_new/corrected_fixations_data.csv new_stimuli/input/*.txt -w sentences_words.csv
+if __name__ == '__main__':
+    main()
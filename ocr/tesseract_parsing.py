@@ -0,0 +1,201 @@
+import csv
+import io
+import re
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pandas as pd
+
+WORD_COLUMNS = ['level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num',
+                'left', 'top', 'width', 'height', 'conf', 'text']
+CHAR_COLUMNS = ['char', 'left', 'top', 'right', 'bottom']
+
+# Explicit dtypes for the image_to_data TSV; only empty cells are missing text,
+# so words such as "NA" or "null" are kept as text
+WORD_DTYPES = {'level': np.int32, 'page_num': np.int32, 'block_num': np.int32, 'par_num': np.int32,
+               'line_num': np.int32, 'word_num': np.int32, 'left': np.int32, 'top': np.int32,
+               'width': np.int32, 'height': np.int32, 'conf': np.float32, 'text': object}
+CHAR_DTYPES = {'char': object, 'left': np.int32, 'top': np.int32, 'right': np.int32, 'bottom': np.int32,
+               'page': np.int32}
+
+# hOCR classes Tesseract uses for the text-line level
+HOCR_LINE_CLASSES = {'ocr_line', 'ocr_header', 'ocr_caption', 'ocr_textfloat'}
+
+# Config that makes Tesseract write one ocrx_cinfo span per symbol in hOCR
+HOCR_CHAR_BOXES_CONFIG = '-c hocr_char_boxes=1'
+
+
+def word_mask(df_words):
+    """
+    Returns a boolean array marking the level 5 rows that hold non-blank text.
+    """
+    text = df_words['text']
+    if pd.api.types.is_object_dtype(text) or pd.api.types.is_string_dtype(text):
+        has_text = text.str.strip().fillna('').ne('').to_numpy(dtype=bool)
+    else:
+        has_text = np.zeros(len(df_words), dtype=bool)
+    return has_text & (df_words['level'] == 5).to_numpy()
+
+
+def read_image_to_data(data, words_only=False):
+    """
+    Parses the TSV returned by pytesseract.image_to_data into a typed DataFrame.
+
+    Args:
+        data: TSV string from image_to_data (output_type=Output.STRING).
+        words_only: If True, keep only the level 5 rows with non-blank text.
+
+    Returns:
+        pandas.DataFrame: One row per page/block/paragraph/line/word, with int32
+        coordinates and numbering, float32 conf and the text as str (NaN when
+        empty).
+    """
+    df_words = pd.read_csv(io.StringIO(data), sep='\t', quoting=csv.QUOTE_NONE, dtype=WORD_DTYPES,
+                           keep_default_na=False, na_values={'text': ['']})
+    if words_only:
+        df_words = df_words[word_mask(df_words)].reset_index(drop=True)
+    return df_words
+
+
+def read_image_to_boxes(data, image_height):
+    """
+    Parses the output of pytesseract.image_to_boxes into a typed DataFrame in
+    image coordinates.
+
+    Tesseract's box format measures y from the bottom of the image; top and
+    bottom are flipped so that y grows downwards like in image_to_data.
+
+    Args:
+        data: String from image_to_boxes ("char left bottom right top page" lines).
+        image_height: Height of the image in pixels.
+
+    Returns:
+        pandas.DataFrame: Columns char, left, top, right, bottom, page (int32).
+    """
+    df_chars = pd.read_csv(io.StringIO(data), sep=' ', header=None, names=list(CHAR_DTYPES),
+                           quoting=csv.QUOTE_NONE, dtype=CHAR_DTYPES, keep_default_na=False)
+    flipped_top = image_height - df_chars['top']
+    df_chars['top'] = (image_height - df_chars['bottom']).astype(np.int32)
+    df_chars['bottom'] = flipped_top.astype(np.int32)
+    return df_chars
+
+
+def _title_box(element, key='bbox'):
+    """Reads 'bbox l t r b' (or 'x_bboxes l t r b') from an hOCR title attribute."""
+    match = re.search(key + r'\s+(-?\d+)\s+(-?\d+)\s+(-?\d+)\s+(-?\d+)', element.get('title', ''))
+    if match is None:
+        return None
+    return tuple(int(v) for v in match.groups())
+
+
+def _title_number(element, key):
+    match = re.search(key + r'\s+(-?[\d.]+)', element.get('title', ''))
+    return float(match.group(1)) if match else -1.0
+
+
+def _hocr_class(element):
+    return element.get('class', '').split(' ')[0]
+
+
+def parse_hocr(hocr):
+    """
+    Parses Tesseract hOCR with character boxes into word and character tables.
+
+    One recognition pass run with HOCR_CHAR_BOXES_CONFIG gives everything that
+    image_to_data and image_to_boxes give together. The word table follows the
+    image_to_data TSV schema (levels 1 to 5, with block/paragraph/line/word
+    numbers restarting at 1 inside their parent) and the character table holds
+    one row per symbol in image coordinates (y grows downwards), i.e. the
+    image_to_boxes table after its y-flip.
+
+    Args:
+        hocr: hOCR document as bytes or str, e.g. the output of
+            pytesseract.image_to_pdf_or_hocr(image, extension='hocr', ...).
+
+    Returns:
+        tuple: (df_words, df_chars) DataFrames.
+    """
+    if isinstance(hocr, bytes):
+        hocr = hocr.decode('utf-8')
+    # Drop the DOCTYPE and the XHTML namespace so tags can be matched by name
+    hocr = re.sub(r'<!DOCTYPE[^>]*>', '', hocr)
+    hocr = re.sub(r'\sxmlns(:\w+)?="[^"]*"', '', hocr)
+    root = ET.fromstring(hocr)
+
+    word_rows = []
+    char_rows = []
+
+    def add_row(level, numbers, box, conf=-1.0, text=None):
+        left, top, right, bottom = box
+        word_rows.append([level, *numbers, left, top, right - left, bottom - top, conf, text])
+
+    def descendants(element, classes):
+        """Yields the first descendants of `element` whose class is in `classes`."""
+        for child in element:
+            if _hocr_class(child) in classes:
+                yield child
+            else:
+                yield from descendants(child, classes)
+
+    for page_num, page in enumerate(descendants(root, {'ocr_page'}), start=1):
+        add_row(1, (page_num, 0, 0, 0, 0), _title_box(page))
+        for block_num, block in enumerate(descendants(page, {'ocr_carea'}), start=1):
+            add_row(2, (page_num, block_num, 0, 0, 0), _title_box(block))
+            for par_num, par in enumerate(descendants(block, {'ocr_par'}), start=1):
+                add_row(3, (page_num, block_num, par_num, 0, 0), _title_box(par))
+                for line_num, line in enumerate(descendants(par, HOCR_LINE_CLASSES), start=1):
+                    add_row(4, (page_num, block_num, par_num, line_num, 0), _title_box(line))
+                    for word_num, word in enumerate(descendants(line, {'ocrx_word'}), start=1):
+                        symbols = list(descendants(word, {'ocrx_cinfo'}))
+                        text = ''.join(s.text or '' for s in symbols) if symbols else ''.join(word.itertext())
+                        add_row(5, (page_num, block_num, par_num, line_num, word_num), _title_box(word),
+                                _title_number(word, 'x_wconf'), text.strip())
+                        for symbol in symbols:
+                            box = _title_box(symbol, 'x_bboxes')
+                            if box is not None and symbol.text:
+                                char_rows.append([symbol.text, *box])
+
+    df_words = pd.DataFrame(word_rows, columns=WORD_COLUMNS).astype(WORD_DTYPES)
+    df_chars = pd.DataFrame(char_rows, columns=CHAR_COLUMNS).astype(
+        {column: CHAR_DTYPES[column] for column in CHAR_COLUMNS})
+    return df_words, df_chars
+
+
+def merge_region_tables(region_tables, regions, image_size):
+    """
+    Combines the Tesseract tables of several crops of a page into page tables.
+
+    Box coordinates are shifted by each crop's offset, and block numbers are
+    renumbered so that blocks of later crops follow those of earlier ones; the
+    per-crop page rows are replaced by one row for the whole page.
+
+    Args:
+        region_tables: List of (df_words, df_chars) per crop, in crop coordinates.
+        regions: List of crop boxes (left, top, right, bottom) in page coordinates.
+        image_size: (width, height) of the page.
+
+    Returns:
+        tuple: (df_words, df_chars) in page coordinates.
+    """
+    width, height = image_size
+    all_words = [pd.DataFrame([[1, 1, 0, 0, 0, 0, 0, 0, width, height, -1.0, np.nan]],
+                              columns=WORD_COLUMNS).astype(WORD_DTYPES)]
+    all_chars = []
+    block_offset = 0
+    for (df_words, df_chars), (left, top, _, _) in zip(region_tables, regions):
+        df_words = df_words[df_words['level'] > 1].copy()
+        df_words['left'] += left
+        df_words['top'] += top
+        in_block = df_words['block_num'] > 0
+        df_words.loc[in_block, 'block_num'] += block_offset
+        block_offset = max(block_offset, int(df_words['block_num'].max()) if len(df_words) else block_offset)
+        all_words.append(df_words)
+
+        df_chars = df_chars.copy()
+        df_chars[['left', 'right']] += left
+        df_chars[['top', 'bottom']] += top
+        all_chars.append(df_chars)
+
+    df_words = pd.concat(all_words, ignore_index=True)
+    df_chars = pd.concat(all_chars, ignore_index=True) if all_chars else pd.DataFrame(columns=CHAR_COLUMNS)
+    return df_words, df_chars